@@ -0,0 +1,71 @@
+'''Compare loading pickled and memory-mapped TFIDFVectorizer models.
+
+A vectorizer is fitted on synthetic documents holding a given number of
+distinct terms, saved both as a pickled sklearn object (the format used
+before) and as a model directory, and loaded from each. The time of the
+first transform after loading and the total of both are reported, since a
+process serving a model pays for both, along with the time of transforming
+all the documents, where the tokens of the memory-mapped vocabulary are
+looked up by their hashes rather than in a dictionary.
+
+Run the following command from the root of the repository:
+python benchmarks/model_load_benchmark.py -t 1000000
+'''
+import argparse
+import os
+import os.path
+import pickle
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from transformer import TFIDFVectorizer  # noqa: E402
+
+
+NUM_DOCUMENTS = 1000
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def load_pickle(address):
+    vectorizer = TFIDFVectorizer()
+    with open(address, 'rb') as fin:
+        vectorizer.transformer = pickle.load(fin)
+    return vectorizer
+
+
+if __name__ == '__main__':
+    parse = argparse.ArgumentParser('python benchmarks/model_load_benchmark.py')
+    message = 'Number of distinct terms in the vocabulary'
+    parse.add_argument('-t', '--num_terms', type=int, default=1000000,
+                       help=message)
+    arguments = parse.parse_args()
+    corpus = [' '.join('term{}'.format(j) for j in
+                       range(i, arguments.num_terms, NUM_DOCUMENTS))
+              for i in range(NUM_DOCUMENTS)]
+    vectorizer = TFIDFVectorizer()
+    vectorizer.fit(corpus)
+    sample = corpus[:10]
+    expected = vectorizer.transform(sample)
+    print('Terms: {}'.format(len(vectorizer.transformer.vocabulary_)))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pickle_address = os.path.join(temp_dir, 'vectorizer.pkl')
+        with open(pickle_address, 'wb') as fout:
+            pickle.dump(vectorizer.transformer, fout)
+        model_address = os.path.join(temp_dir, 'vectorizer')
+        vectorizer.save(model_address)
+        for name, load, address in (
+                ('pickle', load_pickle, pickle_address),
+                ('mmap', TFIDFVectorizer.load, model_address)):
+            load_time, loaded = timed(load, address)
+            transform_time, observed = timed(loaded.transform, sample)
+            assert (observed != expected).nnz == 0
+            corpus_time, _ = timed(loaded.transform, corpus)
+            print(('{}: load {:.3f}s, first transform {:.3f}s, total ' +
+                   '{:.3f}s; transform of all documents {:.3f}s').format(
+                       name, load_time, transform_time,
+                       load_time + transform_time, corpus_time))
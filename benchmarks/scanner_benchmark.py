@@ -0,0 +1,83 @@
+'''Compare text-mode line splitting with the memory-mapped TSV scanner.
+
+The sample cleaned file is repeated to build a larger file, which is then
+summarized and filtered both with the line-splitting approach the
+summarizer and Dataset used before and with scanner.TSVScanner.
+
+Run the following command from the root of the repository:
+python benchmarks/scanner_benchmark.py -r 200
+'''
+import argparse
+import os
+import os.path
+import sys
+import tempfile
+import time
+from collections import Counter
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset import Dataset, FilterSpec  # noqa: E402
+from summarizer import summarize  # noqa: E402
+
+
+SAMPLE_ADDRESS = 'data/processed/PubMedSampleFile.tsv'
+
+
+def split_summarize(address, sep='\t'):
+    papers = []
+    with open(address) as fin:
+        for line in fin:
+            (journal_name, _, _, year) = line.strip().split(sep)
+            try:
+                year = int(year)
+            except ValueError:
+                continue
+            papers.append((year, journal_name))
+    return Counter(papers)
+
+
+def split_load(address, spec, sep='\t'):
+    papers = []
+    with open(address) as fin:
+        for line in fin:
+            journal, title, abstract, year = line.strip().split(sep)
+            try:
+                year = int(year)
+            except ValueError:
+                continue
+            paper = {'journal': journal, 'title': title,
+                     'abstract': abstract, 'year': year}
+            if spec(paper):
+                papers.append(paper)
+    return papers
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    parse = argparse.ArgumentParser('python benchmarks/scanner_benchmark.py')
+    message = 'Number of times the sample file is repeated'
+    parse.add_argument('-r', '--repeats', type=int, default=200, help=message)
+    arguments = parse.parse_args()
+    with open(SAMPLE_ADDRESS, 'rb') as fin:
+        sample = fin.read()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        address = os.path.join(temp_dir, 'scaled.tsv')
+        with open(address, 'wb') as fout:
+            for _ in range(arguments.repeats):
+                fout.write(sample)
+        print('File size: {:.1f} MB'.format(os.path.getsize(address) / 1e6))
+        baseline, expected = timed(split_summarize, address)
+        observed_time, observed = timed(summarize, address)
+        assert expected == observed
+        print('summarize: split {:.3f}s, scanner {:.3f}s ({:.1f}x)'.format(
+            baseline, observed_time, baseline / observed_time))
+        spec = FilterSpec(['Ecology'], (2000, 2018))
+        baseline, expected = timed(split_load, address, spec)
+        observed_time, observed = timed(Dataset.load, address, spec)
+        assert expected == observed
+        print('Dataset.load: split {:.3f}s, scanner {:.3f}s ({:.1f}x)'.format(
+            baseline, observed_time, baseline / observed_time))
@@ -0,0 +1,65 @@
+'''Compare a vectorizer parameter sweep on texts and on a token corpus.
+
+The abstracts of the sample cleaned file are repeated to build a larger
+corpus, and vectorizers with several configurations are fitted and applied
+both to the texts, tokenizing them for every configuration, and to a token
+corpus built once (see the token_corpus module).
+
+Run the following command from the root of the repository:
+python benchmarks/sweep_benchmark.py -r 200
+'''
+import argparse
+import os
+import os.path
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset import Dataset  # noqa: E402
+from token_corpus import TokenCorpus  # noqa: E402
+from transformer import TFIDFVectorizer  # noqa: E402
+
+
+SAMPLE_ADDRESS = 'data/processed/PubMedSampleFile.tsv'
+CONFIGURATIONS = [{}, {'ngram_range': (1, 2)}, {'min_df': 2, 'max_df': 0.5},
+                  {'sublinear_tf': True, 'stop_words': 'english'},
+                  {'ngram_range': (1, 3), 'max_features': 10000}]
+
+
+def sweep_texts(texts):
+    for kwargs in CONFIGURATIONS:
+        vectorizer = TFIDFVectorizer(**kwargs)
+        vectorizer.fit(texts)
+        vectorizer.transform(texts)
+
+
+def sweep_tokens(corpus):
+    for kwargs in CONFIGURATIONS:
+        vectorizer = TFIDFVectorizer(**kwargs)
+        vectorizer.fit_tokens(corpus)
+        vectorizer.transform_tokens(corpus)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    parse = argparse.ArgumentParser('python benchmarks/sweep_benchmark.py')
+    message = 'Number of times the sample abstracts are repeated'
+    parse.add_argument('-r', '--repeats', type=int, default=200, help=message)
+    arguments = parse.parse_args()
+    sample = [paper['abstract'] for paper in Dataset([SAMPLE_ADDRESS], [])]
+    texts = sample * arguments.repeats
+    print('Documents: {}, configurations: {}'.format(len(texts),
+                                                     len(CONFIGURATIONS)))
+    baseline, _ = timed(sweep_texts, texts)
+    print('texts: {:.3f}s'.format(baseline))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        address = os.path.join(temp_dir, 'tokens')
+        build_time, corpus = timed(TokenCorpus.build, texts, address)
+        sweep_time, _ = timed(sweep_tokens, corpus)
+        print('tokens: build {:.3f}s, sweep {:.3f}s ({:.1f}x)'.format(
+            build_time, sweep_time, baseline / (build_time + sweep_time)))
@@ -0,0 +1,51 @@
+'''Compare the serial and parallel TFIDFVectorizer.transform.
+
+The abstracts of the sample cleaned file are repeated to build a larger
+corpus, a vectorizer is fitted on the sample, and the corpus is transformed
+serially and with pools of different numbers of workers.
+
+Run the following command from the root of the repository:
+python benchmarks/transform_benchmark.py -r 200 -w 1 2 4 8
+'''
+import argparse
+import os
+import os.path
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset import Dataset  # noqa: E402
+from transformer import TFIDFVectorizer  # noqa: E402
+
+
+SAMPLE_ADDRESS = 'data/processed/PubMedSampleFile.tsv'
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    parse = argparse.ArgumentParser('python benchmarks/transform_benchmark.py')
+    message = 'Number of times the sample abstracts are repeated'
+    parse.add_argument('-r', '--repeats', type=int, default=200, help=message)
+    message = 'Numbers of workers to compare with the serial transform'
+    parse.add_argument('-w', '--num_workers', type=int, nargs='+',
+                       default=[1, 2, 4, 8], help=message)
+    arguments = parse.parse_args()
+    sample = [paper['abstract'] for paper in Dataset([SAMPLE_ADDRESS], [])]
+    corpus = sample * arguments.repeats
+    vectorizer = TFIDFVectorizer(ngram_range=(1, 2))
+    vectorizer.fit(sample)
+    print('Documents: {}, cores: {}'.format(len(corpus), os.cpu_count()))
+    baseline, expected = timed(vectorizer.transform, corpus)
+    print('serial: {:.3f}s ({:.0f} documents/s)'.format(
+        baseline, len(corpus) / baseline))
+    for num_workers in arguments.num_workers:
+        observed_time, observed = timed(vectorizer.transform, corpus,
+                                        num_workers=num_workers)
+        assert (observed != expected).nnz == 0
+        print('{} workers: {:.3f}s ({:.0f} documents/s, {:.2f}x)'.format(
+            num_workers, observed_time, len(corpus) / observed_time,
+            baseline / observed_time))
@@ -8,10 +8,13 @@ python build_dataset.py -h
 
 '''
 import argparse
-from dataset import Dataset
+from dataset import Dataset, FilterSpec
+from partitioner import Catalog
+from query_cache import MAX_SIZE, QueryCache
 
 
-def extract_dataset(journals, paths, earliest, latest):
+def extract_dataset(journals, paths, earliest, latest, lazy=False,
+                    num_workers=1, cache_dir=None, cache_size=MAX_SIZE):
     '''Extract a limited amount of data for specific journals and time-range.
 
     Args:
@@ -22,6 +25,14 @@ def extract_dataset(journals, paths, earliest, latest):
             journals to be returned.
         latest: An integer representing the publication year of the most
             recent journals to be returned.
+        lazy: If True, a lazy Dataset is returned, which reads the papers
+            only when it is iterated over (see Dataset).
+        num_workers: Number of processes loading the files in parallel.
+        cache_dir: Address of a query cache directory (see query_cache.py).
+            If provided, the dataset is read from a cached extraction of the
+            same or a larger query over the same files when there is one,
+            and cached otherwise.
+        cache_size: Maximum size of the query cache in bytes.
 
     Returns:
         A Dataset object created from all paper abstracts from the specified
@@ -29,26 +40,45 @@ def extract_dataset(journals, paths, earliest, latest):
 
     '''
 
-    filters = [lambda paper: Dataset.designated_journal(paper, journals),
-               lambda paper: Dataset.is_in_year_range(paper,
-                                                      (earliest, latest))]
-
-    dataset = Dataset(paths, filters, sep='\t')
+    filters = FilterSpec(journals=journals, year_range=(earliest, latest))
+    if cache_dir is None:
+        return Dataset(paths, filters, sep='\t', lazy=lazy,
+                       num_workers=num_workers)
+    cache = QueryCache(cache_dir, max_size=cache_size)
+    cached = cache.lookup(journals, (earliest, latest), paths)
+    if cached is not None:
+        return Dataset([cached], filters, lazy=lazy)
+    dataset = Dataset(paths, filters, sep='\t', lazy=lazy,
+                      num_workers=num_workers)
+    cached = cache.store(journals, (earliest, latest), paths, dataset)
+    if lazy and cached is not None:
+        # Later passes over the lazy dataset read the cached papers only
+        return Dataset([cached], filters, lazy=lazy)
     return dataset
 
 
-def make_dataset(journals_path, inputs_path, earliest, latest):
+def make_dataset(journals_path, inputs_path, earliest, latest,
+                 catalog_path=None, lazy=False, num_workers=1,
+                 cache_dir=None, cache_size=MAX_SIZE):
     '''Create a dataset of paper abstracts.
 
     Args:
         journals_path: Address of a file containing journal names one per line.
         inputs_path: Address of the file containing the path to all valid data.
             A valid data file contain journal name, title, abstract, and
-            publication year in a tab-separated format.
+            publication year in a tab-separated format. It is ignored if
+            catalog_path is provided.
         earliest: An integer representing the publication year of the oldest
             journals to be returned.
         latest: An integer representing the publication year of the most
             recent journals to be returned.
+        catalog_path: Address of the catalog of partitioned data (see
+            partitioner.py). If provided, only the partitions that may contain
+            the specified journals and years are read.
+        lazy: If True, a lazy Dataset is returned (see Dataset).
+        num_workers: Number of processes loading the files in parallel.
+        cache_dir: Address of a query cache directory (see extract_dataset).
+        cache_size: Maximum size of the query cache in bytes.
 
     Returns:
         A dataset generated from the specified list of journals within the
@@ -62,16 +92,22 @@ def make_dataset(journals_path, inputs_path, earliest, latest):
             if line == '':
                 continue
             journals.append(line)
-    #Read data file paths from a file
-    paths = []
-    with open(inputs_path, 'r') as fin:
-        for line in fin:
-            line = line.strip()
-            if line == '':
-                continue
-            paths.append(line)
+    if catalog_path is not None:
+        # Only read the partitions that may contain the papers of interest
+        paths = Catalog.load(catalog_path).select(journals, (earliest, latest))
+    else:
+        #Read data file paths from a file
+        paths = []
+        with open(inputs_path, 'r') as fin:
+            for line in fin:
+                line = line.strip()
+                if line == '':
+                    continue
+                paths.append(line)
     #Create and return the dataset
-    return extract_dataset(journals, paths, earliest, latest)
+    return extract_dataset(journals, paths, earliest, latest, lazy=lazy,
+                           num_workers=num_workers, cache_dir=cache_dir,
+                           cache_size=cache_size)
 
 
 if __name__ == '__main__':
@@ -93,10 +129,27 @@ if __name__ == '__main__':
                        help=msg_out_address)
     msg_out_address = ('Address of the file containing the address of the ' +
                        'cleaned tabular files.')
-    parse.add_argument('-c', '--inputs_path', type=str, required=True,
-                       help=msg_out_address)
+    inputs = parse.add_mutually_exclusive_group(required=True)
+    inputs.add_argument('-c', '--inputs_path', type=str,
+                        help=msg_out_address)
+    msg_catalog = ('Address of the catalog of partitioned cleaned data (see ' +
+                   'partitioner.py); used instead of --inputs_path.')
+    inputs.add_argument('-p', '--catalog_path', type=str, help=msg_catalog)
+    msg_workers = 'Number of processes loading the cleaned files in parallel.'
+    parse.add_argument('-n', '--num_workers', type=int, default=1,
+                       help=msg_workers)
+
+    msg_cache = ('Address of a directory for caching extracted datasets, so ' +
+                 'that repeated and narrower queries skip the cleaned files.')
+    parse.add_argument('--cache_dir', type=str, help=msg_cache)
+    msg_cache_size = 'Maximum size of the cache directory in megabytes.'
+    parse.add_argument('--cache_size', type=int, default=MAX_SIZE >> 20,
+                       help=msg_cache_size)
 
     args = parse.parse_args()
     ds = make_dataset(args.journals_path, args.inputs_path,
-                      args.earliest, args.latest)
+                      args.earliest, args.latest,
+                      catalog_path=args.catalog_path, lazy=True,
+                      num_workers=args.num_workers,
+                      cache_dir=args.cache_dir, cache_size=args.cache_size << 20)
     ds.to_csv(args.out_address, sep='\t')
@@ -7,15 +7,25 @@ python cleaner.py -h
 '''
 
 import argparse
+import hashlib
+import json
 import re
+import struct
 import glob
 import gzip
+import time
+import traceback
 import os
 import os.path
+import shutil
 import multiprocessing as mp
 import logging
 from collections import Counter
 from bs4 import BeautifulSoup
+from lxml import etree
+from columnar import META_NAME, ColumnarWriter, is_columnar
+from pipeline import BackgroundWriter, read_chunks
+from textio import COMPRESSIONS, TextWriter
 
 
 
@@ -36,6 +46,33 @@ class PublicationYearMissingError(Error):
     'Exception to be raised when publication is not available.'
 
 
+# Version of the cleaning logic; it must be increased whenever a change in
+# this module alters the content of the cleaned files.
+PARSER_VERSION = 2
+MANIFEST_NAME = 'manifest.json'
+FAILURES_NAME = 'failures.json'
+# Number of files a worker process cleans before it is replaced by a fresh one
+MAX_TASKS_PER_CHILD = 10
+# PMIDs of the papers in a cleaned tab-separated file are kept in a sidecar
+# file holding one little-endian int64 per line of the cleaned file
+PMID_EXTENSION = '.pmid'
+MISSING_PMID = -1
+# Extension of the sidecar file holding the statistics of a cleaned file
+COUNTS_EXTENSION = '.counts.json'
+# Extension of the sidecar file holding the offset index of a cleaned file
+# (see the indexer module)
+INDEX_EXTENSION = '.index.npz'
+SIDECAR_EXTENSIONS = (PMID_EXTENSION, COUNTS_EXTENSION, INDEX_EXTENSION)
+# Maps each output format to the extension of the cleaned files
+OUTPUT_FORMATS = {'tsv': '.tsv', 'columnar': '.col'}
+# Extensions of all cleaned files, including compressed tab-separated ones
+CLEANED_EXTENSIONS = tuple(sorted(
+    list(OUTPUT_FORMATS.values()) +
+    [OUTPUT_FORMATS['tsv'] + extension for extension in COMPRESSIONS.values()]))
+SUPPORTED_LANGUAGES = {'eng', 'Eng', 'english', 'English'}
+WHITESPACES = re.compile('[\t\n\r]+')
+YEAR_SEPARATORS = re.compile('[ \t -]')
+
 
 def get_article_data(article):
     '''Extract features from an article tag from the PubMed XML files.
@@ -45,22 +82,25 @@ def get_article_data(article):
 
     Returns:
         A dictionary of extracted features, such as Title, Abstract,
-            JournalName, and PubYear (publication year).
+            JournalName, PubYear (publication year), and PMID.
 
     '''
     language = article.Article.Language.text
-    if language not in {'eng', 'Eng', 'english', 'English'}:
+    if language not in SUPPORTED_LANGUAGES:
         raise LanguageNotSupportedError(('{} is not a supported ' +
                                          'language!').format(language))
     paper = dict()
+    # get PubMed identifier
+    pmid = article.PMID
+    paper['PMID'] = None if pmid is None else pmid.text.strip()
     # get journal name
     journal_name = article.Article.Journal.Title.text
-    journal_name = re.sub('[\t\n\r]+', ' ', journal_name).strip()
+    journal_name = WHITESPACES.sub(' ', journal_name).strip()
     paper['JournalName'] = journal_name.strip()
     # get paper publish year
     try:
         pub_date = article.Article.JournalIssue.PubDate
-        year = re.split('[ \t -]', pub_date.MedlineDate.text)[0].strip()
+        year = YEAR_SEPARATORS.split(pub_date.MedlineDate.text)[0].strip()
     except AttributeError as e:
         try:
             year_season_info = pub_date.Year.text.split()
@@ -77,68 +117,623 @@ def get_article_data(article):
     paper['PubYear'] = year
     # get paper title
     paper_title = article.Article.ArticleTitle.text
-    paper_title = re.sub('[\t\n\r]+', ' ', paper_title).strip()
+    paper_title = WHITESPACES.sub(' ', paper_title).strip()
     paper['Title'] = paper_title
     # get abstract
     abstract = article.Article.Abstract
     if (abstract is None) or (abstract.AbstractText is None):
         raise AbstractNotAvailableError('Abstract is not Available')
-    abstract = re.sub('[\t\n\r]+', ' ',
-                      abstract.AbstractText.text).strip()
+    abstract = WHITESPACES.sub(' ', abstract.AbstractText.text).strip()
     paper['Abstract'] = abstract
     return paper
 
 
-def get_content(input_address, output_address):
+def _text(element):
+    '''Concatenate the text of an lxml element and all of its descendants.'''
+    return ''.join(element.itertext())
+
+
+def get_article_data_lxml(article):
+    '''Extract features from an article element parsed by lxml.
+
+    This is a faster counterpart of get_article_data. It relies on direct
+        element lookups on a lightweight lxml tree instead of BeautifulSoup
+        attribute walking, while returning the same features and raising
+        the same exceptions.
+
+    Args:
+        article: An lxml.etree element representing a PubmedArticle tag.
+
+    Returns:
+        A dictionary of extracted features, such as Title, Abstract,
+            JournalName, PubYear (publication year), and PMID.
+
+    '''
+    pmid = article.find('.//PMID')
+    article = article.find('.//Article')
+    language = _text(article.find('.//Language'))
+    if language not in SUPPORTED_LANGUAGES:
+        raise LanguageNotSupportedError(('{} is not a supported ' +
+                                         'language!').format(language))
+    paper = dict()
+    # get PubMed identifier
+    paper['PMID'] = None if pmid is None else _text(pmid).strip()
+    # get journal name
+    journal_name = _text(article.find('.//Journal').find('.//Title'))
+    paper['JournalName'] = WHITESPACES.sub(' ', journal_name).strip()
+    # get paper publish year
+    journal_issue = article.find('.//JournalIssue')
+    pub_date = None
+    if journal_issue is not None:
+        pub_date = journal_issue.find('.//PubDate')
+    if pub_date is None:
+        raise PublicationYearMissingError('Cannot find publication year')
+    medline_date = pub_date.find('.//MedlineDate')
+    if medline_date is not None:
+        year = YEAR_SEPARATORS.split(_text(medline_date))[0].strip()
+    else:
+        year_tag = pub_date.find('.//Year')
+        if year_tag is None:
+            raise PublicationYearMissingError('Cannot find publication year')
+        for val in _text(year_tag).split():
+            if val.isdigit() and len(val) == 4:
+                year = val
+                break
+        else:
+            raise PublicationYearMissingError('Cannot find publication year')
+    paper['PubYear'] = year
+    # get paper title
+    paper_title = _text(article.find('.//ArticleTitle'))
+    paper['Title'] = WHITESPACES.sub(' ', paper_title).strip()
+    # get abstract
+    abstract = article.find('.//Abstract')
+    if abstract is not None:
+        abstract = abstract.find('.//AbstractText')
+    if abstract is None:
+        raise AbstractNotAvailableError('Abstract is not Available')
+    paper['Abstract'] = WHITESPACES.sub(' ', _text(abstract)).strip()
+    return paper
+
+
+# Maps the name of each parser backend to its article feature extractor
+PARSERS = {'beautifulsoup': get_article_data,
+           'lxml': get_article_data_lxml}
+
+
+def to_pmid(pmid):
+    '''Convert an extracted PMID to an integer.
+
+    Args:
+        pmid: A string representing a PubMed identifier, or None.
+
+    Returns:
+        The PMID as an integer, or MISSING_PMID if it is not available.
+    '''
+    if pmid is None or not pmid.isdigit():
+        return MISSING_PMID
+    return int(pmid)
+
+
+def sequence_number(address):
+    '''Get the sequence number of a PubMed file from its name.
+
+    Baseline and update files are numbered in the order they are released,
+        e.g. pubmed19n0973.xml.gz is the 973rd file of 2019, so a paper in a
+        file with a larger sequence number is a newer version of that paper.
+        The numbering restarts with each yearly baseline, so the year is the
+        most significant part of the sequence number.
+
+    Args:
+        address: Address of a PubMed .gz file or of a file cleaned from it.
+
+    Returns:
+        The year and the file number in the name of the file combined as
+            year * 10000 + number, the last number in the name if it has
+            only one, or 0 if it has none.
+    '''
+    numbers = re.findall('[0-9]+', os.path.basename(address).split('.')[0])
+    if not numbers:
+        return 0
+    if len(numbers) == 1:
+        return int(numbers[-1])
+    return int(numbers[-2]) * 10000 + int(numbers[-1])
+
+
+class TSVWriter(object):
+    '''Write cleaned papers into a tab-separated file.
+
+    The papers are written into a temporary file which replaces address on
+        close, so an interrupted run never leaves a partially cleaned file
+        behind. The PMIDs of the papers are written into a sidecar file
+        (see PMID_EXTENSION).
+
+    Args:
+        address: Address of the tab-separated file to be created. A '.gz' or
+            '.zst' extension compresses the file (see textio.TextWriter).
+    '''
+    def __init__(self, address):
+        self.address = address
+        self._pmid_address = '{}{}'.format(address, PMID_EXTENSION)
+        self._temp_pmid_address = '{}.part'.format(self._pmid_address)
+        self._fout = TextWriter(address)
+        self._pmid_fout = open(self._temp_pmid_address, mode='wb')
+
+    def write(self, journal, title, abstract, year, pmid=MISSING_PMID):
+        '''Append a paper to the file.'''
+        self._fout.write('{}\t{}\t{}\t{}\n'.format(journal, title,
+                                                   abstract, year))
+        self._pmid_fout.write(struct.pack('<q', pmid))
+
+    def close(self):
+        '''Close the file and move it into place.'''
+        self._pmid_fout.close()
+        os.replace(self._temp_pmid_address, self._pmid_address)
+        self._fout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._fout.discard()
+            self._pmid_fout.close()
+            os.remove(self._temp_pmid_address)
+
+
+def _discard(element):
+    '''Free an already processed element and its preceding siblings.'''
+    element.clear()
+    while element.getprevious() is not None:
+        del element.getparent()[0]
+
+
+def iter_article_elements(fin):
+    '''Incrementally parse PubmedArticle elements from an XML stream.
+
+    Each element is yielded as soon as its closing tag has been parsed and
+    is discarded, together with any already processed siblings, once the
+    caller asks for the next one. This keeps the memory footprint
+    independent of the size of the stream.
+
+    Args:
+        fin: A binary file object containing PubMed XML data.
+
+    Yields:
+        lxml.etree elements representing PubmedArticle tags.
+
+    '''
+    context = etree.iterparse(fin, events=('end',), tag='PubmedArticle',
+                              huge_tree=True)
+    for _, element in context:
+        yield element
+        _discard(element)
+    del context
+
+
+def iter_chunk_elements(chunks):
+    '''Incrementally parse PubmedArticle elements from chunks of XML data.
+
+    This is the counterpart of iter_article_elements for data that is pushed
+        to the parser, e.g. by a decompression thread.
+
+    Args:
+        chunks: An iterable of bytes containing consecutive parts of
+            PubMed XML data.
+
+    Yields:
+        lxml.etree elements representing PubmedArticle tags.
+
+    '''
+    pull_parser = etree.XMLPullParser(events=('end',), tag='PubmedArticle',
+                                      huge_tree=True)
+    for chunk in chunks:
+        pull_parser.feed(chunk)
+        for _, element in pull_parser.read_events():
+            yield element
+            _discard(element)
+    pull_parser.close()
+    for _, element in pull_parser.read_events():
+        yield element
+        _discard(element)
+
+
+def _as_parser_input(element, parser):
+    '''Convert a PubmedArticle element to the input type of a parser.'''
+    if parser == 'lxml':
+        return element
+    tag = etree.tostring(element, encoding='unicode', with_tail=False)
+    return BeautifulSoup(tag, 'xml')
+
+
+def load_articles(input_address, parser='beautifulsoup'):
+    '''Load all PubmedArticle tags of a .gz file at once.
+
+    Args:
+        input_address: Address of a .gz file from PubMed.
+        parser: Name of the parser backend (see PARSERS) that the articles
+            will be extracted with.
+
+    Returns:
+        A list of PubmedArticle tags; BeautifulSoup tags for the
+            beautifulsoup parser and lxml.etree elements for the lxml parser.
+
+    '''
+    if parser == 'lxml':
+        with gzip.open(input_address, mode='rb') as fin:
+            tree = etree.parse(fin, etree.XMLParser(huge_tree=True))
+        return list(tree.getroot().iter('PubmedArticle'))
+    with gzip.open(input_address, mode='rt', encoding='utf-8') as fin:
+        contents = fin.read()
+    soup = BeautifulSoup(contents, 'xml')
+    del contents
+    articles = soup.find_all('PubmedArticle')
+    del soup
+    return articles
+
+
+def stream_articles(input_address, parser='beautifulsoup'):
+    '''Stream the PubmedArticle tags of a .gz file one at a time.
+
+    The compressed file is decompressed and parsed incrementally, so only a
+        single article is held in memory at any time.
+
+    Args:
+        input_address: Address of a .gz file from PubMed.
+        parser: Name of the parser backend (see PARSERS) that the articles
+            will be extracted with.
+
+    Yields:
+        PubmedArticle tags; BeautifulSoup objects for the beautifulsoup parser
+            and lxml.etree elements for the lxml parser.
+
+    '''
+    with gzip.open(input_address, mode='rb') as fin:
+        for element in iter_article_elements(fin):
+            yield _as_parser_input(element, parser)
+
+
+def pipeline_articles(input_address, parser='beautifulsoup'):
+    '''Stream the PubmedArticle tags of a .gz file decompressed in a thread.
+
+    The file is decompressed by a background thread (see
+        pipeline.read_chunks), which overlaps zlib and I/O time with parsing
+        and feature extraction in the calling thread. As with
+        stream_articles, only a few articles are held in memory at any time.
+
+    Args:
+        input_address: Address of a .gz file from PubMed.
+        parser: Name of the parser backend (see PARSERS) that the articles
+            will be extracted with.
+
+    Yields:
+        PubmedArticle tags; BeautifulSoup objects for the beautifulsoup parser
+            and lxml.etree elements for the lxml parser.
+
+    '''
+    for element in iter_chunk_elements(read_chunks(input_address)):
+        yield _as_parser_input(element, parser)
+
+
+def get_content(input_address, output_address, streaming=False,
+                parser='beautifulsoup', output_format='tsv', pipelined=False):
     '''Clean all .gz file save the resulted clean file.
 
+    The number of papers per journal and year, and the number of records
+        rejected for each reason, are written into a sidecar file of the
+        cleaned file (see write_counts), so that the cleaned file does not
+        need to be read again for summarizing it.
+
     Args:
         input_address: Address of a .gz file from PubMed.
         output_address: Address of a the generated cleaned file.
+        streaming: If True, articles are parsed and written one at a time
+            instead of loading the whole file into memory. The generated
+            file is identical in both cases.
+        parser: Name of the parser backend used for extracting the article
+            features; either 'beautifulsoup' or 'lxml' (see PARSERS). Both
+            produce identical files, but 'lxml' is considerably faster.
+        output_format: Either 'tsv' for a tab-separated file or 'columnar'
+            for a columnar binary file (see the columnar module).
+        pipelined: If True, decompression, parsing and feature extraction,
+            and writing run concurrently in separate threads connected
+            through bounded queues (see pipeline_articles and
+            pipeline.BackgroundWriter). Like streaming, it keeps memory
+            usage flat; it is useful when there are fewer files than
+            processors.
 
     Returns:
         A dictionary representing the number of cleaned abstracts
             (#Abstracts) and the number of processed records (#Records).
 
     '''
-    data = list()
-    with gzip.open(input_address, mode='rt', encoding='utf-8') as fin:
-        contents = fin.read()
-        soup = BeautifulSoup(contents, 'xml')
-        del contents
-        articles = soup.find_all('PubmedArticle')
-        del soup
-        languages = set()
-        num_records = 0
-        num_cleand_abs = 0
+    if parser not in PARSERS:
+        raise ValueError('{} is not a supported parser!'.format(parser))
+    get_data = PARSERS[parser]
+    if pipelined:
+        articles = pipeline_articles(input_address, parser)
+    elif streaming:
+        articles = stream_articles(input_address, parser)
+    else:
+        articles = load_articles(input_address, parser)
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError('{} is not a supported output format!'.format(
+            output_format))
+    if output_format == 'columnar':
+        writer = ColumnarWriter(output_address)
+    else:
+        writer = TSVWriter(output_address)
+    if pipelined:
+        writer = BackgroundWriter(writer)
+    num_records = 0
+    num_cleand_abs = 0
+    counts = Counter()
+    rejected = {'language': 0, 'abstract': 0, 'year': 0}
+    with writer as fout:
         for article in articles:
             try:
                 num_records += 1
-                paper_info = get_article_data(article)
-                data.append(paper_info)
+                paper = get_data(article)
                 num_cleand_abs += 1
             except LanguageNotSupportedError as e:
+                rejected['language'] += 1
                 continue
             except AbstractNotAvailableError as e:
+                rejected['abstract'] += 1
                 continue
             except PublicationYearMissingError as e:
+                rejected['year'] += 1
                 continue
-        with open(output_address, mode='w', encoding='utf-8') as fout:
-            for paper in data:
-                fout.write('{}\t{}\t{}\t{}\n'.format(paper['JournalName'],
-                                                     paper['Title'],
-                                                     paper['Abstract'],
-                                                     paper['PubYear']))
-        result = {'#Abstracts':num_cleand_abs,
-                  '#Records': num_records}
-        return(result)
-
-
-def parallel_cleaner(source_dir, output_dir, number_of_processors, logger):
+            fout.write(paper['JournalName'], paper['Title'],
+                       paper['Abstract'], paper['PubYear'],
+                       to_pmid(paper['PMID']))
+            try:
+                counts[(int(paper['PubYear']), paper['JournalName'])] += 1
+            except ValueError:
+                pass
+    write_counts(output_address, counts, rejected)
+    result = {'#Abstracts':num_cleand_abs,
+              '#Records': num_records}
+    return(result)
+
+
+def fingerprint(address):
+    '''Get the information used for detecting changes in a file.
+
+    Args:
+        address: Address of a file.
+
+    Returns:
+        A dictionary containing the size and the modification time of
+            the file.
+
+    '''
+    stat = os.stat(address)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def cleaned_fingerprint(address):
+    '''Get the fingerprint of a tab-separated or a columnar cleaned file.
+
+    Args:
+        address: Address of a cleaned file.
+
+    Returns:
+        A dictionary containing the size and the modification time of the
+            file, or of the metadata of a columnar file (see fingerprint).
+    '''
+    if is_columnar(address):
+        return fingerprint(os.path.join(address, META_NAME))
+    return fingerprint(address)
+
+
+def content_fingerprint(address, block_size=1 << 20):
+    '''Get a digest of the content of a tab-separated or a columnar file.
+
+    Unlike cleaned_fingerprint, the digest does not depend on the address or
+        the modification time of the file, but the whole file is read.
+
+    Args:
+        address: Address of a cleaned file.
+        block_size: Number of bytes read at once.
+
+    Returns:
+        A hexadecimal SHA-1 digest of the file, or of the names and contents
+            of the files of a columnar file.
+    '''
+    digest = hashlib.sha1()
+    addresses = [address]
+    if is_columnar(address):
+        addresses = [os.path.join(address, name)
+                     for name in sorted(os.listdir(address))]
+    for path in addresses:
+        if path != address:
+            digest.update('{}\0'.format(os.path.basename(path)).encode())
+        with open(path, 'rb') as fin:
+            for block in iter(lambda: fin.read(block_size), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def read_json(address):
+    '''Read a JSON file holding a dictionary.
+
+    Args:
+        address: Address of the JSON file.
+
+    Returns:
+        The content of the file, or an empty dictionary if it does not exist.
+
+    '''
+    if not os.path.exists(address):
+        return {}
+    with open(address, 'r', encoding='utf-8') as fin:
+        return json.load(fin)
+
+
+def read_manifest(output_dir):
+    '''Read the manifest of the files cleaned into a directory.
+
+    Args:
+        output_dir: Address of the directory containing the cleaned files.
+
+    Returns:
+        A dictionary mapping the name of each cleaned .gz file to its
+            fingerprint, the parser version, the name of the cleaned file,
+            its sequence number, and its number of records and cleaned
+            abstracts. An empty dictionary is returned when no manifest
+            exists.
+
+    '''
+    return read_json(os.path.join(output_dir, MANIFEST_NAME))
+
+
+def write_json(address, data):
+    '''Atomically write data into a JSON file.
+
+    Args:
+        address: Address of the JSON file.
+        data: A JSON serializable object.
+
+    '''
+    temp_address = '{}.part'.format(address)
+    with open(temp_address, 'w', encoding='utf-8') as fout:
+        json.dump(data, fout, indent=1, sort_keys=True)
+    os.replace(temp_address, address)
+
+
+def write_manifest(output_dir, manifest):
+    '''Atomically write the manifest of the files cleaned into a directory.
+
+    Args:
+        output_dir: Address of the directory containing the cleaned files.
+        manifest: A dictionary as returned by read_manifest.
+
+    '''
+    write_json(os.path.join(output_dir, MANIFEST_NAME), manifest)
+
+
+def write_counts(address, counts, rejected):
+    '''Write the statistics of a cleaned file into its sidecar file.
+
+    Args:
+        address: Address of the cleaned file.
+        counts: A Counter object mapping (year, journal) tuples to the number
+            of papers of the journal published in the year.
+        rejected: A dictionary mapping each reason for rejecting a record
+            ('language', 'abstract', or 'year') to the number of rejected
+            records.
+
+    '''
+    content = cleaned_fingerprint(address)
+    content['counts'] = [[journal, year, count]
+                         for (year, journal), count in sorted(counts.items())]
+    content['rejected'] = rejected
+    write_json('{}{}'.format(address, COUNTS_EXTENSION), content)
+
+
+def read_counts(address):
+    '''Read the statistics of a cleaned file from its sidecar file.
+
+    Args:
+        address: Address of the cleaned file.
+
+    Returns:
+        A dictionary with the 'counts' (as a Counter object) and 'rejected'
+            statistics of the file (see write_counts), or None if the file
+            has no sidecar or has changed since it was written.
+
+    '''
+    content = read_json('{}{}'.format(address, COUNTS_EXTENSION))
+    if not content:
+        return None
+    stat = cleaned_fingerprint(address)
+    if any(content.get(key) != value for key, value in stat.items()):
+        return None
+    content['counts'] = Counter({(year, journal): count
+                                 for journal, year, count in content['counts']})
+    return content
+
+
+def remove_cleaned(address):
+    '''Remove a cleaned file and its sidecar files, if they exist.
+
+    Args:
+        address: Address of a tab-separated or a columnar cleaned file.
+
+    '''
+    if os.path.isdir(address):
+        shutil.rmtree(address)
+    elif os.path.exists(address):
+        os.remove(address)
+    for extension in SIDECAR_EXTENSIONS:
+        sidecar = '{}{}'.format(address, extension)
+        if os.path.exists(sidecar):
+            os.remove(sidecar)
+
+
+def is_up_to_date(entry, input_address, output_address):
+    '''Check if a cleaned file is up to date with respect to its source.
+
+    Args:
+        entry: The manifest entry of the source file, or None.
+        input_address: Address of a .gz file from PubMed.
+        output_address: Address of the cleaned file.
+
+    Returns:
+        True if the source file has not changed since it was cleaned by the
+            current parser version and the cleaned file and its sidecar
+            files still exist. False, otherwise.
+    '''
+    if entry is None or not os.path.exists(output_address):
+        return False
+    sidecars = ['{}{}'.format(output_address, COUNTS_EXTENSION)]
+    if not is_columnar(output_address):
+        sidecars.append('{}{}'.format(output_address, PMID_EXTENSION))
+    if not all(os.path.exists(address) for address in sidecars):
+        return False
+    if entry.get('parser_version') != PARSER_VERSION:
+        return False
+    current = fingerprint(input_address)
+    return all(entry.get(key) == value for key, value in current.items())
+
+
+def clean_file(task):
+    '''Clean a single .gz file without raising on failure.
+
+    Args:
+        task: A tuple of input address, output address, and the streaming,
+            parser, output_format, and pipelined arguments of get_content.
+
+    Returns:
+        A tuple of input address, output address, the result of get_content
+            (None on failure), and the error message (None on success).
+    '''
+    input_address, output_address = task[:2]
+    try:
+        return input_address, output_address, get_content(*task), None
+    except Exception:
+        return input_address, output_address, None, traceback.format_exc()
+
+
+def parallel_cleaner(source_dir, output_dir, number_of_processors, logger,
+                     streaming=False, parser='beautifulsoup', force=False,
+                     output_format='tsv',
+                     max_tasks_per_child=MAX_TASKS_PER_CHILD,
+                     pipelined=False, compression=None):
     '''Cleans file in parallel.
 
     This method cleans all of the provided .gz files and saves the
-        cleaned files containing the features as a tab-separated files.
+        cleaned files containing the features as a tab-separated files
+        or, optionally, as columnar binary files.
+        A manifest of the cleaned files is kept in output_dir (see
+        read_manifest), so that files that have not changed since the
+        last run are skipped. When a file is cleaned in another format or
+        compression than before, its earlier output is removed.
+        The largest files are dispatched first and results are collected as
+        soon as they are ready. A file that cannot be cleaned does not stop
+        the run; it is reported in the failures.json file in output_dir.
 
     Args:
         source_dir: Address of the directory containing .gz files
@@ -147,26 +742,102 @@ def parallel_cleaner(source_dir, output_dir, number_of_processors, logger):
         number_of_processors: Number of processor used for data cleaning.
         logger: A logging object to log the number of processed records
             and the number of cleaned abstracts.
+        streaming: If True, each file is parsed incrementally with a
+            bounded memory footprint (see get_content).
+        parser: Name of the parser backend used for extracting the article
+            features (see get_content).
+        force: If True, all files are cleaned even if they are up to date.
+        output_format: Format of the cleaned files (see get_content).
+        max_tasks_per_child: Number of files a worker process cleans before
+            it is replaced by a fresh one, which limits memory creep; None
+            keeps workers for the whole run.
+        pipelined: If True, the stages of cleaning each file run
+            concurrently (see get_content).
+        compression: Either None, or a key of textio.COMPRESSIONS for
+            compressing tab-separated cleaned files.
+
+    Returns:
+        A dictionary mapping the name of each file that could not be cleaned
+            to the corresponding error message.
 
     '''
-    pool = mp.Pool(number_of_processors)
+    extension = OUTPUT_FORMATS[output_format]
+    if compression is not None:
+        if output_format != 'tsv':
+            raise ValueError('Only tab-separated files can be compressed')
+        extension += COMPRESSIONS[compression]
     if not os.path.exists(output_dir):
         os.mkdir(output_dir)
-    addresses = []
+    manifest = read_manifest(output_dir)
+    tasks = []
+    fingerprints = {}
+    skipped = []
     for name in glob.glob(os.path.join(source_dir, '*.gz')):
         # Remove file extensions and get the base names
         no_extension_name = name[:-7]
         basename = os.path.basename(no_extension_name)
-        out_address = os.path.join(output_dir, '{}.tsv'.format(basename))
-        addresses.append((name, out_address))
-    results = [pool.apply_async(get_content, args=(name, out_address))
-               for (name, out_address) in addresses]
+        out_address = os.path.join(output_dir, '{}{}'.format(basename,
+                                                             extension))
+        entry = manifest.get(os.path.basename(name))
+        if not force and is_up_to_date(entry, name, out_address):
+            skipped.append(os.path.basename(name))
+            continue
+        fingerprints[name] = fingerprint(name)
+        tasks.append((name, out_address, streaming, parser, output_format,
+                      pipelined))
+    # Dispatch the largest files first to shorten the tail of the run
+    tasks.sort(key=lambda task: fingerprints[task[0]]['size'], reverse=True)
     total = Counter()
-    for e in results:
-        total += Counter(e.get())
+    for key in skipped:
+        total += Counter({'#Abstracts': manifest[key]['#Abstracts'],
+                          '#Records': manifest[key]['#Records']})
+    failures = {}
+    total_bytes = sum(entry['size'] for entry in fingerprints.values())
+    done_bytes = 0
+    num_records = 0
+    start = time.time()
+    with mp.Pool(number_of_processors,
+                 maxtasksperchild=max_tasks_per_child) as pool:
+        results = pool.imap_unordered(clean_file, tasks)
+        for i, (name, out_address, result, error) in enumerate(results, 1):
+            entry = fingerprints[name]
+            done_bytes += entry['size']
+            if error is None:
+                total += Counter(result)
+                num_records += result['#Records']
+                entry.update(result)
+                entry['parser_version'] = PARSER_VERSION
+                entry['output'] = os.path.basename(out_address)
+                entry['sequence'] = sequence_number(name)
+                manifest[os.path.basename(name)] = entry
+                # The outputs of the file in other formats would otherwise be
+                # read along with the new one
+                out_name = out_address[:-len(extension)]
+                for other in CLEANED_EXTENSIONS:
+                    if other != extension:
+                        remove_cleaned('{}{}'.format(out_name, other))
+                # Persist the progress so an interrupted run can be resumed
+                write_manifest(output_dir, manifest)
+            else:
+                failures[os.path.basename(name)] = error
+                logger.error('Failed to clean {}:\n{}'.format(name, error))
+            elapsed = time.time() - start
+            rate = num_records / elapsed if elapsed > 0 else 0.0
+            eta = elapsed * (total_bytes - done_bytes) / max(done_bytes, 1)
+            logger.info('{}/{} files done, {:.0f} records/sec, ETA {:.0f} sec'
+                        .format(i, len(tasks), rate, eta))
+    failures_address = os.path.join(output_dir, FAILURES_NAME)
+    if failures:
+        write_json(failures_address, failures)
+    elif os.path.exists(failures_address):
+        os.remove(failures_address)
+    logger.info(('Cleaned {} files, skipped {} unchanged files, and ' +
+                 'failed to clean {} files').format(
+                     len(tasks) - len(failures), len(skipped), len(failures)))
     msg = '\t'.join(['{}: {}'.format(key, value)
                     for key, value in total.items()])
     logger.info(msg)
+    return failures
 
 
 if __name__ == '__main__':
@@ -177,7 +848,31 @@ if __name__ == '__main__':
     message = 'The address of the directory to save the cleaned files'
     parse.add_argument('-o', '--output_dir', type=str, required=True, help=message)
     parse.add_argument('-n', '--number_of_processors', type=int, default=1,
-                       help='Number of processors to use')    
+                       help='Number of processors to use')
+    message = ('Parse the .gz files incrementally, one article at a time, '
+               'to keep memory usage flat regardless of the file size')
+    parse.add_argument('--streaming', action='store_true', help=message)
+    message = ('Run decompression, parsing, and writing of each file '
+               'concurrently; useful when there are fewer files than processors')
+    parse.add_argument('--pipelined', action='store_true', help=message)
+    message = ('The parser backend used for extracting article features; '
+               'lxml is faster and produces identical files')
+    parse.add_argument('-p', '--parser', type=str, default='beautifulsoup',
+                       choices=sorted(PARSERS), help=message)
+    message = ('Format of the cleaned files; columnar files can be read '
+               'through memory-mapping by Dataset and summarizer')
+    parse.add_argument('--format', type=str, default='tsv',
+                       choices=sorted(OUTPUT_FORMATS), help=message)
+    message = 'Compress the tab-separated cleaned files'
+    parse.add_argument('--compression', type=str, default=None,
+                       choices=sorted(COMPRESSIONS), help=message)
+    message = 'Clean all files, including the ones that have not changed'
+    parse.add_argument('-f', '--force', action='store_true', help=message)
+    message = ('Number of files a worker process cleans before it is '
+               'replaced, which limits memory creep (default: {}); 0 never '
+               'replaces workers').format(MAX_TASKS_PER_CHILD)
+    parse.add_argument('-m', '--max_tasks_per_child', type=int,
+                       default=MAX_TASKS_PER_CHILD, help=message)
     arguments = parse.parse_args()
     # Define a logging object
     logging.basicConfig(level=logging.INFO)
@@ -185,4 +880,11 @@ if __name__ == '__main__':
     parallel_cleaner(source_dir=arguments.source_dir,
                      output_dir=arguments.output_dir,
                      number_of_processors=arguments.number_of_processors,
-                     logger=logger)
+                     logger=logger,
+                     streaming=arguments.streaming,
+                     parser=arguments.parser,
+                     force=arguments.force,
+                     output_format=arguments.format,
+                     max_tasks_per_child=arguments.max_tasks_per_child or None,
+                     pipelined=arguments.pipelined,
+                     compression=arguments.compression)
@@ -0,0 +1,226 @@
+'''Columnar binary storage for cleaned PubMed data.
+
+A columnar file is a directory holding one NumPy array per field, so that
+the journal and publication year of all papers can be read through
+memory-mapping without touching the title and abstract bytes:
+
+    meta.json               Format version, number of rows, and the journal
+                            dictionary (journal names ordered by their code).
+    journal.npy             int32 journal codes (dictionary encoded).
+    year.npy                int16 publication years; MISSING_YEAR if the
+                            year is not an integer.
+    title.bin               UTF-8 encoded titles, concatenated.
+    title_offsets.npy       int64 offsets of the titles in title.bin.
+    abstract.bin            UTF-8 encoded abstracts, concatenated.
+    abstract_offsets.npy    int64 offsets of the abstracts in abstract.bin.
+    pmid.npy                int64 PubMed identifiers; -1 if not available.
+'''
+import json
+import os
+import os.path
+import shutil
+from array import array
+import numpy as np
+
+
+FORMAT_VERSION = 1
+META_NAME = 'meta.json'
+MISSING_YEAR = -1
+ENCODING = 'utf-8'
+TEXT_FIELDS = ('title', 'abstract')
+
+
+def is_columnar(address):
+    '''Check if an address points to a columnar file.
+
+    Args:
+        address: Address of a file or a directory.
+
+    Returns:
+        True if address is a columnar file. False, otherwise.
+    '''
+    return os.path.isfile(os.path.join(address, META_NAME))
+
+
+def to_year(year):
+    '''Convert a publication year to an integer that fits the year column.
+
+    Args:
+        year: A string or an integer representing a publication year.
+
+    Returns:
+        The year as an integer, or MISSING_YEAR if it is not a valid year.
+    '''
+    try:
+        year = int(year)
+    except ValueError:
+        return MISSING_YEAR
+    if not 0 <= year <= np.iinfo(np.int16).max:
+        return MISSING_YEAR
+    return year
+
+
+class ColumnarWriter(object):
+    '''Write papers into a columnar file.
+
+    Titles and abstracts are streamed to disk as they are written, while the
+        small fixed-size columns are kept in memory until the writer is
+        closed. The columnar file is created in a temporary directory which
+        replaces address on close, so readers never see a partial file.
+
+    Args:
+        address: Address of the columnar file (a directory) to be created.
+    '''
+    def __init__(self, address):
+        self.address = address
+        self._temp_address = '{}.part'.format(address)
+        if os.path.exists(self._temp_address):
+            shutil.rmtree(self._temp_address)
+        os.makedirs(self._temp_address)
+        self._codes = {}
+        self._journals = array('i')
+        self._years = array('h')
+        self._pmids = array('q')
+        self._offsets = {}
+        self._files = {}
+        for field in TEXT_FIELDS:
+            self._offsets[field] = array('q', [0])
+            path = os.path.join(self._temp_address, '{}.bin'.format(field))
+            self._files[field] = open(path, 'wb')
+
+    def write(self, journal, title, abstract, year, pmid=-1):
+        '''Append a paper to the columnar file.
+
+        Args:
+            journal: Journal name.
+            title: Paper title.
+            abstract: Paper abstract.
+            year: Publication year as a string or an integer.
+            pmid: PubMed identifier as an integer; -1 if not available.
+        '''
+        code = self._codes.setdefault(journal, len(self._codes))
+        self._journals.append(code)
+        self._years.append(to_year(year))
+        self._pmids.append(pmid)
+        for field, text in zip(TEXT_FIELDS, (title, abstract)):
+            data = text.encode(ENCODING)
+            self._files[field].write(data)
+            offsets = self._offsets[field]
+            offsets.append(offsets[-1] + len(data))
+
+    def close(self):
+        '''Write the fixed-size columns and move the file into place.'''
+        for fout in self._files.values():
+            fout.close()
+        path = self._temp_address
+        np.save(os.path.join(path, 'journal.npy'),
+                np.frombuffer(self._journals, dtype=np.int32))
+        np.save(os.path.join(path, 'year.npy'),
+                np.frombuffer(self._years, dtype=np.int16))
+        np.save(os.path.join(path, 'pmid.npy'),
+                np.frombuffer(self._pmids, dtype=np.int64))
+        for field in TEXT_FIELDS:
+            np.save(os.path.join(path, '{}_offsets.npy'.format(field)),
+                    np.frombuffer(self._offsets[field], dtype=np.int64))
+        journals = sorted(self._codes, key=self._codes.get)
+        meta = {'format_version': FORMAT_VERSION,
+                'num_rows': len(self._years),
+                'journals': journals}
+        with open(os.path.join(path, META_NAME), 'w',
+                  encoding=ENCODING) as fout:
+            json.dump(meta, fout)
+        if os.path.exists(self.address):
+            shutil.rmtree(self.address)
+        os.replace(path, self.address)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            for fout in self._files.values():
+                fout.close()
+            shutil.rmtree(self._temp_address, ignore_errors=True)
+
+
+class ColumnarFile(object):
+    '''Read-only, memory-mapped access to a columnar file.
+
+    Args:
+        address: Address of a columnar file created by ColumnarWriter.
+    '''
+    def __init__(self, address):
+        self.address = address
+        with open(os.path.join(address, META_NAME), encoding=ENCODING) as fin:
+            meta = json.load(fin)
+        if meta['format_version'] != FORMAT_VERSION:
+            raise ValueError(('{} has an unsupported columnar format ' +
+                              'version').format(address))
+        self.journals = meta['journals']
+        self.journal_codes = self._load('journal.npy')
+        self.years = self._load('year.npy')
+        # Files written before PMIDs were kept have no PMID column
+        self.pmids = None
+        if os.path.exists(os.path.join(address, 'pmid.npy')):
+            self.pmids = self._load('pmid.npy')
+        self._offsets = {}
+        self._buffers = {}
+        for field in TEXT_FIELDS:
+            self._offsets[field] = self._load('{}_offsets.npy'.format(field))
+            path = os.path.join(address, '{}.bin'.format(field))
+            if os.path.getsize(path) == 0:
+                # Empty files cannot be memory-mapped
+                self._buffers[field] = np.empty(0, dtype=np.uint8)
+            else:
+                self._buffers[field] = np.memmap(path, dtype=np.uint8,
+                                                 mode='r')
+
+    def _load(self, name):
+        return np.load(os.path.join(self.address, name), mmap_mode='r')
+
+    def __len__(self):
+        return len(self.years)
+
+    def _text(self, field, i):
+        offsets = self._offsets[field]
+        data = self._buffers[field][offsets[i]:offsets[i + 1]]
+        return data.tobytes().decode(ENCODING)
+
+    def journal(self, i):
+        '''Get the journal name of the i-th paper.'''
+        return self.journals[self.journal_codes[i]]
+
+    def title(self, i):
+        '''Get the title of the i-th paper.'''
+        return self._text('title', i)
+
+    def abstract(self, i):
+        '''Get the abstract of the i-th paper.'''
+        return self._text('abstract', i)
+
+    def select(self, journals=None, year_range=None):
+        '''Find the papers matching a set of journals and a range of years.
+
+        Only the journal and year columns are read. Papers without a valid
+            publication year are never selected.
+
+        Args:
+            journals: An iterable of journal names, or None for all journals.
+            year_range: A list or tuple of size 2, where
+                year_range[0] <= year_range[1], or None for all years.
+
+        Returns:
+            A NumPy array containing the indices of the matching papers.
+        '''
+        mask = self.years != MISSING_YEAR
+        if journals is not None:
+            journals = set(journals)
+            codes = [code for code, name in enumerate(self.journals)
+                     if name in journals]
+            mask &= np.isin(self.journal_codes, codes)
+        if year_range is not None:
+            mask &= (self.years >= year_range[0]) & \
+                (self.years <= year_range[1])
+        return np.flatnonzero(mask)
@@ -0,0 +1,214 @@
+'''Query the number of papers per journal and year.
+
+The counts are held in a dense NumPy matrix of journals by consecutive
+publication years, along with the list of journal names, so that totals
+over ranges of years, the journals with the most papers, the time series
+of a journal, and growth rates are computed with vectorized operations.
+A cube is built from a summary (see summarizer.summarize) and saved into
+a compressed .npz file.
+
+For information about using this module run the following command.
+
+python count_cube.py -h
+'''
+import argparse
+import numpy as np
+
+
+class CountCube(object):
+    '''The number of papers per journal and year.
+
+    Args:
+        journals: A list of journal names.
+        first_year: The publication year of the first column of counts.
+        counts: A NumPy matrix where counts[i, j] is the number of papers of
+            journals[i] published in first_year + j.
+    '''
+    def __init__(self, journals, first_year, counts):
+        self.journals = list(journals)
+        self.first_year = first_year
+        self.counts = counts
+        self._positions = {journal: i for i, journal in enumerate(journals)}
+
+    @property
+    def years(self):
+        '''Get the publication years of the columns of counts.'''
+        return np.arange(self.first_year, self.first_year +
+                         self.counts.shape[1])
+
+    @classmethod
+    def from_counter(cls, summary):
+        '''Build a cube from a summary.
+
+        Args:
+            summary: A Counter object mapping (year, journal) tuples to the
+                number of papers (see summarizer.summarize).
+
+        Returns:
+            A CountCube object.
+        '''
+        if not summary:
+            return cls([], 0, np.zeros((0, 0), dtype=np.int64))
+        journals = sorted({journal for _, journal in summary})
+        positions = {journal: i for i, journal in enumerate(journals)}
+        keys = list(summary)
+        years = np.array([year for year, _ in keys], dtype=np.int64)
+        rows = np.array([positions[journal] for _, journal in keys])
+        first_year = int(years.min())
+        counts = np.zeros((len(journals), int(years.max()) - first_year + 1),
+                          dtype=np.int64)
+        np.add.at(counts, (rows, years - first_year),
+                  np.array([summary[key] for key in keys], dtype=np.int64))
+        return cls(journals, first_year, counts)
+
+    def to_counter(self):
+        '''Convert the cube to a summary (see from_counter).'''
+        rows, columns = np.nonzero(self.counts)
+        return {(int(self.first_year + column), self.journals[row]):
+                int(self.counts[row, column])
+                for row, column in zip(rows, columns)}
+
+    @classmethod
+    def load(cls, address):
+        '''Load a cube saved by save.'''
+        with np.load(address) as content:
+            return cls(content['journals'].tolist(),
+                       int(content['first_year']), content['counts'])
+
+    def save(self, address):
+        '''Save the cube into a compressed .npz file.
+
+        Args:
+            address: Address of the file; it should end with '.npz'.
+        '''
+        dtype = np.int32 if self.counts.size == 0 or \
+            self.counts.max() <= np.iinfo(np.int32).max else np.int64
+        with open(address, 'wb') as fout:
+            np.savez_compressed(fout, journals=np.array(self.journals,
+                                                        dtype=str),
+                                first_year=self.first_year,
+                                counts=self.counts.astype(dtype))
+
+    def _columns(self, year_range):
+        if year_range is None:
+            return slice(None)
+        start = max(year_range[0] - self.first_year, 0)
+        stop = max(year_range[1] - self.first_year + 1, 0)
+        return slice(start, stop)
+
+    def _rows(self, journals):
+        if journals is None:
+            return slice(None)
+        return [self._positions[journal] for journal in journals
+                if journal in self._positions]
+
+    def total(self, year_range=None, journals=None):
+        '''Get the number of papers.
+
+        Args:
+            year_range: A list or tuple of size 2, where
+                year_range[0] <= year_range[1], or None for all years.
+            journals: A list of journal names, or None for all journals.
+
+        Returns:
+            The number of papers of the journals published in the years.
+        '''
+        return int(self.counts[self._rows(journals),
+                               self._columns(year_range)].sum())
+
+    def journal_totals(self, year_range=None):
+        '''Get the number of papers of each journal in a range of years.
+
+        Returns:
+            A NumPy array aligned with journals.
+        '''
+        return self.counts[:, self._columns(year_range)].sum(axis=1)
+
+    def top_journals(self, k, year_range=None):
+        '''Get the journals with the most papers in a range of years.
+
+        Args:
+            k: Number of journals.
+            year_range: A list or tuple of size 2, where
+                year_range[0] <= year_range[1], or None for all years.
+
+        Returns:
+            A list of at most k (journal, count) tuples, by decreasing count;
+                journals without papers in the years are left out.
+        '''
+        totals = self.journal_totals(year_range)
+        k = min(k, int(np.count_nonzero(totals)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-totals, k - 1)[:k]
+        top = top[np.lexsort((top, -totals[top]))]
+        return [(self.journals[i], int(totals[i])) for i in top]
+
+    def time_series(self, journal, year_range=None):
+        '''Get the number of papers of a journal per year.
+
+        Args:
+            journal: A journal name.
+            year_range: A list or tuple of size 2, where
+                year_range[0] <= year_range[1], or None for all years.
+
+        Returns:
+            A tuple of a NumPy array of years and a NumPy array of the
+                corresponding numbers of papers.
+        '''
+        columns = self._columns(year_range)
+        years = self.years[columns]
+        if journal not in self._positions:
+            return years, np.zeros(len(years), dtype=np.int64)
+        return years, self.counts[self._positions[journal], columns]
+
+    def growth_rates(self, start, end):
+        '''Get the compound annual growth rate of each journal.
+
+        Args:
+            start: The first publication year.
+            end: The last publication year, where end > start.
+
+        Returns:
+            A NumPy array aligned with journals holding
+                (count[end] / count[start]) ** (1 / (end - start)) - 1, which
+                is NaN for journals without papers in start.
+        '''
+        def column(year):
+            if not 0 <= year - self.first_year < self.counts.shape[1]:
+                return np.zeros(len(self.journals))
+            return self.counts[:, year - self.first_year].astype(np.float64)
+
+        first, last = column(start), column(end)
+        rates = np.full(len(self.journals), np.nan)
+        valid = first > 0
+        rates[valid] = (last[valid] / first[valid]) ** (1.0 / (end - start)) - 1
+        return rates
+
+
+if __name__ == '__main__':
+    parse = argparse.ArgumentParser('python count_cube.py')
+    message = 'Address of a count cube saved by summarizer.py'
+    parse.add_argument('-c', '--cube_file', type=str, required=True,
+                       help=message)
+    message = 'Number of journals with the most papers to list'
+    parse.add_argument('-k', '--top', type=int, default=20, help=message)
+    message = 'The earliest publication year to consider'
+    parse.add_argument('-e', '--earliest', type=int, default=None,
+                       help=message)
+    message = 'The latest publication year to consider'
+    parse.add_argument('-l', '--latest', type=int, default=None, help=message)
+    arguments = parse.parse_args()
+    cube = CountCube.load(arguments.cube_file)
+    year_range = None
+    if arguments.earliest is not None or arguments.latest is not None:
+        year_range = (arguments.earliest or cube.first_year,
+                      arguments.latest or cube.years[-1])
+    rates = None
+    if year_range is not None and year_range[1] > year_range[0]:
+        rates = cube.growth_rates(*year_range)
+    print('Journal\tCount\tGrowth')
+    for journal, count in cube.top_journals(arguments.top, year_range):
+        growth = '' if rates is None else \
+            '{:.3f}'.format(rates[cube.journals.index(journal)])
+        print('{}\t{}\t{}'.format(journal, count, growth))
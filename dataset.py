@@ -1,13 +1,244 @@
 '''Create a datasets from valid data files.
 '''
-import os
-import os.path
+import multiprocessing as mp
+import pickle
+from array import array
+import numpy as np
 import pandas as pd
+from columnar import TEXT_FIELDS, ColumnarFile, is_columnar
+from indexer import OffsetIndex
+from scanner import TSVScanner
+from textio import TextWriter
+from partitioner import Catalog
 
 
 ENCODING = 'utf-8'
 
 
+class _ColumnarPaper(dict):
+    '''A paper from a columnar file whose title and abstract are decoded
+    only when they are accessed for the first time.
+
+    Args:
+        source: A ColumnarFile object.
+        i: The index of the paper in source.
+    '''
+    def __init__(self, source, i):
+        super().__init__(journal=source.journal(i),
+                         year=int(source.years[i]))
+        self._source = source
+        self._i = i
+
+    def __missing__(self, key):
+        if key == 'title':
+            value = self._source.title(self._i)
+        elif key == 'abstract':
+            value = self._source.abstract(self._i)
+        else:
+            raise KeyError(key)
+        self[key] = value
+        return value
+
+    def to_dict(self):
+        return {'journal': self['journal'], 'title': self['title'],
+                'abstract': self['abstract'], 'year': self['year']}
+
+
+class PaperStore(object):
+    '''Compact, array-backed storage for papers.
+
+    Journals are interned to integer codes, years are kept in a small-integer
+        array, and titles and abstracts are kept in contiguous UTF-8 buffers
+        with offsets. A paper is only materialized as a dictionary with
+        'journal', 'title', 'abstract', and 'year' as keys when it is
+        accessed.
+
+    Args:
+        papers: An iterable of papers represented as dictionaries.
+    '''
+    def __init__(self, papers=()):
+        self.journals = []
+        self._codes = {}
+        self.journal_codes = array('i')
+        self.years = array('h')
+        self._buffers = {field: bytearray() for field in TEXT_FIELDS}
+        self._offsets = {field: array('q', [0]) for field in TEXT_FIELDS}
+        self.extend(papers)
+
+    def _intern(self, journal):
+        code = self._codes.get(journal)
+        if code is None:
+            code = self._codes[journal] = len(self.journals)
+            self.journals.append(journal)
+        return code
+
+    def append(self, paper):
+        '''Add a paper represented as a dictionary.'''
+        self.journal_codes.append(self._intern(paper['journal']))
+        self.years.append(paper['year'])
+        for field in TEXT_FIELDS:
+            buffer = self._buffers[field]
+            buffer += paper[field].encode(ENCODING)
+            self._offsets[field].append(len(buffer))
+
+    def extend(self, papers):
+        '''Add papers represented as dictionaries.'''
+        for paper in papers:
+            self.append(paper)
+
+    def merge(self, other):
+        '''Add all papers of another PaperStore without materializing them.'''
+        codes = np.array([self._intern(journal) for journal in other.journals],
+                         dtype=np.int32)
+        other_codes = np.frombuffer(other.journal_codes, dtype=np.int32)
+        self.journal_codes.frombytes(codes[other_codes].tobytes())
+        self.years.extend(other.years)
+        for field in TEXT_FIELDS:
+            shift = len(self._buffers[field])
+            self._buffers[field] += other._buffers[field]
+            offsets = np.frombuffer(other._offsets[field], dtype=np.int64)
+            self._offsets[field].frombytes((offsets[1:] + shift).tobytes())
+
+    def _text(self, field, i):
+        offsets = self._offsets[field]
+        return self._buffers[field][offsets[i]:offsets[i + 1]].decode(ENCODING)
+
+    def texts(self, field):
+        '''Get the decoded 'title' or 'abstract' of all papers as a list.'''
+        return [self._text(field, i) for i in range(len(self))]
+
+    def __len__(self):
+        return len(self.years)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('paper index out of range')
+        return {'journal': self.journals[self.journal_codes[i]],
+                'title': self._text('title', i),
+                'abstract': self._text('abstract', i),
+                'year': self.years[i]}
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_dataframe(self):
+        '''Convert the papers to a pandas DataFrame.
+
+        The journal column is categorical and is built directly from the
+            journal codes.
+
+        Returns:
+            A pandas.DataFrame with 'journal', 'title', 'abstract', and
+                'year' columns.
+        '''
+        codes = np.frombuffer(self.journal_codes, dtype=np.int32)
+        years = np.frombuffer(self.years, dtype=np.int16)
+        return pd.DataFrame(
+            {'journal': pd.Categorical.from_codes(codes, self.journals),
+             'title': self.texts('title'),
+             'abstract': self.texts('abstract'),
+             'year': years.astype(np.int64)},
+            columns=['journal', 'title', 'abstract', 'year'])
+
+
+def _load_store(task):
+    '''Load and filter one file into a PaperStore in a worker process.'''
+    path, conditions, sep = task
+    return PaperStore(Dataset.iter_load(path, conditions, sep=sep))
+
+
+def _is_picklable(value):
+    try:
+        pickle.dumps(value)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+    return True
+
+
+class FilterSpec(object):
+    '''A declarative paper filter that Dataset compiles into a fast path.
+
+    Instead of building a paper for every record and calling a function on
+        it, Dataset checks the journal with a hash set and the year with a
+        range comparison before the remaining fields of a record are even
+        split. A FilterSpec is also a callable condition, so it can be
+        combined with arbitrary functions in a list of conditions.
+
+    Args:
+        journals: An iterable of journal names, or None for all journals.
+        year_range: A list or tuple of size 2, where
+            year_range[0] <= year_range[1], or None for all years.
+        keywords: An iterable of keywords, or None. If provided, a paper
+            matches only if its title or abstract contains at least one of
+            the keywords (case insensitive).
+    '''
+    def __init__(self, journals=None, year_range=None, keywords=None):
+        self.journals = None if journals is None else frozenset(journals)
+        self.year_range = None if year_range is None else tuple(year_range)
+        self.keywords = None
+        if keywords is not None:
+            self.keywords = tuple(keyword.lower() for keyword in keywords)
+
+    def match_fields(self, journal, year):
+        '''Check the journal and the year of a paper.
+
+        Args:
+            journal: The journal of a paper.
+            year: The publication year of a paper as an integer.
+
+        Returns:
+            True if the paper is from the journals and years of interest.
+        '''
+        if self.journals is not None and journal not in self.journals:
+            return False
+        if self.year_range is not None and \
+                not self.year_range[0] <= year <= self.year_range[1]:
+            return False
+        return True
+
+    def match_text(self, paper):
+        '''Check the keywords against the title and abstract of a paper.'''
+        if self.keywords is None:
+            return True
+        title = paper['title'].lower()
+        abstract = paper['abstract'].lower()
+        return any(keyword in title or keyword in abstract
+                   for keyword in self.keywords)
+
+    def __call__(self, paper):
+        if not self.match_fields(paper['journal'], paper['year']):
+            return False
+        return self.match_text(paper)
+
+
+def _compile(conditions):
+    '''Split conditions into a FilterSpec for the fast path and the rest.
+
+    Args:
+        conditions: A FilterSpec, or a list of FilterSpec objects and
+            functions.
+
+    Returns:
+        A tuple of the first FilterSpec (None if there is none) and a list
+            of the remaining conditions.
+    '''
+    if isinstance(conditions, FilterSpec):
+        return conditions, []
+    spec = None
+    others = []
+    for condition in conditions:
+        if spec is None and isinstance(condition, FilterSpec):
+            spec = condition
+        else:
+            others.append(condition)
+    return spec, others
+
+
 class Dataset(object):
     '''An object containing the information about paper abstracts.
 
@@ -16,54 +247,160 @@ class Dataset(object):
             to a valid data file.
         conditions: A list of functions that get a paper represented as a
             dictionary with 'journal', 'title', 'abstract', and 'year'
-            s keys.
+            s keys. A FilterSpec, either alone or in the list, is compiled
+            into a fast path that skips non-matching records cheaply.
         sep: A field separator for the files with their address in paths
             parameter. The default is tab ('\t').
+        lazy: If True, papers are not loaded into memory; they are read from
+            the files whenever the dataset is iterated over (see __iter__,
+            iter_batches, to_csv, and to_dataframe), which keeps memory
+            usage constant regardless of the size of the dataset. Lazy
+            datasets do not support indexing.
+        num_workers: Number of processes that load and filter the files in
+            parallel. Each process sends the papers of a file back as a
+            PaperStore, and the files are merged in the order of paths.
+            The conditions must be picklable (e.g. a FilterSpec or
+            module-level functions, but not lambdas); otherwise the files
+            are loaded serially.
     '''
-    def __init__(self, paths, conditions, sep='\t'):
+    def __init__(self, paths, conditions, sep='\t', lazy=False,
+                 num_workers=1):
         assert isinstance(paths, list), 'paths must be a list of file paths'
-        self._data = []
+        self._data = PaperStore()
         self.filters = conditions
-        for path in paths:
-            self.data.extend(Dataset.load(path, conditions, sep=sep))
+        self.paths = paths
+        self.sep = sep
+        self.lazy = lazy
+        self.num_workers = num_workers
+        if not lazy:
+            for store in self._iter_stores():
+                self._data.merge(store)
+
+    def _iter_stores(self):
+        '''Load the files as PaperStore objects in the order of paths.'''
+        num_workers = min(self.num_workers, len(self.paths))
+        if num_workers <= 1 or not _is_picklable(self.filters):
+            for path in self.paths:
+                yield PaperStore(Dataset.iter_load(path, self.filters,
+                                                   sep=self.sep))
+            return
+        tasks = [(path, self.filters, self.sep) for path in self.paths]
+        with mp.Pool(num_workers) as pool:
+            yield from pool.imap(_load_store, tasks)
 
     @property
     def data(self):
         '''Get abstract information.
 
+        For a lazy dataset, all papers are read into a new PaperStore.
+
         Returns:
-            Abstract data as a list of dictionaries.
+            Abstract data as a PaperStore, a sequence of papers represented
+                as dictionaries.
         '''
+        if self.lazy:
+            return PaperStore(self)
         return self._data
 
     @data.setter
     def data(self, value):
+        if not isinstance(value, PaperStore):
+            value = PaperStore(value)
         self._data = value
+        self.lazy = False
+
+    def __iter__(self):
+        if not self.lazy:
+            return iter(self._data)
+        if self.num_workers > 1:
+            return (paper for store in self._iter_stores() for paper in store)
+        return (paper for path in self.paths
+                for paper in Dataset.iter_load(path, self.filters,
+                                               sep=self.sep))
+
+    def iter_batches(self, batch_size):
+        '''Iterate over the papers in batches.
+
+        Args:
+            batch_size: Maximum number of papers in each batch.
+
+        Yields:
+            Lists of papers represented as dictionaries.
+        '''
+        batch = []
+        for paper in self:
+            batch.append(paper)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
 
     @classmethod
     def load(cls, path, conditions, sep='\t'):
         '''Load abstract data from a given file and filtering it.
 
         Args:
-            path: Address of a valid data file.
+            path: Address of a valid data file, either tab-separated,
+                possibly compressed (see the textio module), or columnar
+                (see the columnar module).
             conditions: A list of functions that get a paper represented as a
-            dictionary with 'journal', 'title', 'abstract', and 'year' as keys.
+            dictionary with 'journal', 'title', 'abstract', and 'year' as keys,
+            and FilterSpec objects (see Dataset).
             sep: A field separator for the file from the provided path.
                 The default is tab ('\t').
 
+        Returns:
+            A list of papers represented as dictionaries.
+
         '''
-        articles = []
-        with open(path, 'r') as fin:
-            for line in fin:
-                if line.strip() == '':
-                    continue
-                journal, title, abstract, year = line.strip().split(sep)
+        return list(cls.iter_load(path, conditions, sep=sep))
+
+    @classmethod
+    def iter_load(cls, path, conditions, sep='\t'):
+        '''Stream abstract data from a given file and filtering it.
+
+        Args:
+            path: Address of a valid data file, either tab-separated,
+                possibly compressed (see the textio module), or columnar
+                (see the columnar module).
+            conditions: A list of functions that get a paper represented as a
+            dictionary with 'journal', 'title', 'abstract', and 'year' as keys,
+            and FilterSpec objects (see Dataset).
+            sep: A field separator for the file from the provided path.
+                The default is tab ('\t').
+
+        Yields:
+            Papers represented as dictionaries.
+
+        '''
+        if is_columnar(path):
+            yield from cls.iter_load_columnar(path, conditions)
+            return
+        spec, conditions = _compile(conditions)
+        ranges = None
+        if spec is not None and (spec.journals is not None or
+                                 spec.year_range is not None):
+            index = OffsetIndex.load(path, sep=sep)
+            if index is not None:
+                # Only the lines of the journals and years of interest are read
+                ranges = index.lookup(spec.journals, spec.year_range)
+                if not ranges:
+                    return
+        with TSVScanner(path, sep=sep) as scanner:
+            for row in scanner.iter_rows(ranges):
+                journal = scanner.journal(row)
                 try:
-                    year = int(year)
+                    year = scanner.year(row)
                 except ValueError:
                     continue
-                paper = {'journal': journal, 'title': title,
-                         'abstract': abstract, 'year': year}
+                if spec is not None and not spec.match_fields(journal, year):
+                    continue
+                # The title and abstract are only decoded for matching papers
+                paper = {'journal': journal, 'title': scanner.title(row),
+                         'abstract': scanner.abstract(row), 'year': year}
+                if spec is not None and not spec.match_text(paper):
+                    continue
                 # Apply conditions
                 is_valid = True
                 for condition in conditions:
@@ -71,21 +408,96 @@ class Dataset(object):
                         is_valid = False
                         break
                 if is_valid is True:
-                    articles.append(paper)
-        return articles
+                    yield paper
+
+    @classmethod
+    def load_columnar(cls, path, conditions):
+        '''Load abstract data from a columnar file and filtering it.
+
+        Args:
+            path: Address of a columnar file.
+            conditions: A list of functions that get a paper represented as a
+            dictionary with 'journal', 'title', 'abstract', and 'year' as keys,
+            and FilterSpec objects (see Dataset).
 
-    def to_csv(self, path, sep='\t'):
+        Returns:
+            A list of papers represented as dictionaries.
+
+        '''
+        return list(cls.iter_load_columnar(path, conditions))
+
+    @classmethod
+    def iter_load_columnar(cls, path, conditions):
+        '''Stream abstract data from a columnar file and filtering it.
+
+        The journal and year of a FilterSpec are checked on whole columns at
+            once, and the title and abstract of a paper are only decoded if
+            a condition asks for them or the paper satisfies all conditions.
+
+        Args:
+            path: Address of a columnar file.
+            conditions: A list of functions that get a paper represented as a
+            dictionary with 'journal', 'title', 'abstract', and 'year' as keys,
+            and FilterSpec objects (see Dataset).
+
+        Yields:
+            Papers represented as dictionaries.
+
+        '''
+        spec, conditions = _compile(conditions)
+        source = ColumnarFile(path)
+        if spec is None:
+            indices = source.select()
+        else:
+            indices = source.select(spec.journals, spec.year_range)
+        for i in indices:
+            paper = _ColumnarPaper(source, i)
+            if spec is not None and not spec.match_text(paper):
+                continue
+            if all(condition(paper) is not False for condition in conditions):
+                yield paper.to_dict()
+
+    @classmethod
+    def from_catalog(cls, catalog_path, journals, year_range, sep='\t',
+                     lazy=False, num_workers=1):
+        '''Create a dataset from the relevant partitions of partitioned data.
+
+        Only the partitions that can contain papers from the journals and
+            years of interest are read (see partitioner.Catalog).
+
+        Args:
+            catalog_path: Address of a catalog file, or of the partitioned
+                directory containing it.
+            journals: A list of journals.
+            year_range: A list or tuple of size 2, where
+                year_range[0] <= year_range[1].
+            sep: A field separator for the partitions.
+            lazy: If True, a lazy dataset is created (see Dataset).
+            num_workers: Number of processes loading the partitions.
+
+        Returns:
+            A Dataset object of the papers from the specified journals and
+                years.
+        '''
+        paths = Catalog.load(catalog_path).select(journals, year_range)
+        return cls(paths, FilterSpec(journals, year_range), sep=sep, lazy=lazy,
+                   num_workers=num_workers)
+
+    def to_csv(self, path, sep='\t', num_threads=1):
         '''Write a dataset to file.
 
+        The file is written through large buffers into a temporary file,
+            which replaces path once the whole dataset has been written.
+
         Args:
-            path: Address of a valid data file.
+            path: Address of a valid data file. A '.gz' or '.zst' extension
+                compresses the file (see textio.TextWriter).
             sep: A field separator for the file that dataset will be saved on.
                 The default is tab ('\t').
+            num_threads: Number of threads compressing the file.
         '''
-        if os.path.exists(path):
-            os.remove(path)
-        with open(path, 'a', encoding=ENCODING) as fout:
-            for paper in self.data:
+        with TextWriter(path, num_threads=num_threads) as fout:
+            for paper in self:
                 fout.write('{}{}{}{}{}{}{}\n'.format(paper['journal'], sep,
                                                      paper['title'], sep,
                                                      paper['abstract'], sep,
@@ -125,19 +537,32 @@ class Dataset(object):
             return True
         return False
 
-    def to_dataframe(self):
+    def to_dataframe(self, chunksize=None):
         '''Convert a Dataset object to a pandas DataFrame.
 
+        Args:
+            chunksize: If provided, an iterator of DataFrames holding at most
+                chunksize papers each is returned instead of a single
+                DataFrame, so that large datasets can be processed in chunks.
+
         Returns:
-            A pandas.DataFrame that represent the Dataset object.
+            A pandas.DataFrame that represent the Dataset object, or an
+                iterator of pandas.DataFrame objects if chunksize is provided.
+                The journal column is categorical.
 
         '''
-        return pd.DataFrame.from_records(self.data,
-                                         columns=['journal', 'title',
-                                                  'abstract', 'year'])
+        if chunksize is not None:
+            return (PaperStore(batch).to_dataframe()
+                    for batch in self.iter_batches(chunksize))
+        return self.data.to_dataframe()
 
     def __len__(self):
+        if self.lazy:
+            # Counting the papers of a lazy dataset requires a full pass
+            return sum(1 for _ in self)
         return len(self.data)
 
     def __getitem__(self, i):
+        if self.lazy:
+            raise TypeError('Lazy datasets do not support indexing')
         return self.data[i]
@@ -0,0 +1,293 @@
+'''Remove outdated versions of papers from the cleaned PubMed files.
+
+The daily update files of PubMed contain new versions of papers that are
+already in the baseline or in earlier update files. This module keeps only
+the newest version of each paper, identified by its PMID, where a paper
+from a file with a larger sequence number (see cleaner.sequence_number)
+is newer. The PMID of the newest version of each paper is kept in a
+compact on-disk index of sorted NumPy arrays, which is updated
+incrementally as new update files are cleaned.
+
+For information about using this module run the following command.
+
+python deduplicator.py -h
+'''
+import argparse
+import glob
+import logging
+import os
+import os.path
+import shutil
+import numpy as np
+from cleaner import (CLEANED_EXTENSIONS, MISSING_PMID, PMID_EXTENSION,
+                     cleaned_fingerprint, read_json, sequence_number,
+                     write_json)
+from columnar import ColumnarFile, ColumnarWriter, is_columnar
+from textio import ENCODING, TextWriter, open_binary
+
+
+INDEX_NAME = 'pmid_index'
+MANIFEST_NAME = 'dedup_manifest.json'
+
+
+class PMIDIndex(object):
+    '''Map each PMID to the sequence number of the file with its newest version.
+
+    Args:
+        pmids: A sorted NumPy array of unique PMIDs.
+        sequences: A NumPy array of the sequence numbers of the files holding
+            the newest version of the corresponding PMIDs.
+    '''
+    def __init__(self, pmids=None, sequences=None):
+        if pmids is None:
+            pmids = np.empty(0, dtype=np.int64)
+            sequences = np.empty(0, dtype=np.int32)
+        self.pmids = pmids
+        self.sequences = sequences
+
+    def __len__(self):
+        return len(self.pmids)
+
+    @classmethod
+    def load(cls, directory):
+        '''Load an index through memory-mapping.
+
+        Args:
+            directory: Address of the directory the index was saved into.
+
+        Returns:
+            A PMIDIndex object, which is empty if no index has been saved.
+        '''
+        addresses = [os.path.join(directory, '{}.{}.npy'.format(INDEX_NAME,
+                                                                name))
+                     for name in ('pmids', 'sequences')]
+        if not all(os.path.exists(address) for address in addresses):
+            return cls()
+        return cls(*[np.load(address, mmap_mode='r')
+                     for address in addresses])
+
+    def save(self, directory):
+        '''Save the index as NumPy arrays.
+
+        Args:
+            directory: Address of the directory to save the index into.
+        '''
+        for name in ('pmids', 'sequences'):
+            address = os.path.join(directory, '{}.{}.npy'.format(INDEX_NAME,
+                                                                 name))
+            temp_address = '{}.part.npy'.format(address[:-4])
+            np.save(temp_address, getattr(self, name))
+            os.replace(temp_address, address)
+
+    def update(self, pmids, sequence):
+        '''Add the PMIDs of a file to the index.
+
+        Args:
+            pmids: A NumPy array of the PMIDs in the file.
+            sequence: The sequence number of the file.
+
+        Returns:
+            A set of the sequence numbers of other files holding a version
+                of a paper that is no longer the newest one.
+        '''
+        pmids = np.unique(pmids[pmids != MISSING_PMID])
+        all_pmids = np.concatenate([self.pmids, pmids])
+        all_sequences = np.concatenate(
+            [self.sequences, np.full(len(pmids), sequence, dtype=np.int32)])
+        order = np.lexsort((all_sequences, all_pmids))
+        all_pmids = all_pmids[order]
+        all_sequences = all_sequences[order]
+        # Keep the entry with the largest sequence number of each PMID
+        newest = np.append(all_pmids[1:] != all_pmids[:-1], True)
+        outdated = set(int(x) for x in np.unique(all_sequences[~newest]))
+        outdated.discard(sequence)
+        self.pmids = all_pmids[newest]
+        self.sequences = all_sequences[newest]
+        return outdated
+
+    def newest(self, pmids):
+        '''Get the sequence number of the newest version of each PMID.
+
+        Args:
+            pmids: A NumPy array of PMIDs.
+
+        Returns:
+            A NumPy array of sequence numbers; -1 for PMIDs not in the index.
+        '''
+        if len(self.pmids) == 0:
+            return np.full(len(pmids), -1, dtype=np.int32)
+        positions = np.searchsorted(self.pmids, pmids)
+        positions = np.minimum(positions, len(self.pmids) - 1)
+        found = self.pmids[positions] == pmids
+        return np.where(found, self.sequences[positions], -1)
+
+    def keep_mask(self, pmids, sequence):
+        '''Find the papers of a file that are the newest version.
+
+        Papers without a PMID are always kept. If a PMID appears more than
+            once in a file, only its last occurrence is kept.
+
+        Args:
+            pmids: A NumPy array of the PMIDs of the papers in the file.
+            sequence: The sequence number of the file.
+
+        Returns:
+            A boolean NumPy array that is True for the papers to be kept.
+        '''
+        missing = pmids == MISSING_PMID
+        _, reversed_positions = np.unique(pmids[::-1], return_index=True)
+        last = np.zeros(len(pmids), dtype=bool)
+        last[len(pmids) - 1 - reversed_positions] = True
+        return missing | (last & (self.newest(pmids) == sequence))
+
+
+def read_pmids(address):
+    '''Read the PMIDs of the papers in a cleaned file.
+
+    Args:
+        address: Address of a tab-separated or a columnar cleaned file.
+
+    Returns:
+        A NumPy array of int64 PMIDs in the order of the papers in the file.
+    '''
+    if is_columnar(address):
+        pmids = ColumnarFile(address).pmids
+    else:
+        pmid_address = '{}{}'.format(address, PMID_EXTENSION)
+        pmids = None
+        if os.path.exists(pmid_address):
+            pmids = np.fromfile(pmid_address, dtype='<i8')
+    if pmids is None:
+        raise ValueError(('{} has no PMIDs; clean it again with ' +
+                          '--force').format(address))
+    return np.asarray(pmids, dtype=np.int64)
+
+
+def write_subset(address, output_address, mask):
+    '''Copy a subset of the papers in a cleaned file.
+
+    Args:
+        address: Address of a tab-separated or a columnar cleaned file.
+        output_address: Address of the file to be written, in the format
+            and with the compression of the input file.
+        mask: A boolean NumPy array that is True for the papers to be copied.
+    '''
+    if is_columnar(address):
+        source = ColumnarFile(address)
+        with ColumnarWriter(output_address) as fout:
+            for i in np.flatnonzero(mask):
+                fout.write(source.journal(i), source.title(i),
+                           source.abstract(i), int(source.years[i]),
+                           int(source.pmids[i]))
+        return
+    with open_binary(address) as fin, TextWriter(output_address) as fout:
+        for line, keep in zip(fin, mask):
+            if keep:
+                fout.write(line.decode(ENCODING))
+    pmid_address = '{}{}'.format(output_address, PMID_EXTENSION)
+    pmids = read_pmids(address)[mask]
+    pmids.astype('<i8').tofile('{}.part'.format(pmid_address))
+    os.replace('{}.part'.format(pmid_address), pmid_address)
+
+
+def _remove(address):
+    if os.path.isdir(address):
+        shutil.rmtree(address)
+    elif os.path.exists(address):
+        os.remove(address)
+        pmid_address = '{}{}'.format(address, PMID_EXTENSION)
+        if os.path.exists(pmid_address):
+            os.remove(pmid_address)
+
+
+def deduplicate(source_dir, output_dir, logger, force=False):
+    '''Write the cleaned files without outdated versions of papers.
+
+    The PMID index and a manifest of the processed files are kept in
+        output_dir. When only new files have been added to source_dir, the
+        index is updated incrementally and only the new files and the files
+        holding papers they supersede are written. If a file has changed or
+        has been removed, the index is rebuilt.
+
+    Args:
+        source_dir: Address of the directory containing the cleaned files
+            (see cleaner.parallel_cleaner).
+        output_dir: Address of the directory to save the deduplicated files.
+        logger: A logging object to log the number of papers kept.
+        force: If True, the index is rebuilt and all files are written.
+
+    Returns:
+        A dictionary mapping the name of each cleaned file to the number of
+            papers kept from it.
+    '''
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    addresses = {}
+    for extension in CLEANED_EXTENSIONS:
+        for address in glob.glob(os.path.join(source_dir,
+                                              '*{}'.format(extension))):
+            addresses[os.path.basename(address)] = address
+    sequences = {name: sequence_number(name) for name in addresses}
+    if len(set(sequences.values())) != len(sequences):
+        raise ValueError('Each cleaned file must have a unique sequence number')
+    names = sorted(addresses, key=sequences.get)
+    manifest = read_json(os.path.join(output_dir, MANIFEST_NAME))
+    fingerprints = {name: cleaned_fingerprint(addresses[name])
+                    for name in names}
+    changed = [name for name in manifest
+               if name not in addresses or
+               any(manifest[name].get(key) != value
+                   for key, value in fingerprints[name].items())]
+    new = [name for name in names if name not in manifest]
+    if force or changed:
+        index = PMIDIndex()
+        manifest = {}
+        to_write = set(names)
+        for name in changed:
+            if name not in addresses:
+                _remove(os.path.join(output_dir, name))
+    else:
+        index = PMIDIndex.load(output_dir)
+        to_write = set(new)
+    for name in names:
+        if name in manifest:
+            continue
+        outdated = index.update(read_pmids(addresses[name]), sequences[name])
+        to_write.update(other for other in names
+                        if sequences[other] in outdated)
+    for name in names:
+        if name not in to_write:
+            continue
+        mask = index.keep_mask(read_pmids(addresses[name]), sequences[name])
+        write_subset(addresses[name], os.path.join(output_dir, name), mask)
+        entry = dict(fingerprints[name])
+        entry['sequence'] = sequences[name]
+        entry['kept'] = int(mask.sum())
+        manifest[name] = entry
+    # The index and the manifest are saved only after all files are written,
+    # so an interrupted run is repeated from the previous state
+    index.save(output_dir)
+    write_json(os.path.join(output_dir, MANIFEST_NAME), manifest)
+    logger.info('Wrote {} of {} files; {} papers are kept'.format(
+        len(to_write), len(names),
+        sum(entry['kept'] for entry in manifest.values())))
+    return {name: entry['kept'] for name, entry in manifest.items()}
+
+
+if __name__ == '__main__':
+    parse = argparse.ArgumentParser('python deduplicator.py')
+    message = 'The address of the directory containing the cleaned files'
+    parse.add_argument('-s', '--source_dir', type=str, required=True,
+                       help=message)
+    message = 'The address of the directory to save the deduplicated files'
+    parse.add_argument('-o', '--output_dir', type=str, required=True,
+                       help=message)
+    message = 'Rebuild the PMID index and write all files'
+    parse.add_argument('-f', '--force', action='store_true', help=message)
+    arguments = parse.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(__name__)
+    deduplicate(source_dir=arguments.source_dir,
+                output_dir=arguments.output_dir,
+                logger=logger,
+                force=arguments.force)
@@ -0,0 +1,207 @@
+'''Index the journals and publication years of cleaned tab-separated files.
+
+The index of a cleaned file is saved next to it (with the '.index.npz'
+extension) and holds the byte offset, journal, and publication year of
+every line of the file, along with the fingerprint of the file (see
+cleaner.fingerprint). Readers use the index to seek straight to the lines
+of the journals and years they are interested in, and to skip files that
+contain none of them. An index is ignored once its file has changed.
+
+For information about using this module run the following command.
+
+python indexer.py -h
+'''
+import argparse
+import glob
+import logging
+import os
+import os.path
+import numpy as np
+from cleaner import INDEX_EXTENSION, OUTPUT_FORMATS, fingerprint
+from columnar import MISSING_YEAR
+
+
+ENCODING = 'utf-8'
+
+
+def index_address(address):
+    '''Get the address of the index of a cleaned file.'''
+    return '{}{}'.format(address, INDEX_EXTENSION)
+
+
+class OffsetIndex(object):
+    '''The byte offsets of the lines of a cleaned file by journal and year.
+
+    Args:
+        size: Size of the indexed file in bytes.
+        mtime: Modification time of the indexed file.
+        sep: The field separator of the indexed file.
+        journals: A list of the journal names in the file.
+        journal_codes: A NumPy array of the position of the journal of each
+            line in journals.
+        years: A NumPy array of the publication year of each line, which is
+            MISSING_YEAR for lines without a valid year.
+        offsets: A NumPy array of the byte offsets of the lines, followed by
+            the size of the file.
+    '''
+    def __init__(self, size, mtime, sep, journals, journal_codes, years,
+                 offsets):
+        self.size = size
+        self.mtime = mtime
+        self.sep = sep
+        self.journals = journals
+        self.journal_codes = journal_codes
+        self.years = years
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.years)
+
+    @classmethod
+    def build(cls, address, sep='\t'):
+        '''Index a cleaned tab-separated file.
+
+        Args:
+            address: Address of the cleaned file.
+            sep: The field separator of the file.
+
+        Returns:
+            An OffsetIndex object.
+        '''
+        stat = fingerprint(address)
+        separator = sep.encode(ENCODING)
+        journals = []
+        codes = {}
+        journal_codes = []
+        years = []
+        offsets = [0]
+        with open(address, 'rb') as fin:
+            for line in fin:
+                journal = line[:line.find(separator)].decode(ENCODING)
+                code = codes.get(journal)
+                if code is None:
+                    code = codes[journal] = len(journals)
+                    journals.append(journal)
+                journal_codes.append(code)
+                try:
+                    year = int(line[line.rfind(separator) + len(separator):])
+                except ValueError:
+                    year = MISSING_YEAR
+                years.append(year)
+                offsets.append(offsets[-1] + len(line))
+        return cls(stat['size'], stat['mtime'], sep, journals,
+                   np.array(journal_codes, dtype=np.int32),
+                   np.array(years, dtype=np.int16),
+                   np.array(offsets, dtype=np.int64))
+
+    @classmethod
+    def load(cls, address, sep='\t'):
+        '''Load the index of a cleaned file if it is up to date.
+
+        Args:
+            address: Address of the cleaned file (not of the index).
+            sep: The field separator the index must have been built with.
+
+        Returns:
+            An OffsetIndex object, or None if the file has no index or the
+                file has changed since it was indexed.
+        '''
+        path = index_address(address)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as content:
+            index = cls(int(content['size']), float(content['mtime']),
+                        str(content['sep']), list(content['journals']),
+                        content['journal_codes'], content['years'],
+                        content['offsets'])
+        stat = fingerprint(address)
+        if index.size != stat['size'] or index.mtime != stat['mtime'] or \
+                index.sep != sep:
+            return None
+        return index
+
+    def save(self, address):
+        '''Save the index next to its cleaned file.
+
+        Args:
+            address: Address of the cleaned file (not of the index).
+        '''
+        path = index_address(address)
+        temp_path = '{}.part'.format(path)
+        with open(temp_path, 'wb') as fout:
+            np.savez(fout, size=self.size, mtime=self.mtime, sep=self.sep,
+                     journals=np.array(self.journals, dtype=str),
+                     journal_codes=self.journal_codes, years=self.years,
+                     offsets=self.offsets)
+        os.replace(temp_path, path)
+
+    def lookup(self, journals=None, year_range=None):
+        '''Find the byte ranges of the lines of interest.
+
+        Lines without a valid publication year are never selected.
+
+        Args:
+            journals: An iterable of journal names, or None for all journals.
+            year_range: A list or tuple of size 2, where
+                year_range[0] <= year_range[1], or None for all years.
+
+        Returns:
+            A list of (start, end) byte ranges of consecutive matching lines.
+        '''
+        mask = self.years != MISSING_YEAR
+        if journals is not None:
+            wanted = [code for code, journal in enumerate(self.journals)
+                      if journal in journals]
+            mask &= np.isin(self.journal_codes, wanted)
+        if year_range is not None:
+            mask &= (self.years >= year_range[0]) & \
+                (self.years <= year_range[1])
+        lines = np.flatnonzero(mask)
+        if len(lines) == 0:
+            return []
+        breaks = np.flatnonzero(np.diff(lines) != 1) + 1
+        firsts = lines[np.concatenate([[0], breaks])]
+        lasts = lines[np.concatenate([breaks - 1, [len(lines) - 1]])]
+        return list(zip(self.offsets[firsts].tolist(),
+                        self.offsets[lasts + 1].tolist()))
+
+
+def build_indexes(source_dir, logger, force=False, sep='\t'):
+    '''Index the cleaned tab-separated files of a directory.
+
+    Files whose index is up to date are skipped. Partitioned directories
+        (see partitioner.py) are searched recursively.
+
+    Args:
+        source_dir: Address of the directory containing the cleaned files.
+        logger: A logging object to log the number of indexed files.
+        force: If True, all files are indexed again.
+        sep: The field separator of the files.
+
+    Returns:
+        The number of files that were indexed.
+    '''
+    pattern = os.path.join(source_dir, '**', '*{}'.format(
+        OUTPUT_FORMATS['tsv']))
+    addresses = sorted(glob.glob(pattern, recursive=True))
+    built = 0
+    for address in addresses:
+        if not force and OffsetIndex.load(address, sep=sep) is not None:
+            continue
+        OffsetIndex.build(address, sep=sep).save(address)
+        built += 1
+    logger.info('Indexed {} of {} files'.format(built, len(addresses)))
+    return built
+
+
+if __name__ == '__main__':
+    parse = argparse.ArgumentParser('python indexer.py')
+    message = 'The address of the directory containing the cleaned files'
+    parse.add_argument('-s', '--source_dir', type=str, required=True,
+                       help=message)
+    message = 'Index all files, even those with an up-to-date index'
+    parse.add_argument('-f', '--force', action='store_true', help=message)
+    arguments = parse.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(__name__)
+    build_indexes(arguments.source_dir, logger, force=arguments.force)
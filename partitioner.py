@@ -0,0 +1,252 @@
+'''Partition cleaned PubMed files by publication year and journal.
+
+The partitioned data are tab-separated files laid out as
+
+    <output_dir>/year=<year>/bucket=<bucket>.tsv
+
+where bucket is a stable hash of the journal name (see journal_bucket).
+A catalog file (catalog.json) in output_dir lists the partitions, so that
+readers only open the partitions that can contain the journals and years
+they are interested in.
+
+For information about using this module run the following command.
+
+python partitioner.py -h
+'''
+import argparse
+import glob
+import json
+import logging
+import os
+import os.path
+import shutil
+import zlib
+from collections import defaultdict
+import numpy as np
+from cleaner import (CLEANED_EXTENSIONS, MISSING_PMID, PMID_EXTENSION,
+                     write_json)
+from columnar import ColumnarFile, MISSING_YEAR, is_columnar
+from textio import open_text
+
+
+CATALOG_NAME = 'catalog.json'
+NUM_BUCKETS = 64
+# Partition of the papers without a valid publication year
+UNKNOWN_YEAR = 'unknown'
+# Number of buffered papers that triggers writing them to the partitions
+BUFFER_SIZE = 100000
+
+
+def journal_bucket(journal, num_buckets=NUM_BUCKETS):
+    '''Get the hash bucket of a journal.
+
+    Args:
+        journal: A journal name.
+        num_buckets: Number of hash buckets.
+
+    Returns:
+        An integer in [0, num_buckets).
+    '''
+    return zlib.crc32(journal.encode('utf-8')) % num_buckets
+
+
+def iter_papers(address, sep='\t'):
+    '''Iterate over the papers of a cleaned file.
+
+    Args:
+        address: Address of a tab-separated, possibly compressed, or a
+            columnar cleaned file.
+        sep: The field separator of tab-separated files.
+
+    Yields:
+        Tuples of journal, title, abstract, year, and PMID, where year is
+            None if it is not a valid year and PMID is MISSING_PMID if it is
+            not available.
+    '''
+    if is_columnar(address):
+        source = ColumnarFile(address)
+        for i in range(len(source)):
+            year = int(source.years[i])
+            pmid = MISSING_PMID
+            if source.pmids is not None:
+                pmid = int(source.pmids[i])
+            yield (source.journal(i), source.title(i), source.abstract(i),
+                   None if year == MISSING_YEAR else year, pmid)
+        return
+    pmid_address = '{}{}'.format(address, PMID_EXTENSION)
+    pmids = None
+    if os.path.exists(pmid_address):
+        pmids = np.fromfile(pmid_address, dtype='<i8')
+    with open_text(address) as fin:
+        for i, line in enumerate(fin):
+            if line.strip() == '':
+                continue
+            journal, title, abstract, year = line.strip().split(sep)
+            try:
+                year = int(year)
+            except ValueError:
+                year = None
+            pmid = MISSING_PMID if pmids is None else int(pmids[i])
+            yield journal, title, abstract, year, pmid
+
+
+def partition_path(year, bucket):
+    '''Get the path of a partition relative to the partitioned directory.'''
+    if year is None:
+        year = UNKNOWN_YEAR
+    return os.path.join('year={}'.format(year),
+                        'bucket={:03d}.tsv'.format(bucket))
+
+
+class Catalog(object):
+    '''The list of partitions of a partitioned directory.
+
+    Args:
+        directory: Address of the partitioned directory.
+        num_buckets: Number of journal hash buckets.
+        partitions: A list of dictionaries with the 'path' (relative to
+            directory), 'year' (None for unknown years), 'bucket', and
+            'count' (number of papers) of each partition.
+    '''
+    def __init__(self, directory, num_buckets, partitions):
+        self.directory = directory
+        self.num_buckets = num_buckets
+        self.partitions = partitions
+
+    @classmethod
+    def load(cls, address):
+        '''Load a catalog.
+
+        Args:
+            address: Address of a catalog file or of the partitioned
+                directory containing it.
+
+        Returns:
+            A Catalog object.
+        '''
+        if os.path.isdir(address):
+            address = os.path.join(address, CATALOG_NAME)
+        with open(address, 'r', encoding='utf-8') as fin:
+            content = json.load(fin)
+        return cls(os.path.dirname(address), content['num_buckets'],
+                   content['partitions'])
+
+    def save(self):
+        '''Write the catalog into its partitioned directory.'''
+        write_json(os.path.join(self.directory, CATALOG_NAME),
+                   {'num_buckets': self.num_buckets,
+                    'partitions': self.partitions})
+
+    def select(self, journals=None, year_range=None):
+        '''Get the partitions that may contain papers of interest.
+
+        Args:
+            journals: An iterable of journal names, or None for all journals.
+            year_range: A list or tuple of size 2, where
+                year_range[0] <= year_range[1], or None for all years.
+
+        Returns:
+            A list of the addresses of the matching partitions.
+        '''
+        buckets = None
+        if journals is not None:
+            buckets = {journal_bucket(journal, self.num_buckets)
+                       for journal in journals}
+        paths = []
+        for partition in self.partitions:
+            if buckets is not None and partition['bucket'] not in buckets:
+                continue
+            if year_range is not None:
+                year = partition['year']
+                if year is None or not year_range[0] <= year <= year_range[1]:
+                    continue
+            paths.append(os.path.join(self.directory, partition['path']))
+        return paths
+
+
+def repartition(paths, output_dir, logger, num_buckets=NUM_BUCKETS, sep='\t'):
+    '''Write cleaned files as partitions by year and journal hash bucket.
+
+    The papers keep their relative order within each partition. The
+        partitions are written into a temporary directory which replaces
+        output_dir once all of them, and the catalog, are complete.
+
+    Args:
+        paths: A list of addresses of tab-separated or columnar cleaned files.
+        output_dir: Address of the directory to save the partitions into.
+        logger: A logging object to log the number of partitions.
+        num_buckets: Number of journal hash buckets.
+        sep: The field separator of tab-separated files.
+
+    Returns:
+        A Catalog object of the partitioned directory.
+    '''
+    temp_dir = '{}.part'.format(output_dir.rstrip(os.sep))
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+    os.makedirs(temp_dir)
+    buffers = defaultdict(list)
+    counts = defaultdict(int)
+    num_buffered = 0
+
+    def flush():
+        for key, papers in buffers.items():
+            path = os.path.join(temp_dir, partition_path(*key))
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'a', encoding='utf-8') as fout:
+                for journal, title, abstract, year, _ in papers:
+                    if year is None:
+                        year = UNKNOWN_YEAR
+                    fout.write('{}\t{}\t{}\t{}\n'.format(journal, title,
+                                                         abstract, year))
+            pmids = np.array([paper[4] for paper in papers], dtype='<i8')
+            with open('{}{}'.format(path, PMID_EXTENSION), 'ab') as fout:
+                fout.write(pmids.tobytes())
+        buffers.clear()
+
+    for address in paths:
+        for paper in iter_papers(address, sep=sep):
+            key = (paper[3], journal_bucket(paper[0], num_buckets))
+            buffers[key].append(paper)
+            counts[key] += 1
+            num_buffered += 1
+            if num_buffered >= BUFFER_SIZE:
+                flush()
+                num_buffered = 0
+    flush()
+    partitions = [{'path': partition_path(year, bucket), 'year': year,
+                   'bucket': bucket, 'count': counts[(year, bucket)]}
+                  for (year, bucket) in sorted(counts, key=lambda key: (
+                      key[0] is None, key[0] or 0, key[1]))]
+    catalog = Catalog(temp_dir, num_buckets, partitions)
+    catalog.save()
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    os.replace(temp_dir, output_dir)
+    catalog.directory = output_dir
+    logger.info('Wrote {} papers into {} partitions'.format(
+        sum(counts.values()), len(partitions)))
+    return catalog
+
+
+if __name__ == '__main__':
+    parse = argparse.ArgumentParser('python partitioner.py')
+    message = 'The address of the directory containing the cleaned files'
+    parse.add_argument('-s', '--source_dir', type=str, required=True,
+                       help=message)
+    message = 'The address of the directory to save the partitions into'
+    parse.add_argument('-o', '--output_dir', type=str, required=True,
+                       help=message)
+    message = 'Number of journal hash buckets per year'
+    parse.add_argument('-b', '--num_buckets', type=int, default=NUM_BUCKETS,
+                       help=message)
+    arguments = parse.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(__name__)
+    paths = []
+    for extension in CLEANED_EXTENSIONS:
+        paths.extend(glob.glob(os.path.join(arguments.source_dir,
+                                            '*{}'.format(extension))))
+    repartition(sorted(paths), arguments.output_dir, logger,
+                num_buckets=arguments.num_buckets)
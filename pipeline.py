@@ -0,0 +1,151 @@
+'''Thread-based building blocks for pipelining the stages of a single file.
+
+Decompression, parsing, and writing a file are I/O or zlib bound for a
+large part of their time, and both release the GIL. Running them in
+separate threads connected through bounded queues lets them overlap with
+the CPU bound feature extraction while keeping memory usage bounded.
+'''
+import gzip
+import queue
+import threading
+
+
+CHUNK_SIZE = 1 << 20
+QUEUE_SIZE = 8
+BATCH_SIZE = 1000
+# Marks the end of a stream of items passed through a queue
+_END = object()
+
+
+class _Failure(object):
+    '''Carry an exception raised in a worker thread to the consumer.'''
+    def __init__(self, error):
+        self.error = error
+
+
+def _put(items, item, stop):
+    '''Put an item into a bounded queue unless the consumer has stopped.'''
+    while not stop.is_set():
+        try:
+            items.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def read_chunks(input_address, chunk_size=CHUNK_SIZE, queue_size=QUEUE_SIZE):
+    '''Decompress a .gz file in a background thread.
+
+    Args:
+        input_address: Address of a .gz file.
+        chunk_size: Number of decompressed bytes in each chunk.
+        queue_size: Maximum number of decompressed chunks waiting to be
+            consumed.
+
+    Yields:
+        Consecutive chunks of the decompressed content of the file.
+    '''
+    chunks = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def decompress():
+        try:
+            with gzip.open(input_address, mode='rb') as fin:
+                while True:
+                    chunk = fin.read(chunk_size)
+                    if not chunk:
+                        break
+                    if not _put(chunks, chunk, stop):
+                        return
+            _put(chunks, _END, stop)
+        except Exception as e:
+            _put(chunks, _Failure(e), stop)
+
+    reader = threading.Thread(target=decompress, daemon=True)
+    reader.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is _END:
+                break
+            if isinstance(chunk, _Failure):
+                raise chunk.error
+            yield chunk
+    finally:
+        stop.set()
+        reader.join()
+
+
+class BackgroundWriter(object):
+    '''Hand records over to a writer running in a background thread.
+
+    Records are grouped into batches which are passed to the writing thread
+        through a bounded queue, so the caller rarely waits for I/O.
+
+    Args:
+        writer: An object with write and close methods, such as
+            cleaner.TSVWriter or columnar.ColumnarWriter. It is used as a
+            context manager by the writing thread.
+        batch_size: Number of records in each batch.
+        queue_size: Maximum number of batches waiting to be written.
+    '''
+    def __init__(self, writer, batch_size=BATCH_SIZE, queue_size=QUEUE_SIZE):
+        self._writer = writer
+        self._batch_size = batch_size
+        self._batch = []
+        self._batches = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            with self._writer as fout:
+                while True:
+                    batch = self._batches.get()
+                    if batch is _END:
+                        break
+                    if isinstance(batch, _Failure):
+                        raise batch.error
+                    for record in batch:
+                        fout.write(*record)
+        except Exception as e:
+            self._error = e
+            self._stop.set()
+
+    def _flush(self):
+        if self._batch:
+            if not _put(self._batches, self._batch, self._stop):
+                self._raise()
+            self._batch = []
+
+    def _raise(self):
+        self._thread.join()
+        raise self._error
+
+    def write(self, *record):
+        '''Append a record; the arguments are passed to writer.write.'''
+        self._batch.append(record)
+        if len(self._batch) >= self._batch_size:
+            self._flush()
+
+    def close(self):
+        '''Write the remaining records and close the underlying writer.'''
+        self._flush()
+        _put(self._batches, _END, self._stop)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # Let the writer discard its partial output
+            _put(self._batches, _Failure(exc_value), self._stop)
+            self._thread.join()
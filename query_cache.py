@@ -0,0 +1,157 @@
+'''Cache the results of dataset extractions on disk.
+
+The papers extracted for a list of journals and a range of years are saved
+as a columnar file (see the columnar module) in a cache directory, along
+with an index file (cache.json) describing the query of each entry. An
+entry is keyed by the normalized journals, the year range, and the
+fingerprints of the input files, so that it is never used once an input
+file has changed. A query for a subset of the journals and years of an
+entry over the same input files is answered by filtering the entry. The
+least recently used entries are evicted when the cache outgrows its size
+limit.
+
+The cache is meant to be used by a single process at a time.
+'''
+import hashlib
+import json
+import os
+import os.path
+import shutil
+from cleaner import cleaned_fingerprint, read_json, write_json
+from columnar import ColumnarWriter
+
+
+INDEX_NAME = 'cache.json'
+# Default size limit of a cache directory in bytes
+MAX_SIZE = 1 << 30
+
+
+def _directory_size(address):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(address) for name in names)
+
+
+class QueryCache(object):
+    '''A size-bounded cache of extracted datasets.
+
+    Args:
+        directory: Address of the cache directory.
+        max_size: Maximum total size of the cached entries in bytes.
+    '''
+    def __init__(self, directory, max_size=MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self._index_address = os.path.join(directory, INDEX_NAME)
+        self.entries = read_json(self._index_address)
+
+    @staticmethod
+    def describe(journals, year_range, paths):
+        '''Normalize a query.
+
+        Args:
+            journals: An iterable of journal names.
+            year_range: A list or tuple of size 2, where
+                year_range[0] <= year_range[1].
+            paths: A list of addresses of the cleaned input files.
+
+        Returns:
+            A tuple of the cache key of the query and a dictionary of the
+                sorted journals, the year range, and the input fingerprints.
+        '''
+        inputs = []
+        for path in paths:
+            stat = cleaned_fingerprint(path)
+            inputs.append([os.path.abspath(path), stat['size'],
+                           stat['mtime']])
+        query = {'journals': sorted(set(journals)),
+                 'year_range': [int(year_range[0]), int(year_range[1])],
+                 'inputs': inputs}
+        content = json.dumps(query, sort_keys=True).encode('utf-8')
+        return hashlib.sha1(content).hexdigest(), query
+
+    def _touch(self, key):
+        self.entries[key]['last_used'] = 1 + max(
+            entry['last_used'] for entry in self.entries.values())
+        write_json(self._index_address, self.entries)
+
+    def lookup(self, journals, year_range, paths):
+        '''Find a cached entry holding the papers of a query.
+
+        Args:
+            journals: An iterable of journal names.
+            year_range: A list or tuple of size 2, where
+                year_range[0] <= year_range[1].
+            paths: A list of addresses of the cleaned input files.
+
+        Returns:
+            The address of a columnar file holding the papers of the query,
+                possibly along with other papers that need to be filtered
+                out, or None if no entry covers the query.
+        '''
+        key, query = self.describe(journals, year_range, paths)
+        if key not in self.entries:
+            # Use the smallest entry covering the query, if any
+            journals = set(query['journals'])
+            candidates = [
+                (entry['size'], other) for other, entry in self.entries.items()
+                if entry['inputs'] == query['inputs'] and
+                journals.issubset(entry['journals']) and
+                entry['year_range'][0] <= query['year_range'][0] and
+                query['year_range'][1] <= entry['year_range'][1]]
+            if not candidates:
+                return None
+            key = min(candidates)[1]
+        self._touch(key)
+        return os.path.join(self.directory, self.entries[key]['path'])
+
+    def store(self, journals, year_range, paths, papers):
+        '''Cache the papers extracted for a query.
+
+        Args:
+            journals: An iterable of journal names.
+            year_range: A list or tuple of size 2, where
+                year_range[0] <= year_range[1].
+            paths: A list of addresses of the cleaned input files.
+            papers: An iterable of papers represented as dictionaries with
+                'journal', 'title', 'abstract', and 'year' as keys.
+
+        Returns:
+            The address of the columnar file holding the papers, or None if
+                it has been evicted right away for exceeding the size limit.
+        '''
+        key, query = self.describe(journals, year_range, paths)
+        name = '{}.col'.format(key)
+        address = os.path.join(self.directory, name)
+        with ColumnarWriter(address) as fout:
+            for paper in papers:
+                fout.write(paper['journal'], paper['title'], paper['abstract'],
+                           paper['year'])
+        entry = dict(query)
+        entry['path'] = name
+        entry['size'] = _directory_size(address)
+        entry['last_used'] = 0
+        self.entries[key] = entry
+        self._touch(key)
+        self.evict()
+        if key not in self.entries:
+            return None
+        return address
+
+    def evict(self):
+        '''Remove the least recently used entries exceeding the size limit.'''
+        total = sum(entry['size'] for entry in self.entries.values())
+        for key in sorted(self.entries,
+                          key=lambda key: self.entries[key]['last_used']):
+            if total <= self.max_size:
+                break
+            entry = self.entries.pop(key)
+            shutil.rmtree(os.path.join(self.directory, entry['path']),
+                          ignore_errors=True)
+            total -= entry['size']
+        write_json(self._index_address, self.entries)
+
+    def size(self):
+        '''Get the total size of the cached entries in bytes.'''
+        return sum(entry['size'] for entry in self.entries.values())
@@ -0,0 +1,156 @@
+'''Scan cleaned tab-separated files without decoding the fields not needed.
+
+A cleaned file is memory-mapped, and the boundaries of the journal,
+title, abstract, and year fields of each line are found on the raw bytes.
+A field is only copied and decoded when a caller asks for it, so that
+readers interested in journals and years never touch the abstracts.
+Compressed files (see the textio module) cannot be memory-mapped; they are
+decompressed and scanned in blocks of whole lines instead.
+'''
+import mmap
+import os
+from textio import compression_of, open_binary
+
+
+ENCODING = 'utf-8'
+# Number of decompressed bytes read at once from compressed files
+BLOCK_SIZE = 1 << 22
+
+
+class TSVScanner(object):
+    '''A memory-mapped reader of a cleaned tab-separated file.
+
+    Each line is represented as a row, a tuple of the byte offsets of the
+        start of the line, the separator after the journal, the separator
+        before the year, and the end of the line (without its newline).
+        The title and the abstract are between the journal and the year.
+        For compressed files, the offsets are relative to the current block,
+        so a row can only be used until the next one is read.
+
+    Args:
+        address: Address of a cleaned tab-separated file, which may be
+            compressed.
+        sep: The field separator of the file.
+    '''
+    def __init__(self, address, sep='\t'):
+        self.address = address
+        self.sep = sep.encode(ENCODING)
+        self.compressed = compression_of(address) is not None
+        self._file = open_binary(address)
+        if self.compressed or os.fstat(self._file.fileno()).st_size == 0:
+            # Compressed and empty files cannot be memory-mapped
+            self._buffer = b''
+        else:
+            self._buffer = mmap.mmap(self._file.fileno(), 0,
+                                     access=mmap.ACCESS_READ)
+
+    def close(self):
+        '''Release the file.'''
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __iter__(self):
+        return self.iter_rows()
+
+    def iter_rows(self, ranges=None):
+        '''Find the field boundaries of the lines of the file.
+
+        Blank lines are skipped.
+
+        Args:
+            ranges: A list of (start, end) byte ranges of whole lines to be
+                scanned (see indexer.OffsetIndex.lookup), or None to scan
+                the whole file. Compressed files are always scanned whole.
+
+        Yields:
+            Rows, one for each line.
+
+        Raises:
+            ValueError: If a line does not have the four fields.
+        '''
+        if self.compressed:
+            if ranges is not None:
+                raise ValueError('Byte ranges of compressed files cannot be '
+                                 'scanned')
+            yield from self._iter_blocks()
+            return
+        if ranges is None:
+            ranges = [(0, len(self._buffer))]
+        for start, stop in ranges:
+            yield from self._scan(start, stop)
+
+    def _iter_blocks(self):
+        rest = b''
+        while True:
+            block = self._file.read(BLOCK_SIZE)
+            if not block:
+                break
+            block = rest + block
+            end = block.rfind(b'\n') + 1
+            rest = block[end:]
+            self._buffer = block[:end]
+            yield from self._scan(0, end)
+        self._buffer = rest
+        yield from self._scan(0, len(rest))
+
+    def _scan(self, start, stop):
+        buffer = self._buffer
+        sep = self.sep
+        while start < stop:
+            end = buffer.find(b'\n', start, stop)
+            if end == -1:
+                end = stop
+            journal_end = buffer.find(sep, start, end)
+            year_start = buffer.rfind(sep, start, end)
+            if journal_end == year_start:
+                if buffer[start:end].strip():
+                    raise ValueError('Line at byte {} of {} does not '
+                                     'have four fields'.format(
+                                         start, self.address))
+            else:
+                yield start, journal_end, year_start, end
+            start = end + 1
+
+    def _title_end(self, row):
+        title_end = self._buffer.find(self.sep, row[1] + 1, row[2])
+        if title_end == -1:
+            raise ValueError('Line at byte {} of {} does not have four '
+                             'fields'.format(row[0], self.address))
+        return title_end
+
+    def raw_journal(self, row):
+        '''Get the undecoded journal of a row.'''
+        return self._buffer[row[0]:row[1]]
+
+    def raw_year(self, row):
+        '''Get the undecoded year of a row.'''
+        return self._buffer[row[2] + len(self.sep):row[3]]
+
+    def journal(self, row):
+        '''Get the journal of a row.'''
+        return self.raw_journal(row).decode(ENCODING)
+
+    def title(self, row):
+        '''Get the title of a row.'''
+        start = row[1] + len(self.sep)
+        return self._buffer[start:self._title_end(row)].decode(ENCODING)
+
+    def abstract(self, row):
+        '''Get the abstract of a row.'''
+        start = self._title_end(row) + len(self.sep)
+        return self._buffer[start:row[2]].decode(ENCODING)
+
+    def year(self, row):
+        '''Get the year of a row as an integer.
+
+        Raises:
+            ValueError: If the year is not a valid integer.
+        '''
+        return int(self.raw_year(row))
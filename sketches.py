@@ -0,0 +1,315 @@
+'''Approximate statistics of the cleaned PubMed data in bounded memory.
+
+The sketches in this module summarize streams of items with a fixed
+memory footprint and known error bounds, and two sketches built with the
+same parameters can be merged, e.g. the sketches of different files built
+by different processes, or by different runs.
+
+HyperLogLog estimates the number of distinct items, with a relative
+    standard error of about 1.04 / sqrt(2 ** precision).
+CountMinSketch estimates the count of any item; an estimate is never
+    smaller than the true count, and exceeds it by more than
+    e / width * total with a probability of at most exp(-depth).
+HeavyHitters keeps the most frequent items (Misra-Gries); the kept count
+    of an item is never larger than its true count and smaller by at most
+    total / (capacity + 1).
+'''
+import hashlib
+import math
+import re
+from collections import Counter
+import numpy as np
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+
+ENCODING = 'utf-8'
+WORDS = re.compile('[a-z0-9]+')
+# Number of papers whose journals and terms are counted exactly before they
+# are added to the sketches
+BATCH_SIZE = 1000
+
+
+def hash64(item):
+    '''Get a 64-bit hash of a string that is stable across processes.'''
+    digest = hashlib.blake2b(item.encode(ENCODING), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class HyperLogLog(object):
+    '''Estimate the number of distinct strings.
+
+    Args:
+        precision: The number of hash bits used for selecting a register;
+            the sketch has 2 ** precision one-byte registers.
+    '''
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, item):
+        '''Add a string to the sketch.'''
+        value = hash64(item)
+        rest_bits = 64 - self.precision
+        register = value >> rest_bits
+        rest = value & ((1 << rest_bits) - 1)
+        rank = rest_bits - rest.bit_length() + 1
+        if rank > self.registers[register]:
+            self.registers[register] = rank
+
+    def merge(self, other):
+        '''Add the strings of another sketch with the same precision.'''
+        if other.precision != self.precision:
+            raise ValueError('Only sketches with the same precision can be '
+                             'merged')
+        merged = np.maximum(np.frombuffer(self.registers, dtype=np.uint8),
+                            np.frombuffer(other.registers, dtype=np.uint8))
+        self.registers = bytearray(merged.tobytes())
+
+    @property
+    def relative_error(self):
+        '''Get the relative standard error of the estimates.'''
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def count(self):
+        '''Estimate the number of distinct strings added to the sketch.'''
+        registers = np.frombuffer(self.registers, dtype=np.uint8)
+        m = len(registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype(
+            np.int64)))
+        zeros = int(np.count_nonzero(registers == 0))
+        if estimate <= 2.5 * m and zeros > 0:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class CountMinSketch(object):
+    '''Estimate the counts of strings.
+
+    Args:
+        width: Number of counters in each row.
+        depth: Number of rows, each with an independent hash function.
+    '''
+    def __init__(self, width=1 << 14, depth=5):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+
+    def _columns(self, items):
+        columns = np.empty((self.depth, len(items)), dtype=np.int64)
+        for j, item in enumerate(items):
+            value = hash64(item)
+            first, second = value & 0xffffffff, (value >> 32) | 1
+            for i in range(self.depth):
+                columns[i, j] = (first + i * second) % self.width
+        return columns
+
+    def update(self, counts):
+        '''Add strings to the sketch.
+
+        Args:
+            counts: A dictionary mapping strings to the number of times they
+                are added, e.g. a Counter object.
+        '''
+        items = list(counts)
+        values = np.array([counts[item] for item in items], dtype=np.int64)
+        columns = self._columns(items)
+        for i in range(self.depth):
+            np.add.at(self.table[i], columns[i], values)
+        self.total += int(values.sum())
+
+    def estimate(self, item):
+        '''Estimate the number of times a string has been added.'''
+        columns = self._columns([item])[:, 0]
+        return int(self.table[np.arange(self.depth), columns].min())
+
+    def merge(self, other):
+        '''Add the strings of another sketch with the same dimensions.'''
+        if self.table.shape != other.table.shape:
+            raise ValueError('Only sketches with the same width and depth can '
+                             'be merged')
+        self.table += other.table
+        self.total += other.total
+
+    @property
+    def error_bound(self):
+        '''Get the additive error bound e / width * total of the estimates.'''
+        return math.e / self.width * self.total
+
+    @property
+    def failure_probability(self):
+        '''Get the probability exp(-depth) of exceeding the error bound.'''
+        return math.exp(-self.depth)
+
+
+class HeavyHitters(object):
+    '''Keep the most frequent strings with the Misra-Gries algorithm.
+
+    Args:
+        capacity: Maximum number of strings kept.
+    '''
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.counts = Counter()
+        self.total = 0
+
+    def update(self, counts):
+        '''Add strings to the sketch.
+
+        Args:
+            counts: A dictionary mapping strings to the number of times they
+                are added, e.g. a Counter object.
+        '''
+        self.counts.update(counts)
+        self.total += sum(counts.values())
+        self._prune()
+
+    def merge(self, other):
+        '''Add the strings of another sketch.'''
+        self.counts.update(other.counts)
+        self.total += other.total
+        self._prune()
+
+    def _prune(self):
+        if len(self.counts) <= self.capacity:
+            return
+        # Subtracting the (capacity + 1)-th largest count keeps the summary
+        # mergeable with the same error bound
+        values = np.fromiter(self.counts.values(), dtype=np.int64,
+                             count=len(self.counts))
+        threshold = -np.partition(-values, self.capacity)[self.capacity]
+        self.counts = Counter({item: count - threshold
+                               for item, count in self.counts.items()
+                               if count > threshold})
+
+    def top(self, k):
+        '''Get up to k of the most frequent strings and their counts.'''
+        return self.counts.most_common(k)
+
+    @property
+    def error_bound(self):
+        '''Get the bound total / (capacity + 1) on the undercounting.'''
+        return self.total / (self.capacity + 1)
+
+
+def normalize_title(title):
+    '''Reduce a title to its lower-case words, to match near-duplicates.'''
+    return ' '.join(WORDS.findall(title.lower()))
+
+
+def terms(text):
+    '''Get the lower-case words of a text that are not stop words.'''
+    return [word for word in WORDS.findall(text.lower())
+            if len(word) > 2 and word not in ENGLISH_STOP_WORDS]
+
+
+class CorpusSketch(object):
+    '''Approximate statistics of a collection of papers.
+
+    The sketch holds the number of papers, a HyperLogLog of the normalized
+        titles (see normalize_title), and Count-Min and heavy-hitter
+        sketches of the journals and of the terms of the abstracts.
+
+    Args:
+        precision: The precision of the HyperLogLog.
+        width: The width of the Count-Min sketches.
+        depth: The depth of the Count-Min sketches.
+        capacity: The capacity of the heavy-hitter sketches.
+    '''
+    def __init__(self, precision=14, width=1 << 14, depth=5, capacity=1000):
+        self.num_papers = 0
+        self.titles = HyperLogLog(precision)
+        self.journals = CountMinSketch(width, depth)
+        self.top_journals = HeavyHitters(capacity)
+        self.terms = CountMinSketch(width, depth)
+        self.top_terms = HeavyHitters(capacity)
+
+    def update(self, papers):
+        '''Add papers to the sketch.
+
+        The journals and terms are counted exactly in batches of BATCH_SIZE
+            papers, so the memory used does not grow with the number of
+            papers.
+
+        Args:
+            papers: An iterable of (journal, title, abstract) tuples.
+        '''
+        journals = Counter()
+        words = Counter()
+        size = 0
+        for journal, title, abstract in papers:
+            self.num_papers += 1
+            self.titles.add(normalize_title(title))
+            journals[journal] += 1
+            words.update(terms(abstract))
+            size += 1
+            if size == BATCH_SIZE:
+                self._add_counts(journals, words)
+                journals = Counter()
+                words = Counter()
+                size = 0
+        if size:
+            self._add_counts(journals, words)
+
+    def _add_counts(self, journals, words):
+        for sketch, counts in ((self.journals, journals),
+                               (self.top_journals, journals),
+                               (self.terms, words), (self.top_terms, words)):
+            sketch.update(counts)
+
+    def merge(self, other):
+        '''Add the papers of another sketch built with the same parameters.'''
+        self.num_papers += other.num_papers
+        self.titles.merge(other.titles)
+        self.journals.merge(other.journals)
+        self.top_journals.merge(other.top_journals)
+        self.terms.merge(other.terms)
+        self.top_terms.merge(other.top_terms)
+
+    def near_duplicate_rate(self):
+        '''Estimate the fraction of papers with an already seen title.'''
+        if self.num_papers == 0:
+            return 0.0
+        return max(0.0, 1 - self.titles.count() / self.num_papers)
+
+    def save(self, address):
+        '''Save the sketch into an .npz file.'''
+        arrays = {'num_papers': self.num_papers,
+                  'titles': np.frombuffer(self.titles.registers,
+                                          dtype=np.uint8),
+                  'capacity': self.top_journals.capacity}
+        for name in ('journals', 'terms'):
+            sketch = getattr(self, name)
+            arrays['{}_table'.format(name)] = sketch.table
+            arrays['{}_total'.format(name)] = sketch.total
+            top = getattr(self, 'top_{}'.format(name))
+            arrays['top_{}_items'.format(name)] = np.array(list(top.counts),
+                                                           dtype=str)
+            arrays['top_{}_counts'.format(name)] = np.array(
+                list(top.counts.values()), dtype=np.int64)
+            arrays['top_{}_total'.format(name)] = top.total
+        with open(address, 'wb') as fout:
+            np.savez_compressed(fout, **arrays)
+
+    @classmethod
+    def load(cls, address):
+        '''Load a sketch saved by save.'''
+        with np.load(address) as content:
+            titles = content['titles']
+            depth, width = content['journals_table'].shape
+            sketch = cls(precision=int(np.log2(len(titles))), width=width,
+                         depth=depth, capacity=int(content['capacity']))
+            sketch.num_papers = int(content['num_papers'])
+            sketch.titles.registers = bytearray(titles.tobytes())
+            for name in ('journals', 'terms'):
+                counts = getattr(sketch, name)
+                counts.table = content['{}_table'.format(name)]
+                counts.total = int(content['{}_total'.format(name)])
+                top = getattr(sketch, 'top_{}'.format(name))
+                top.counts = Counter(dict(zip(
+                    content['top_{}_items'.format(name)].tolist(),
+                    content['top_{}_counts'.format(name)].tolist())))
+                top.total = int(content['top_{}_total'.format(name)])
+        return sketch
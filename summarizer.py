@@ -7,6 +7,18 @@ import argparse
 import glob
 import multiprocessing as mp
 from collections import Counter
+import numpy as np
+from cleaner import (CLEANED_EXTENSIONS, cleaned_fingerprint, read_counts,
+                     read_json, write_json)
+from columnar import ColumnarFile, MISSING_YEAR, is_columnar
+from count_cube import CountCube
+from partitioner import iter_papers
+from scanner import ENCODING, TSVScanner
+from sketches import CorpusSketch
+
+
+# Extension of the file caching the summary of each cleaned file
+PARTIALS_EXTENSION = '.partials.json'
 
 
 def summarize(address, sep='\t'):
@@ -14,43 +26,250 @@ def summarize(address, sep='\t'):
 
     Args:
         address: A string representing the path to the file containing journal abstracts.
+            It can be either a tab-separated file, possibly compressed (see
+            the textio module), or a columnar file.
         sep: The field separator in the file containing journal abstracts.
 
     Returns:
         A Counter object containing journal per year count for each journal.
+            The counts written by the cleaner alongside the file (see
+            cleaner.write_counts) are used when they are up to date, and the
+            file itself is not read.
     '''
-    papers = []
-    with open(address) as fin:
-        for line in fin:
-            (journal_name, _, _, year) = line.strip().split(sep)
-            try:
-                year = int(year)
-            except ValueError:
-                continue
-            papers.append((year, journal_name))
-    return Counter(papers)
-
-
-def main(cleaned_address, out_address, num_proc=1):
+    statistics = read_counts(address)
+    if statistics is not None:
+        return statistics['counts']
+    if is_columnar(address):
+        return summarize_columnar(address)
+    # Count the raw journal and year bytes, and decode only distinct pairs
+    with TSVScanner(address, sep=sep) as scanner:
+        raw_counts = Counter((scanner.raw_year(row), scanner.raw_journal(row))
+                             for row in scanner)
+    counts = Counter()
+    for (year, journal_name), count in raw_counts.items():
+        try:
+            year = int(year)
+        except ValueError:
+            continue
+        counts[(year, journal_name.decode(ENCODING))] += count
+    return counts
+
+def summarize_columnar(address):
+    '''Get the frequency of papers published per year from a columnar file.
+
+    Only the memory-mapped journal and year columns are read.
+
+    Args:
+        address: A string representing the path to a columnar file.
+
+    Returns:
+        A Counter object containing journal per year count for each journal.
+    '''
+    source = ColumnarFile(address)
+    valid = source.years != MISSING_YEAR
+    codes = source.journal_codes[valid].astype(np.int64)
+    years = source.years[valid].astype(np.int64)
+    pairs, counts = np.unique(codes * (np.iinfo(np.int16).max + 1) + years,
+                              return_counts=True)
+    codes, years = np.divmod(pairs, np.iinfo(np.int16).max + 1)
+    return Counter({(int(year), source.journals[code]): int(count)
+                    for code, year, count in zip(codes, years, counts)})
+
+
+def find_cleaned(cleaned_address):
+    '''Find the cleaned files matching a pattern.
+
+    Files whose names do not end in a cleaned extension, such as the
+        sidecar files the cleaner writes next to its outputs, are skipped.
+
+    Args:
+        cleaned_address: A regular expression (string) representing the
+            address of the cleaned files, as accepted by glob.
+
+    Returns:
+        A sorted list of the addresses of the cleaned files.
+    '''
+    return sorted(address for address in glob.glob(cleaned_address)
+                  if address.endswith(CLEANED_EXTENSIONS))
+
+
+def merge_summaries(summaries):
+    '''Merge summaries into a single one.
+
+    Args:
+        summaries: An iterable of Counter objects (see summarize).
+
+    Returns:
+        A Counter object holding the sum of the summaries.
+    '''
+    merged = Counter()
+    for summary in summaries:
+        merged.update(summary)
+    return merged
+
+
+def read_partials(address):
+    '''Read the cached per-file summaries.
+
+    Args:
+        address: Address of the JSON file holding the cached summaries.
+
+    Returns:
+        A dictionary mapping the address of each summarized file to a
+            dictionary of its fingerprint (see cleaner.cleaned_fingerprint)
+            and its summary as a Counter object ('counts').
+    '''
+    partials = read_json(address)
+    for entry in partials.values():
+        entry['counts'] = Counter({(year, journal_name): count
+                                   for journal_name, year, count
+                                   in entry['counts']})
+    return partials
+
+
+def write_partials(address, partials):
+    '''Write the cached per-file summaries (see read_partials).'''
+    content = {}
+    for name, entry in partials.items():
+        content[name] = dict(entry)
+        content[name]['counts'] = [
+            [journal_name, year, count]
+            for (year, journal_name), count in sorted(entry['counts'].items())]
+    write_json(address, content)
+
+
+def main(cleaned_address, out_address, num_proc=1, partials_address=None,
+         cube_address=None):
     '''Run summarize method for all files in a given directory.
 
+    The summary of each file is cached along with the fingerprint of the
+        file, so that only new and changed files are summarized again.
+
     Args:
         cleaned_address: Address of the directory containing journal abstracts.
         out_address: Address of the file to save data summary into.
         num_proc: A positive integer representing the number of processors to
             be used for summarizing data in parallel.
+        partials_address: Address of the JSON file caching the summary of
+            each file. The default is out_address followed by
+            PARTIALS_EXTENSION.
+        cube_address: If provided, the summary is also saved there as a
+            count cube for fast queries (see count_cube.CountCube).
+
+    Returns:
+        The number of files that were summarized again.
     '''
-    pool = mp.Pool(processes=num_proc)
-    results = [pool.apply_async(summarize, args=(address,))
-               for address in glob.glob(cleaned_address)]
-    summary = Counter()
-    for item in results:
-        summary += item.get()
+    if partials_address is None:
+        partials_address = '{}{}'.format(out_address, PARTIALS_EXTENSION)
+    cached = read_partials(partials_address)
+    partials = {}
+    to_summarize = []
+    for address in find_cleaned(cleaned_address):
+        stat = cleaned_fingerprint(address)
+        entry = cached.get(address)
+        if entry is not None and all(entry.get(key) == value
+                                     for key, value in stat.items()):
+            partials[address] = entry
+        else:
+            partials[address] = stat
+            to_summarize.append(address)
+    if to_summarize:
+        with mp.Pool(processes=min(num_proc, len(to_summarize))) as pool:
+            for address, counts in zip(to_summarize,
+                                       pool.imap(summarize, to_summarize)):
+                partials[address]['counts'] = counts
+    write_partials(partials_address, partials)
+    summary = merge_summaries(entry['counts'] for entry in partials.values())
     with open(out_address, 'w') as fout:
         fout.write('{}\t{}\t{}\n'.format('Journal', 'Year', 'Count'))
         for (year, journal_name) in sorted(summary.keys(), reverse=True):
             fout.write('{}\t{}\t{}\n'.format(journal_name, year,
                                              summary[(year, journal_name)]))
+    if cube_address is not None:
+        CountCube.from_counter(summary).save(cube_address)
+    return len(to_summarize)
+
+
+def sketch(address, sep='\t'):
+    '''Get approximate statistics of a cleaned file in bounded memory.
+
+    Args:
+        address: Address of a cleaned file (see summarize).
+        sep: The field separator of tab-separated files.
+
+    Returns:
+        A sketches.CorpusSketch object of the papers in the file.
+    '''
+    corpus_sketch = CorpusSketch()
+    corpus_sketch.update((journal_name, title, abstract)
+                         for journal_name, title, abstract, _, _
+                         in iter_papers(address, sep=sep))
+    return corpus_sketch
+
+
+def write_sketch_report(corpus_sketch, out_address, k=20):
+    '''Write the approximate statistics of a sketch into a file.
+
+    Args:
+        corpus_sketch: A sketches.CorpusSketch object.
+        out_address: Address of the file to save the statistics into.
+        k: Number of heavy-hitter journals and terms to report.
+    '''
+    with open(out_address, 'w') as fout:
+        fout.write('{}\t{}\n'.format('Papers', corpus_sketch.num_papers))
+        fout.write('{}\t{}\t+-{:.2%}\n'.format(
+            'Distinct titles', corpus_sketch.titles.count(),
+            corpus_sketch.titles.relative_error))
+        fout.write('{}\t{:.4f}\n'.format(
+            'Near-duplicate rate', corpus_sketch.near_duplicate_rate()))
+        for name, counts, top in (
+                ('Journal', corpus_sketch.journals,
+                 corpus_sketch.top_journals),
+                ('Term', corpus_sketch.terms, corpus_sketch.top_terms)):
+            # Heavy hitters undercount and Count-Min overestimates, so the
+            # true count of each item lies between the two
+            fout.write('\n{}\t{}\t{}\n'.format(name, 'Lower bound',
+                                                 'Upper bound'))
+            for item, _ in top.top(k):
+                fout.write('{}\t{}\t{}\n'.format(
+                    item, top.counts[item], counts.estimate(item)))
+
+
+def main_approximate(cleaned_address, out_address, num_proc=1,
+                     sketch_address=None, merge_addresses=()):
+    '''Write approximate statistics of all files in a given directory.
+
+    The statistics are the number of papers, the number of distinct titles,
+        the rate of near-duplicate titles, and the most frequent journals
+        and abstract terms, with their error bounds (see the sketches
+        module). The sketch of each file is built by a worker process and
+        the sketches are merged.
+
+    Args:
+        cleaned_address: Address of the directory containing journal abstracts.
+        out_address: Address of the file to save the statistics into.
+        num_proc: A positive integer representing the number of processors to
+            be used for sketching data in parallel.
+        sketch_address: If provided, the merged sketch is saved there, so
+            that it can be merged with the sketches of later runs.
+        merge_addresses: Addresses of sketches saved by earlier runs to be
+            merged into the statistics.
+
+    Returns:
+        The merged sketches.CorpusSketch object.
+    '''
+    corpus_sketch = CorpusSketch()
+    for address in merge_addresses:
+        corpus_sketch.merge(CorpusSketch.load(address))
+    addresses = find_cleaned(cleaned_address)
+    if addresses:
+        with mp.Pool(processes=min(num_proc, len(addresses))) as pool:
+            for file_sketch in pool.imap_unordered(sketch, addresses):
+                corpus_sketch.merge(file_sketch)
+    write_sketch_report(corpus_sketch, out_address)
+    if sketch_address is not None:
+        corpus_sketch.save(sketch_address)
+    return corpus_sketch
 
 
 if __name__ == '__main__':
@@ -65,8 +284,34 @@ if __name__ == '__main__':
     message = 'Address of the file to hold data summary information'
     parse.add_argument('-o', '--output_file', type=str, required=True,
                        help=message)
+    message = ('Address of the file caching the summary of each cleaned '
+               'file; the default is the output file followed by {}'.format(
+                   PARTIALS_EXTENSION))
+    parse.add_argument('-c', '--partials_file', type=str, default=None,
+                       help=message)
+    message = ('Address of a .npz file to save the summary into as a count '
+               'cube, which count_cube.py queries in milliseconds')
+    parse.add_argument('--cube_file', type=str, default=None, help=message)
+    message = ('Report approximate statistics (distinct titles, near-duplicate '
+               'rate, and top journals and terms) computed with sketches')
+    parse.add_argument('-a', '--approximate', action='store_true',
+                       help=message)
+    message = 'Address of a .npz file to save the sketch of an approximate run'
+    parse.add_argument('--sketch_file', type=str, default=None, help=message)
+    message = 'Addresses of sketches of earlier approximate runs to merge'
+    parse.add_argument('--merge_sketches', type=str, nargs='*', default=(),
+                       help=message)
     arguments = parse.parse_args()
 
-    main(cleaned_address=arguments.source_files,
-         out_address=arguments.output_file,
-         num_proc=arguments.number_of_processors)
+    if arguments.approximate:
+        main_approximate(cleaned_address=arguments.source_files,
+                         out_address=arguments.output_file,
+                         num_proc=arguments.number_of_processors,
+                         sketch_address=arguments.sketch_file,
+                         merge_addresses=arguments.merge_sketches)
+    else:
+        main(cleaned_address=arguments.source_files,
+             out_address=arguments.output_file,
+             num_proc=arguments.number_of_processors,
+             partials_address=arguments.partials_file,
+             cube_address=arguments.cube_file)
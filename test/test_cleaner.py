@@ -1,8 +1,19 @@
 import unittest
+import json
+import os
 import os.path
+import shutil
+import tempfile
 from bs4 import BeautifulSoup
+from lxml import etree
 import logging
 import cleaner
+import summarizer
+
+
+SAMPLE_FILES = ['test/sample_data/PubMedSampleFile.xml.gz',
+                'test/sample_data/clean_in_parallel_data/source_dir/PubMedSampleFile.xml.gz',
+                'data/raw/PubMedSampleFile.xml.gz']
 
 
 class TestCleaner(unittest.TestCase):
@@ -15,6 +26,7 @@ class TestCleaner(unittest.TestCase):
         artical = cleaner.get_article_data(tag)
         self.assertEqual(artical['JournalName'], 'Ecology')
         self.assertEqual(artical['PubYear'], '2018')
+        self.assertEqual(artical['PMID'], '30516271')
         title = ('Spatial scale modulates the inference of metacommunity '
                  'assembly processes.')
         self.assertEqual(artical['Title'], title)
@@ -27,20 +39,247 @@ class TestCleaner(unittest.TestCase):
         logger = logging.getLogger(__name__)
         data_dir = 'test/sample_data/clean_in_parallel_data/'
         expected_path = os.path.join(data_dir, 'output_dir/expected.tsv')
-        cleand_file_path = os.path.join(data_dir, 'output_dir/PubMedSampleFile.tsv')
-        cleaner.parallel_cleaner(source_dir=os.path.join(data_dir, 'source_dir'),
-                                 output_dir=os.path.join(data_dir, 'output_dir'),
-                                 number_of_processors=2,
-                                 logger=logger)
+        with tempfile.TemporaryDirectory() as output_dir:
+            cleand_file_path = os.path.join(output_dir, 'PubMedSampleFile.tsv')
+            cleaner.parallel_cleaner(source_dir=os.path.join(data_dir, 'source_dir'),
+                                     output_dir=output_dir,
+                                     number_of_processors=2,
+                                     logger=logger)
+            with open(expected_path) as fin:
+                expected = fin.read()
+            with open(cleand_file_path) as fin:
+                cleaned = fin.read()
+
+        self.assertEqual(expected, cleaned)
+
+    def test_get_content_compressed(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            address = os.path.join(temp_dir, 'compressed.tsv.gz')
+            result = cleaner.get_content('data/raw/PubMedSampleFile.xml.gz',
+                                         address, parser='lxml')
+            self.assertEqual(result['#Abstracts'], 11)
+            self.assertFalse(os.path.exists('{}.part'.format(address)))
+            statistics = cleaner.read_counts(address)
+            self.assertEqual(statistics['rejected'],
+                             {'language': 0, 'abstract': 0, 'year': 0})
+            self.assertEqual(summarizer.summarize(address),
+                             summarizer.summarize(
+                                 'data/processed/PubMedSampleFile.tsv'))
+            # Counts of a changed file are not used
+            os.utime(address, (0, 0))
+            self.assertIsNone(cleaner.read_counts(address))
+            self.assertEqual(statistics['counts'],
+                             summarizer.summarize(address))
+
+    def test_get_content_streaming(self):
+        data_dir = 'test/sample_data/clean_in_parallel_data/'
+        expected_path = os.path.join(data_dir, 'output_dir/expected.tsv')
         with open(expected_path) as fin:
             expected = fin.read()
-        with open(cleand_file_path) as fin:
-            cleaned = fin.read()
-
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cleand_file_path = os.path.join(temp_dir, 'streaming.tsv')
+            result = cleaner.get_content(
+                'test/sample_data/PubMedSampleFile.xml.gz', cleand_file_path,
+                streaming=True)
+            self.assertEqual(result, {'#Abstracts': 11, '#Records': 11})
+            with open(cleand_file_path) as fin:
+                cleaned = fin.read()
         self.assertEqual(expected, cleaned)
 
+    def test_parallel_cleaner_incremental(self):
+        logger = logging.getLogger(__name__)
+        data_dir = 'test/sample_data/clean_in_parallel_data/'
+        expected_path = os.path.join(data_dir, 'output_dir/expected.tsv')
+        with open(expected_path) as fin:
+            expected = fin.read()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source_dir = os.path.join(temp_dir, 'source')
+            output_dir = os.path.join(temp_dir, 'output')
+            shutil.copytree(os.path.join(data_dir, 'source_dir'), source_dir)
+            cleaned_path = os.path.join(output_dir, 'PubMedSampleFile.tsv')
+            cleaner.parallel_cleaner(source_dir, output_dir, 1, logger)
+            manifest = cleaner.read_manifest(output_dir)
+            entry = manifest['PubMedSampleFile.xml.gz']
+            self.assertEqual(entry['#Records'], 11)
+            self.assertEqual(entry['#Abstracts'], 11)
+            self.assertEqual(entry['parser_version'], cleaner.PARSER_VERSION)
+            self.assertEqual(entry['output'], 'PubMedSampleFile.tsv')
+            # Unchanged files are skipped
+            with open(cleaned_path, 'w') as fout:
+                fout.write('stale')
+            cleaner.parallel_cleaner(source_dir, output_dir, 1, logger)
+            with open(cleaned_path) as fin:
+                self.assertEqual(fin.read(), 'stale')
+            # Forcing cleans all files again
+            cleaner.parallel_cleaner(source_dir, output_dir, 1, logger,
+                                     force=True)
+            with open(cleaned_path) as fin:
+                self.assertEqual(fin.read(), expected)
+            # Changed files are cleaned again
+            with open(cleaned_path, 'w') as fout:
+                fout.write('stale')
+            source_path = os.path.join(source_dir, 'PubMedSampleFile.xml.gz')
+            mtime = os.stat(source_path).st_mtime + 10
+            os.utime(source_path, (mtime, mtime))
+            cleaner.parallel_cleaner(source_dir, output_dir, 1, logger)
+            with open(cleaned_path) as fin:
+                self.assertEqual(fin.read(), expected)
+            self.assertEqual(sorted(os.listdir(output_dir)),
+                             sorted([cleaner.MANIFEST_NAME,
+                                     'PubMedSampleFile.tsv',
+                                     'PubMedSampleFile.tsv.pmid',
+                                     'PubMedSampleFile.tsv.counts.json']))
 
+    def test_parallel_cleaner_upgrade(self):
+        logger = logging.getLogger(__name__)
+        data_dir = 'test/sample_data/clean_in_parallel_data/'
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source_dir = os.path.join(temp_dir, 'source')
+            output_dir = os.path.join(temp_dir, 'output')
+            shutil.copytree(os.path.join(data_dir, 'source_dir'), source_dir)
+            cleaner.parallel_cleaner(source_dir, output_dir, 1, logger)
+            cleaned_path = os.path.join(output_dir, 'PubMedSampleFile.tsv')
+            sidecars = ['{}{}'.format(cleaned_path, cleaner.PMID_EXTENSION),
+                        '{}{}'.format(cleaned_path, cleaner.COUNTS_EXTENSION)]
+            # A manifest written before the sidecar files were introduced
+            manifest = cleaner.read_manifest(output_dir)
+            manifest['PubMedSampleFile.xml.gz']['parser_version'] = 1
+            cleaner.write_manifest(output_dir, manifest)
+            for address in sidecars:
+                os.remove(address)
+            cleaner.parallel_cleaner(source_dir, output_dir, 1, logger)
+            self.assertTrue(all(os.path.exists(address)
+                                for address in sidecars))
+            entry = cleaner.read_manifest(output_dir)['PubMedSampleFile.xml.gz']
+            self.assertEqual(entry['parser_version'], cleaner.PARSER_VERSION)
+            # A missing sidecar file is written again
+            for address in sidecars:
+                os.remove(address)
+                cleaner.parallel_cleaner(source_dir, output_dir, 1, logger)
+                self.assertTrue(os.path.exists(address))
 
+    def test_parallel_cleaner_format_change(self):
+        logger = logging.getLogger(__name__)
+        data_dir = 'test/sample_data/clean_in_parallel_data/'
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source_dir = os.path.join(temp_dir, 'source')
+            output_dir = os.path.join(temp_dir, 'output')
+            shutil.copytree(os.path.join(data_dir, 'source_dir'), source_dir)
+            cleaner.parallel_cleaner(source_dir, output_dir, 1, logger)
+            index_path = os.path.join(
+                output_dir, 'PubMedSampleFile.tsv' + cleaner.INDEX_EXTENSION)
+            with open(index_path, 'wb'):
+                pass
+            # The outputs in earlier formats are replaced, not kept alongside
+            cleaner.parallel_cleaner(source_dir, output_dir, 1, logger,
+                                     output_format='columnar')
+            self.assertEqual(sorted(os.listdir(output_dir)),
+                             sorted([cleaner.MANIFEST_NAME,
+                                     'PubMedSampleFile.col',
+                                     'PubMedSampleFile.col.counts.json']))
+            cleaner.parallel_cleaner(source_dir, output_dir, 1, logger,
+                                     compression='gzip')
+            self.assertEqual(sorted(os.listdir(output_dir)),
+                             sorted([cleaner.MANIFEST_NAME,
+                                     'PubMedSampleFile.tsv.gz',
+                                     'PubMedSampleFile.tsv.gz.pmid',
+                                     'PubMedSampleFile.tsv.gz.counts.json']))
+            self.assertEqual(summarizer.main(os.path.join(output_dir, '*'),
+                                             os.path.join(temp_dir, 'out')), 1)
+
+    def test_sequence_number(self):
+        names = ['pubmed19n0001.xml.gz', 'pubmed19n0973.xml.gz',
+                 'pubmed19n1500.xml.gz', 'pubmed20n0001.xml.gz',
+                 'pubmed20n0002.tsv']
+        sequences = [cleaner.sequence_number(name) for name in names]
+        self.assertListEqual(sequences, sorted(set(sequences)))
+        self.assertEqual(cleaner.sequence_number('Sample1.tsv'), 1)
+        self.assertEqual(cleaner.sequence_number('Sample.tsv'), 0)
+
+    def test_parallel_cleaner_failures(self):
+        logger = logging.getLogger('{}.failures'.format(__name__))
+        logger.setLevel(logging.CRITICAL)
+        data_dir = 'test/sample_data/clean_in_parallel_data/'
+        with tempfile.TemporaryDirectory() as temp_dir:
+            source_dir = os.path.join(temp_dir, 'source')
+            output_dir = os.path.join(temp_dir, 'output')
+            shutil.copytree(os.path.join(data_dir, 'source_dir'), source_dir)
+            with open(os.path.join(source_dir, 'Corrupt.xml.gz'), 'wb') as fout:
+                fout.write(b'not a gzip file')
+            failures = cleaner.parallel_cleaner(source_dir, output_dir, 2,
+                                                logger, parser='lxml',
+                                                max_tasks_per_child=1)
+            self.assertListEqual(list(failures), ['Corrupt.xml.gz'])
+            manifest = cleaner.read_manifest(output_dir)
+            self.assertListEqual(list(manifest), ['PubMedSampleFile.xml.gz'])
+            with open(os.path.join(output_dir, cleaner.FAILURES_NAME)) as fin:
+                self.assertListEqual(list(json.load(fin)), ['Corrupt.xml.gz'])
+            self.assertFalse(os.path.exists(os.path.join(output_dir,
+                                                         'Corrupt.tsv')))
+            self.assertFalse(os.path.exists(os.path.join(output_dir,
+                                                         'Corrupt.tsv.part')))
+
+    def test_parsers_equivalence(self):
+        for address in SAMPLE_FILES:
+            outputs = []
+            with tempfile.TemporaryDirectory() as temp_dir:
+                for parser in sorted(cleaner.PARSERS):
+                    for streaming, pipelined in [(False, False), (True, False),
+                                                 (False, True)]:
+                        out_address = os.path.join(
+                            temp_dir, '{}_{}_{}.tsv'.format(parser, streaming,
+                                                            pipelined))
+                        result = cleaner.get_content(address, out_address,
+                                                     streaming=streaming,
+                                                     parser=parser,
+                                                     pipelined=pipelined)
+                        with open(out_address) as fin:
+                            outputs.append((result, fin.read()))
+            for output in outputs[1:]:
+                self.assertEqual(outputs[0], output)
+
+    def test_get_content_pipelined_failure(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_address = os.path.join(temp_dir, 'Truncated.xml.gz')
+            with open('test/sample_data/PubMedSampleFile.xml.gz', 'rb') as fin:
+                data = fin.read()
+            with open(input_address, 'wb') as fout:
+                fout.write(data[:len(data) // 2])
+            output_address = os.path.join(temp_dir, 'Truncated.tsv')
+            with self.assertRaises(EOFError):
+                cleaner.get_content(input_address, output_address,
+                                    parser='lxml', pipelined=True)
+            self.assertListEqual(os.listdir(temp_dir), ['Truncated.xml.gz'])
+
+    def test_get_article_data_lxml(self):
+        article_data_path = 'test/sample_data/article_tag.xml'
+        with open(article_data_path, 'r') as fin:
+            data = fin.read()
+        expected = cleaner.get_article_data(BeautifulSoup(data, 'xml'))
+        observed = cleaner.get_article_data_lxml(etree.fromstring(data))
+        self.assertEqual(expected, observed)
+
+    def test_get_article_data_lxml_exceptions(self):
+        article_data_path = 'test/sample_data/article_tag.xml'
+        with open(article_data_path, 'r') as fin:
+            data = fin.read()
+        cases = [(cleaner.LanguageNotSupportedError,
+                  [('<Language>eng</Language>', '<Language>fre</Language>')]),
+                 (cleaner.AbstractNotAvailableError,
+                  [('<AbstractText>', '<OtherText>'),
+                   ('</AbstractText>', '</OtherText>')]),
+                 (cleaner.PublicationYearMissingError,
+                  [('<Year>2018</Year>\n              <Month>Dec',
+                    '<Year>Winter</Year>\n              <Month>Dec')])]
+        for error, replacements in cases:
+            tag = data
+            for old, new in replacements:
+                self.assertIn(old, tag)
+                tag = tag.replace(old, new)
+            with self.assertRaises(error):
+                cleaner.get_article_data(BeautifulSoup(tag, 'xml'))
+            with self.assertRaises(error):
+                cleaner.get_article_data_lxml(etree.fromstring(tag))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,74 @@
+import unittest
+import os.path
+import tempfile
+import cleaner
+import summarizer
+from columnar import ColumnarFile, ColumnarWriter, MISSING_YEAR, is_columnar
+from dataset import Dataset, FilterSpec
+
+
+class TestColumnar(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.tsv_address = 'data/processed/PubMedSampleFile.tsv'
+        self.address = os.path.join(self.temp_dir.name, 'PubMedSampleFile.col')
+        cleaner.get_content('data/raw/PubMedSampleFile.xml.gz', self.address,
+                            parser='lxml', output_format='columnar')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_columnar_file(self):
+        self.assertTrue(is_columnar(self.address))
+        self.assertFalse(is_columnar(self.tsv_address))
+        source = ColumnarFile(self.address)
+        with open(self.tsv_address, encoding='utf-8') as fin:
+            lines = [line.rstrip('\n').split('\t') for line in fin]
+        self.assertEqual(len(source), len(lines))
+        for i, (journal, title, abstract, year) in enumerate(lines):
+            self.assertEqual(source.journal(i), journal)
+            self.assertEqual(source.title(i), title)
+            self.assertEqual(source.abstract(i), abstract)
+            self.assertEqual(source.years[i], int(year))
+
+    def test_select(self):
+        source = ColumnarFile(self.address)
+        self.assertEqual(len(source.select()), len(source))
+        selected = source.select(journals=['Ecology'], year_range=(2000, 2018))
+        self.assertTrue(len(selected) > 0)
+        for i in selected:
+            self.assertEqual(source.journal(i), 'Ecology')
+        self.assertEqual(len(source.select(year_range=(1900, 1901))), 0)
+
+    def test_missing_year(self):
+        address = os.path.join(self.temp_dir.name, 'missing.col')
+        with ColumnarWriter(address) as fout:
+            fout.write('A', 'T1', 'Abs1', '2001')
+            fout.write('B', 'T2', 'Abs2', 'Winter')
+        source = ColumnarFile(address)
+        self.assertListEqual(list(source.years), [2001, MISSING_YEAR])
+        self.assertListEqual(list(source.select()), [0])
+        self.assertEqual(len(Dataset([address], [])), 1)
+
+    def test_dataset(self):
+        expected = Dataset([self.tsv_address], [])
+        observed = Dataset([self.address], [])
+        self.assertListEqual(list(expected.data), list(observed.data))
+        conditions = [lambda paper: Dataset.designated_journal(paper,
+                                                               ['Ecology'])]
+        expected = Dataset([self.tsv_address], conditions)
+        observed = Dataset([self.address], conditions)
+        self.assertListEqual(list(expected.data), list(observed.data))
+        spec = FilterSpec(['Ecology'], (2000, 2018), keywords=['species'])
+        expected = Dataset([self.tsv_address], spec)
+        observed = Dataset([self.address], spec)
+        self.assertTrue(len(observed) > 0)
+        self.assertListEqual(list(expected.data), list(observed.data))
+
+    def test_summarize(self):
+        self.assertEqual(summarizer.summarize(self.tsv_address),
+                         summarizer.summarize(self.address))
+
+
+if __name__ == '__main__':
+    unittest.main()
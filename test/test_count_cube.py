@@ -0,0 +1,60 @@
+import unittest
+import os.path
+import tempfile
+from collections import Counter
+import numpy as np
+import summarizer
+from count_cube import CountCube
+
+
+class TestCountCube(unittest.TestCase):
+    def setUp(self):
+        self.summary = Counter({(2000, 'A'): 4, (2002, 'A'): 9,
+                                (2001, 'B'): 5, (2002, 'B'): 1,
+                                (2000, 'C'): 2})
+        self.cube = CountCube.from_counter(self.summary)
+
+    def test_from_counter(self):
+        self.assertListEqual(self.cube.journals, ['A', 'B', 'C'])
+        self.assertListEqual(list(self.cube.years), [2000, 2001, 2002])
+        self.assertEqual(self.cube.to_counter(), dict(self.summary))
+        self.assertEqual(CountCube.from_counter(Counter()).total(), 0)
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            address = os.path.join(temp_dir, 'cube.npz')
+            self.cube.save(address)
+            loaded = CountCube.load(address)
+        self.assertListEqual(loaded.journals, self.cube.journals)
+        self.assertEqual(loaded.to_counter(), dict(self.summary))
+
+    def test_queries(self):
+        self.assertEqual(self.cube.total(), 21)
+        self.assertEqual(self.cube.total((2001, 2002)), 15)
+        self.assertEqual(self.cube.total((2001, 2010), ['A', 'D']), 9)
+        self.assertEqual(self.cube.total((1990, 1995)), 0)
+        self.assertListEqual(self.cube.top_journals(2), [('A', 13), ('B', 6)])
+        self.assertListEqual(self.cube.top_journals(5, (2001, 2001)),
+                             [('B', 5)])
+        years, counts = self.cube.time_series('A', (1999, 2001))
+        self.assertListEqual(list(years), [2000, 2001])
+        self.assertListEqual(list(counts), [4, 0])
+        self.assertListEqual(list(self.cube.time_series('D')[1]), [0, 0, 0])
+        rates = self.cube.growth_rates(2000, 2002)
+        self.assertAlmostEqual(rates[0], 0.5)
+        self.assertTrue(np.isnan(rates[1]))
+        self.assertEqual(rates[2], -1)
+
+    def test_summarizer(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cube_address = os.path.join(temp_dir, 'cube.npz')
+            summarizer.main('data/processed/PubMedSampleFile.tsv',
+                            os.path.join(temp_dir, 'summary.txt'),
+                            cube_address=cube_address)
+            cube = CountCube.load(cube_address)
+        self.assertEqual(cube.to_counter(), dict(summarizer.summarize(
+            'data/processed/PubMedSampleFile.tsv')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,8 @@
 import unittest
+import os.path
+import tempfile
 import pandas as pd
-from dataset import Dataset
+from dataset import Dataset, FilterSpec, PaperStore
 from build_dataset import make_dataset
 
 
@@ -27,17 +29,31 @@ class TestDataset(unittest.TestCase):
         self.assertEqual(len(self.dataset), self.data.shape[0])
 
     def test_to_dataframe(self):
-        self.assertTrue(self.data.equals(self.dataset.to_dataframe()))
+        observed = self.dataset.to_dataframe()
+        self.assertEqual(observed['journal'].dtype.name, 'category')
+        observed = observed.astype({'journal': object})
+        self.assertTrue(self.data.equals(observed))
 
     def test_to_csv(self):
-        address = 'temp/dataset.tmp'
-        self.dataset.to_csv(address, sep='\t')
-        with open(address, encoding=ENCODING) as fin:
-            observed = fin.read()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            address = os.path.join(temp_dir, 'dataset.tmp')
+            self.dataset.to_csv(address, sep='\t')
+            with open(address, encoding=ENCODING) as fin:
+                observed = fin.read()
         with open(self.address, encoding=ENCODING) as fin:
             expected = fin.read()
         self.assertEqual(expected, observed)
 
+    def test_to_csv_compressed(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            address = os.path.join(temp_dir, 'dataset.tsv.gz')
+            self.dataset.to_csv(address, sep='\t', num_threads=2)
+            observed = Dataset([address], [])
+            self.assertListEqual(list(observed.data), list(self.dataset.data))
+            spec = FilterSpec(['Ecology'], (2000, 2018))
+            self.assertListEqual(list(Dataset([address], spec).data),
+                                 list(Dataset([self.address], spec).data))
+
     def test_make_dataset(self):
         journals_path = 'data/journals.txt'
         inputs_path = 'data/data_file_addresses.txt'
@@ -50,3 +66,111 @@ class TestDataset(unittest.TestCase):
             self.assertEqual(paper.abstract, ds[i]['abstract'])
             self.assertEqual(paper.title, ds[i]['title'])
             self.assertEqual(paper.year, ds[i]['year'])
+
+    def test_filter_spec(self):
+        journals = ['Ecology']
+        conditions = [lambda paper: Dataset.designated_journal(paper, journals),
+                      lambda paper: Dataset.is_in_year_range(paper,
+                                                             (2000, 2018))]
+        expected = Dataset([self.address], conditions)
+        observed = Dataset([self.address], FilterSpec(journals, (2000, 2018)))
+        self.assertTrue(len(observed) > 0)
+        self.assertListEqual(list(expected.data), list(observed.data))
+        observed = Dataset([self.address], FilterSpec(year_range=(1900, 1901)))
+        self.assertEqual(len(observed), 0)
+
+    def test_filter_spec_keywords(self):
+        spec = FilterSpec(keywords=['METACOMMUNITY'])
+        observed = Dataset([self.address], [spec])
+        self.assertTrue(0 < len(observed) < len(self.dataset))
+        for paper in self.dataset:
+            self.assertEqual(spec(paper), paper in list(observed.data))
+
+    def test_filter_spec_with_conditions(self):
+        conditions = [FilterSpec(journals=['Ecology']),
+                      lambda paper: paper['year'] > 2020]
+        self.assertEqual(len(Dataset([self.address], conditions)), 0)
+        conditions = [FilterSpec(journals=['Ecology']),
+                      lambda paper: paper['year'] <= 2020]
+        expected = self.data.loc[self.data['journal'] == 'Ecology', :]
+        self.assertEqual(len(Dataset([self.address], conditions)),
+                         expected.shape[0])
+
+    def test_lazy(self):
+        lazy = Dataset([self.address, self.address], [], lazy=True)
+        eager = Dataset([self.address, self.address], [])
+        self.assertListEqual(list(lazy), list(eager.data))
+        self.assertListEqual(list(lazy.data), list(eager.data))
+        self.assertEqual(len(lazy), len(eager))
+        with self.assertRaises(TypeError):
+            lazy[0]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            address = os.path.join(temp_dir, 'lazy_dataset.tmp')
+            Dataset([self.address], [], lazy=True).to_csv(address, sep='\t')
+            with open(address, encoding=ENCODING) as fin:
+                observed = fin.read()
+        with open(self.address, encoding=ENCODING) as fin:
+            expected = fin.read()
+        self.assertEqual(expected, observed)
+
+    def test_num_workers(self):
+        paths = ['data/processed/PubMedSampleFile.tsv', self.address]
+        spec = FilterSpec(year_range=(2000, 2018))
+        expected = Dataset(paths, spec)
+        observed = Dataset(paths, spec, num_workers=2)
+        self.assertTrue(len(observed) > 0)
+        self.assertListEqual(list(observed.data), list(expected.data))
+        lazy = Dataset(paths, spec, lazy=True, num_workers=2)
+        self.assertListEqual(list(lazy), list(expected.data))
+        # Conditions that cannot be sent to other processes are applied serially
+        conditions = [lambda paper: paper['year'] >= 2000]
+        observed = Dataset(paths, conditions, num_workers=2)
+        self.assertListEqual(list(observed.data),
+                             list(Dataset(paths, conditions).data))
+
+    def test_iter_batches(self):
+        batches = list(self.dataset.iter_batches(4))
+        self.assertListEqual([len(batch) for batch in batches], [4, 4, 3])
+        lazy = Dataset([self.address], [], lazy=True)
+        self.assertListEqual(list(lazy.iter_batches(4)), batches)
+
+    def test_to_dataframe_chunks(self):
+        lazy = Dataset([self.address], [], lazy=True)
+        chunks = list(lazy.to_dataframe(chunksize=4))
+        self.assertEqual(len(chunks), 3)
+        observed = pd.concat(chunks, ignore_index=True)
+        observed = observed.astype({'journal': object})
+        self.assertTrue(self.data.equals(observed))
+
+
+class TestPaperStore(unittest.TestCase):
+    def setUp(self):
+        self.papers = [{'journal': 'A', 'title': 'T1', 'abstract': 'Ab1',
+                        'year': 2001},
+                       {'journal': 'B', 'title': 'T\u00e92', 'abstract': '',
+                        'year': 2002},
+                       {'journal': 'A', 'title': 'T3', 'abstract': 'Ab3',
+                        'year': 2003}]
+
+    def test_sequence(self):
+        store = PaperStore(self.papers)
+        self.assertEqual(len(store), 3)
+        self.assertListEqual(list(store), self.papers)
+        self.assertEqual(store[-1], self.papers[-1])
+        self.assertListEqual(store[1:], self.papers[1:])
+        self.assertListEqual(store.journals, ['A', 'B'])
+        with self.assertRaises(IndexError):
+            store[3]
+
+    def test_merge(self):
+        store = PaperStore(self.papers[1:])
+        store.merge(PaperStore(self.papers))
+        self.assertListEqual(list(store), self.papers[1:] + self.papers)
+        self.assertListEqual(store.journals, ['B', 'A'])
+
+    def test_data_setter(self):
+        dataset = Dataset([], [])
+        dataset.data = self.papers
+        self.assertIsInstance(dataset.data, PaperStore)
+        self.assertListEqual(list(dataset), self.papers)
+        self.assertEqual(dataset[1], self.papers[1])
@@ -0,0 +1,150 @@
+import unittest
+import logging
+import os
+import os.path
+import tempfile
+from unittest import mock
+import numpy as np
+import cleaner
+from columnar import ColumnarFile
+from dataset import Dataset
+import deduplicator
+from deduplicator import PMIDIndex, deduplicate, read_pmids
+
+
+class TestPMIDIndex(unittest.TestCase):
+    def test_update(self):
+        index = PMIDIndex()
+        self.assertEqual(index.update(np.array([3, 1, 2]), 1), set())
+        self.assertEqual(index.update(np.array([2, 5]), 3), {1})
+        # An older file does not supersede newer versions
+        self.assertEqual(index.update(np.array([5, 7]), 2), set())
+        self.assertListEqual(list(index.pmids), [1, 2, 3, 5, 7])
+        self.assertListEqual(list(index.sequences), [1, 3, 1, 3, 2])
+        self.assertListEqual(list(index.newest(np.array([2, 4, 7]))),
+                             [3, -1, 2])
+
+    def test_keep_mask(self):
+        index = PMIDIndex()
+        index.update(np.array([1, 2, 3]), 1)
+        index.update(np.array([2]), 2)
+        mask = index.keep_mask(np.array([1, 2, 3, 1, -1, -1]), 1)
+        self.assertListEqual(list(mask),
+                             [False, False, True, True, True, True])
+
+    def test_save_load(self):
+        index = PMIDIndex()
+        index.update(np.array([3, 1, 2]), 1)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            index.save(temp_dir)
+            loaded = PMIDIndex.load(temp_dir)
+            self.assertListEqual(list(loaded.pmids), [1, 2, 3])
+            self.assertListEqual(list(loaded.sequences), [1, 1, 1])
+            self.assertEqual(len(PMIDIndex.load(os.path.dirname(temp_dir))), 0)
+
+
+class TestDeduplicate(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source_dir = os.path.join(self.temp_dir.name, 'cleaned')
+        self.output_dir = os.path.join(self.temp_dir.name, 'deduplicated')
+        os.mkdir(self.source_dir)
+        self.logger = logging.getLogger(__name__)
+        self.baseline = os.path.join(self.source_dir, 'pubmed19n0001.tsv')
+        cleaner.get_content('data/raw/PubMedSampleFile.xml.gz', self.baseline,
+                            parser='lxml')
+        with open(self.baseline, encoding='utf-8') as fin:
+            self.lines = fin.readlines()
+        self.pmids = read_pmids(self.baseline)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_update(self, name, rows):
+        with cleaner.TSVWriter(os.path.join(self.source_dir, name)) as fout:
+            for i in rows:
+                journal, title, abstract, year = \
+                    self.lines[i].rstrip('\n').split('\t')
+                fout.write(journal, 'Updated ' + title, abstract, year,
+                           int(self.pmids[i]))
+
+    def read_titles(self, name):
+        dataset = Dataset([os.path.join(self.output_dir, name)], [])
+        return [paper['title'] for paper in dataset]
+
+    def test_deduplicate(self):
+        self.assertEqual(len(self.pmids), len(self.lines))
+        self.assertEqual(len(set(self.pmids)), len(self.pmids))
+        self.write_update('pubmed19n0002.tsv', [0, 3])
+        kept = deduplicate(self.source_dir, self.output_dir, self.logger)
+        self.assertDictEqual(kept, {'pubmed19n0001.tsv': len(self.lines) - 2,
+                                    'pubmed19n0002.tsv': 2})
+        titles = self.read_titles('pubmed19n0001.tsv')
+        self.assertEqual(len(titles), len(self.lines) - 2)
+        self.assertFalse(any(title.startswith('Updated') for title in titles))
+        self.assertListEqual(
+            list(read_pmids(os.path.join(self.output_dir,
+                                         'pubmed19n0001.tsv'))),
+            [pmid for i, pmid in enumerate(self.pmids) if i not in {0, 3}])
+        # A new update file only rewrites the files it supersedes
+        baseline_output = os.path.join(self.output_dir, 'pubmed19n0001.tsv')
+        mtime = os.stat(baseline_output).st_mtime - 100
+        os.utime(baseline_output, (mtime, mtime))
+        self.write_update('pubmed19n0003.tsv', [3])
+        kept = deduplicate(self.source_dir, self.output_dir, self.logger)
+        self.assertDictEqual(kept, {'pubmed19n0001.tsv': len(self.lines) - 2,
+                                    'pubmed19n0002.tsv': 1,
+                                    'pubmed19n0003.tsv': 1})
+        self.assertEqual(os.stat(baseline_output).st_mtime, mtime)
+        # Removing a file restores the versions it superseded
+        os.remove(os.path.join(self.source_dir, 'pubmed19n0003.tsv'))
+        kept = deduplicate(self.source_dir, self.output_dir, self.logger)
+        self.assertDictEqual(kept, {'pubmed19n0001.tsv': len(self.lines) - 2,
+                                    'pubmed19n0002.tsv': 2})
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir,
+                                                     'pubmed19n0003.tsv')))
+
+    def test_deduplicate_interrupted(self):
+        deduplicate(self.source_dir, self.output_dir, self.logger)
+        self.write_update('pubmed19n0002.tsv', [0, 3])
+        write_subset = deduplicator.write_subset
+
+        def fail_on_baseline(address, output_address, mask):
+            if address == self.baseline:
+                raise KeyboardInterrupt
+            write_subset(address, output_address, mask)
+
+        with mock.patch('deduplicator.write_subset', fail_on_baseline):
+            with self.assertRaises(KeyboardInterrupt):
+                deduplicate(self.source_dir, self.output_dir, self.logger)
+        # The rerun still removes the superseded papers from the baseline
+        kept = deduplicate(self.source_dir, self.output_dir, self.logger)
+        self.assertDictEqual(kept, {'pubmed19n0001.tsv': len(self.lines) - 2,
+                                    'pubmed19n0002.tsv': 2})
+        self.assertEqual(len(self.read_titles('pubmed19n0001.tsv')),
+                         len(self.lines) - 2)
+
+    def test_deduplicate_new_baseline(self):
+        # The first file of a new baseline is newer than the last update file
+        # of the previous year
+        self.write_update('pubmed19n1500.tsv', [0])
+        self.write_update('pubmed20n0001.tsv', [0])
+        kept = deduplicate(self.source_dir, self.output_dir, self.logger)
+        self.assertDictEqual(kept, {'pubmed19n0001.tsv': len(self.lines) - 1,
+                                    'pubmed19n1500.tsv': 0,
+                                    'pubmed20n0001.tsv': 1})
+
+    def test_deduplicate_columnar(self):
+        address = os.path.join(self.source_dir, 'pubmed19n0002.col')
+        cleaner.get_content('data/raw/PubMedSampleFile.xml.gz', address,
+                            parser='lxml', output_format='columnar')
+        kept = deduplicate(self.source_dir, self.output_dir, self.logger)
+        self.assertDictEqual(kept, {'pubmed19n0001.tsv': 0,
+                                    'pubmed19n0002.col': len(self.lines)})
+        source = ColumnarFile(os.path.join(self.output_dir,
+                                           'pubmed19n0002.col'))
+        self.assertListEqual(list(source.pmids), list(self.pmids))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import logging
+import os
+import os.path
+import shutil
+import tempfile
+from dataset import Dataset, FilterSpec
+from indexer import OffsetIndex, build_indexes, index_address
+
+
+class TestIndexer(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.address = os.path.join(self.temp_dir.name, 'PubMedSampleFile.tsv')
+        shutil.copy('data/processed/PubMedSampleFile.tsv', self.address)
+        self.logger = logging.getLogger(__name__)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_build_indexes(self):
+        self.assertEqual(build_indexes(self.temp_dir.name, self.logger), 1)
+        self.assertTrue(os.path.exists(index_address(self.address)))
+        self.assertEqual(build_indexes(self.temp_dir.name, self.logger), 0)
+        self.assertEqual(build_indexes(self.temp_dir.name, self.logger,
+                                       force=True), 1)
+
+    def test_lookup(self):
+        index = OffsetIndex.build(self.address)
+        with open(self.address, 'rb') as fin:
+            lines = fin.readlines()
+        self.assertEqual(len(index), len(lines))
+        self.assertListEqual(index.lookup(), [(0, os.path.getsize(
+            self.address))])
+        self.assertListEqual(index.lookup(['Not a journal']), [])
+        self.assertListEqual(index.lookup(year_range=(1900, 1901)), [])
+        expected = [line for line in lines if line.startswith(b'Ecology\t')]
+        self.assertTrue(len(expected) > 0)
+        with open(self.address, 'rb') as fin:
+            data = fin.read()
+        observed = [line for start, end in index.lookup(['Ecology'])
+                    for line in data[start:end].splitlines(keepends=True)]
+        self.assertListEqual(observed, expected)
+
+    def test_separator(self):
+        # A separator of more than one byte is skipped whole
+        address = os.path.join(self.temp_dir.name, 'separated.tsv')
+        with open(self.address, 'rb') as fin, open(address, 'wb') as fout:
+            fout.write(fin.read().replace(b'\t', b'||'))
+        index = OffsetIndex.build(address, sep='||')
+        self.assertListEqual(list(index.years),
+                             list(OffsetIndex.build(self.address).years))
+        self.assertGreater(len(index.lookup(year_range=(1900, 2100))), 0)
+
+    def test_dataset(self):
+        spec = FilterSpec(['Ecology'], (2000, 2018))
+        expected = Dataset([self.address], spec)
+        OffsetIndex.build(self.address).save(self.address)
+        self.assertIsNotNone(OffsetIndex.load(self.address))
+        observed = Dataset([self.address], spec)
+        self.assertTrue(len(observed) > 0)
+        self.assertListEqual(list(observed.data), list(expected.data))
+        self.assertEqual(len(Dataset([self.address],
+                                     FilterSpec(['Not a journal']))), 0)
+        # The index of a changed file is ignored
+        with open(self.address, 'a', encoding='utf-8') as fout:
+            fout.write('Ecology\tTitle\tAbstract\t2001\n')
+        self.assertIsNone(OffsetIndex.load(self.address))
+        self.assertEqual(len(Dataset([self.address], spec)),
+                         len(expected) + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
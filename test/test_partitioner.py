@@ -0,0 +1,69 @@
+import unittest
+import logging
+import os
+import os.path
+import tempfile
+from build_dataset import make_dataset
+from dataset import Dataset
+from partitioner import Catalog, journal_bucket, iter_papers, repartition
+
+
+class TestPartitioner(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.address = 'data/processed/PubMedSampleFile.tsv'
+        self.output_dir = os.path.join(self.temp_dir.name, 'partitioned')
+        self.catalog = repartition([self.address], self.output_dir,
+                                   logging.getLogger(__name__), num_buckets=4)
+        self.papers = list(iter_papers(self.address))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_journal_bucket(self):
+        self.assertEqual(journal_bucket('Ecology', 4),
+                         journal_bucket('Ecology', 4))
+        self.assertTrue(0 <= journal_bucket('Ecology', 4) < 4)
+
+    def test_repartition(self):
+        catalog = Catalog.load(self.output_dir)
+        self.assertEqual(catalog.partitions, self.catalog.partitions)
+        self.assertEqual(sum(partition['count']
+                             for partition in catalog.partitions),
+                         len(self.papers))
+        partitioned = []
+        for partition in catalog.partitions:
+            path = os.path.join(self.output_dir, partition['path'])
+            papers = list(iter_papers(path))
+            self.assertEqual(len(papers), partition['count'])
+            for paper in papers:
+                self.assertEqual(paper[3], partition['year'])
+                self.assertEqual(journal_bucket(paper[0], 4),
+                                 partition['bucket'])
+            partitioned.extend(papers)
+        self.assertListEqual(sorted(partitioned), sorted(self.papers))
+
+    def test_select(self):
+        catalog = Catalog.load(os.path.join(self.output_dir, 'catalog.json'))
+        self.assertEqual(len(catalog.select()), len(catalog.partitions))
+        self.assertListEqual(catalog.select(year_range=(1900, 1901)), [])
+        bucket = journal_bucket('Ecology', 4)
+        for path in catalog.select(['Ecology'], (2000, 2018)):
+            self.assertIn('bucket={:03d}'.format(bucket), path)
+
+    def test_make_dataset(self):
+        expected = make_dataset('data/journals.txt',
+                                'data/data_file_addresses.txt', 2000, 2018)
+        observed = make_dataset('data/journals.txt', None, 2000, 2018,
+                                catalog_path=self.output_dir)
+        self.assertTrue(len(observed) > 0)
+        key = lambda paper: (paper['year'], paper['title'])
+        self.assertListEqual(sorted(expected.data, key=key),
+                             sorted(observed.data, key=key))
+        observed = Dataset.from_catalog(self.output_dir, ['Ecology'],
+                                        (1900, 1901))
+        self.assertEqual(len(observed), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
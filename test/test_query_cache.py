@@ -0,0 +1,79 @@
+import unittest
+import os
+import os.path
+import shutil
+import tempfile
+from build_dataset import extract_dataset
+from dataset import Dataset, FilterSpec
+from query_cache import QueryCache
+
+
+class TestQueryCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.temp_dir.name, 'cache')
+        self.address = os.path.join(self.temp_dir.name, 'PubMedSampleFile.tsv')
+        shutil.copy('data/processed/PubMedSampleFile.tsv', self.address)
+        self.journals = sorted({paper['journal']
+                                for paper in Dataset([self.address], [])})
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_lookup(self):
+        cache = QueryCache(self.cache_dir)
+        spec = FilterSpec(self.journals, (2000, 2018))
+        papers = list(Dataset([self.address], spec))
+        self.assertIsNone(cache.lookup(self.journals, (2000, 2018),
+                                       [self.address]))
+        address = cache.store(self.journals, (2000, 2018), [self.address],
+                              papers)
+        self.assertEqual(cache.lookup(self.journals[::-1], [2000, 2018],
+                                      [self.address]), address)
+        # Subset queries are answered by the cached entry
+        self.assertEqual(cache.lookup(['Ecology'], (2005, 2010),
+                                      [self.address]), address)
+        self.assertIsNone(cache.lookup(['Ecology'], (1990, 2010),
+                                       [self.address]))
+        self.assertEqual(QueryCache(self.cache_dir).lookup(
+            ['Ecology'], (2005, 2010), [self.address]), address)
+        # Entries are not used once an input file has changed
+        with open(self.address, 'a', encoding='utf-8') as fout:
+            fout.write('Ecology\tTitle\tAbstract\t2001\n')
+        self.assertIsNone(cache.lookup(['Ecology'], (2005, 2010),
+                                       [self.address]))
+
+    def test_evict(self):
+        cache = QueryCache(self.cache_dir)
+        first = cache.store(['Ecology'], (2000, 2018), [self.address],
+                            Dataset([self.address], []))
+        second = cache.store(self.journals, (1900, 2100), [self.address],
+                             Dataset([self.address], []))
+        cache.lookup(['Ecology'], (2000, 2018), [self.address])
+        cache.max_size = cache.size() - 1
+        cache.evict()
+        self.assertTrue(os.path.exists(first))
+        self.assertFalse(os.path.exists(second))
+        cache.max_size = 0
+        self.assertIsNone(cache.store(['Ecology'], (2000, 2018),
+                                      [self.address], []))
+        self.assertEqual(os.listdir(self.cache_dir), ['cache.json'])
+
+    def test_extract_dataset(self):
+        expected = extract_dataset(self.journals, [self.address], 2000, 2018)
+        for lazy in (False, True):
+            for journals in (self.journals, self.journals[:1]):
+                subset = extract_dataset(journals, [self.address], 2000, 2018)
+                observed = extract_dataset(journals, [self.address], 2000,
+                                           2018, lazy=lazy,
+                                           cache_dir=self.cache_dir)
+                self.assertTrue(len(observed) > 0)
+                self.assertListEqual(list(observed), list(subset.data))
+        self.assertEqual(len(QueryCache(self.cache_dir).entries), 1)
+        self.assertEqual(len(expected), len(Dataset(
+            [QueryCache(self.cache_dir).lookup(self.journals, (2000, 2018),
+                                               [self.address])], [])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+import os.path
+import tempfile
+from scanner import TSVScanner
+
+
+class TestScanner(unittest.TestCase):
+    def setUp(self):
+        self.address = 'data/processed/PubMedSampleFile.tsv'
+
+    def test_fields(self):
+        with open(self.address, encoding='utf-8') as fin:
+            lines = [line.rstrip('\n').split('\t') for line in fin]
+        with TSVScanner(self.address) as scanner:
+            rows = list(scanner)
+            self.assertEqual(len(rows), len(lines))
+            for row, (journal, title, abstract, year) in zip(rows, lines):
+                self.assertEqual(scanner.journal(row), journal)
+                self.assertEqual(scanner.title(row), title)
+                self.assertEqual(scanner.abstract(row), abstract)
+                self.assertEqual(scanner.raw_year(row), year.encode('utf-8'))
+
+    def test_edge_cases(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            address = os.path.join(temp_dir, 'edge.tsv')
+            open(address, 'w').close()
+            with TSVScanner(address) as scanner:
+                self.assertListEqual(list(scanner), [])
+            with open(address, 'w', encoding='utf-8') as fout:
+                fout.write('Jé\tT\tA\t2001\n\nJ\tT\tA\tWinter')
+            with TSVScanner(address) as scanner:
+                rows = list(scanner)
+                self.assertEqual(len(rows), 2)
+                self.assertEqual(scanner.journal(rows[0]), 'Jé')
+                self.assertEqual(scanner.year(rows[0]), 2001)
+                self.assertEqual(scanner.abstract(rows[1]), 'A')
+                with self.assertRaises(ValueError):
+                    scanner.year(rows[1])
+            with open(address, 'w', encoding='utf-8') as fout:
+                fout.write('J\t2001\n')
+            with TSVScanner(address) as scanner:
+                with self.assertRaises(ValueError):
+                    list(scanner)
+
+
+if __name__ == '__main__':
+    unittest.main()
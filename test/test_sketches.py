@@ -0,0 +1,109 @@
+import unittest
+import os.path
+import tempfile
+from collections import Counter
+from unittest import mock
+import numpy as np
+import summarizer
+from sketches import (CorpusSketch, CountMinSketch, HeavyHitters, HyperLogLog,
+                      normalize_title)
+
+
+class TestSketches(unittest.TestCase):
+    def test_hyperloglog(self):
+        first, second = HyperLogLog(10), HyperLogLog(10)
+        for i in range(20000):
+            first.add('item {}'.format(i))
+            second.add('item {}'.format(i + 10000))
+        self.assertLess(abs(first.count() - 20000),
+                        3 * first.relative_error * 20000)
+        first.merge(second)
+        self.assertLess(abs(first.count() - 30000),
+                        3 * first.relative_error * 30000)
+        small = HyperLogLog()
+        for item in ['a', 'b', 'a']:
+            small.add(item)
+        self.assertEqual(small.count(), 2)
+        with self.assertRaises(ValueError):
+            small.merge(second)
+
+    def test_count_min(self):
+        counts = Counter({'item {}'.format(i): i % 50 + 1 for i in range(2000)})
+        first, second = CountMinSketch(512, 4), CountMinSketch(512, 4)
+        first.update(counts)
+        second.update(counts)
+        first.merge(second)
+        self.assertEqual(first.total, 2 * sum(counts.values()))
+        for item, count in counts.items():
+            self.assertGreaterEqual(first.estimate(item), 2 * count)
+        errors = [first.estimate(item) - 2 * count
+                  for item, count in counts.items()]
+        self.assertLess(sum(error > first.error_bound for error in errors),
+                        len(errors) * 0.05)
+
+    def test_heavy_hitters(self):
+        counts = Counter({'item {}'.format(i): 1 for i in range(1000)})
+        counts.update({'frequent': 500, 'common': 300})
+        first, second = HeavyHitters(10), HeavyHitters(10)
+        first.update(counts)
+        second.update(Counter({'common': 400}))
+        first.merge(second)
+        self.assertEqual(first.total, 2200)
+        self.assertListEqual([item for item, _ in first.top(2)],
+                             ['common', 'frequent'])
+        self.assertLessEqual(len(first.counts), 10)
+        for item, true_count in (('common', 700), ('frequent', 500)):
+            self.assertLessEqual(first.counts[item], true_count)
+            self.assertGreaterEqual(first.counts[item],
+                                    true_count - first.error_bound)
+
+    def test_corpus_sketch(self):
+        papers = [('Ecology', 'A title.', 'Species richness of species'),
+                  ('Ecology', 'a TITLE', 'Metacommunity species'),
+                  ('Oikos', 'Another title', 'Richness')]
+        sketch = CorpusSketch(precision=8, width=64, depth=3, capacity=5)
+        sketch.update(papers)
+        self.assertEqual(normalize_title('A title.'), 'a title')
+        self.assertEqual(sketch.titles.count(), 2)
+        self.assertAlmostEqual(sketch.near_duplicate_rate(), 1 / 3)
+        self.assertEqual(sketch.top_journals.top(1), [('Ecology', 2)])
+        self.assertEqual(sketch.top_terms.top(1), [('species', 3)])
+        # Adding the papers in batches gives the same sketch
+        with mock.patch('sketches.BATCH_SIZE', 2):
+            batched = CorpusSketch(precision=8, width=64, depth=3, capacity=5)
+            batched.update(papers)
+        np.testing.assert_array_equal(batched.terms.table, sketch.terms.table)
+        self.assertEqual(batched.top_terms.counts, sketch.top_terms.counts)
+        self.assertEqual(batched.top_journals.total, 3)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            address = os.path.join(temp_dir, 'sketch.npz')
+            sketch.save(address)
+            loaded = CorpusSketch.load(address)
+        loaded.merge(sketch)
+        self.assertEqual(loaded.num_papers, 6)
+        self.assertEqual(loaded.titles.count(), 2)
+        self.assertEqual(loaded.journals.estimate('Oikos'), 2)
+        self.assertEqual(loaded.top_terms.top(1), [('species', 6)])
+
+    def test_main_approximate(self):
+        address = 'data/processed/PubMedSampleFile.tsv'
+        with tempfile.TemporaryDirectory() as temp_dir:
+            out_address = os.path.join(temp_dir, 'report.txt')
+            sketch_address = os.path.join(temp_dir, 'sketch.npz')
+            sketch = summarizer.main_approximate(address, out_address,
+                                                 sketch_address=sketch_address)
+            merged = summarizer.main_approximate(
+                address, out_address, merge_addresses=[sketch_address])
+            with open(out_address) as fin:
+                report = fin.read()
+        exact = Counter(journal for _, journal in
+                        summarizer.summarize(address).elements())
+        self.assertEqual(sketch.num_papers, sum(exact.values()))
+        self.assertEqual(merged.num_papers, 2 * sketch.num_papers)
+        journal, count = exact.most_common(1)[0]
+        self.assertEqual(sketch.top_journals.counts[journal], count)
+        self.assertIn('Papers\t{}\n'.format(2 * sketch.num_papers), report)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import os
+import os.path
+import shutil
+import tempfile
+from collections import Counter
+import summarizer
+
+
+class TestSummarizer(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source = 'data/processed/PubMedSampleFile.tsv'
+        self.addresses = [os.path.join(self.temp_dir.name,
+                                       'pubmed{}.tsv'.format(i))
+                          for i in range(3)]
+        for address in self.addresses:
+            shutil.copy(self.source, address)
+        self.pattern = os.path.join(self.temp_dir.name, '*.tsv')
+        self.out_address = os.path.join(self.temp_dir.name, 'summary.txt')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def read_summary(self):
+        with open(self.out_address) as fin:
+            return fin.read()
+
+    def test_merge_summaries(self):
+        summaries = [Counter({(2000, 'A'): i, (2001, 'B'): 1})
+                     for i in range(5)]
+        self.assertEqual(summarizer.merge_summaries(summaries),
+                         Counter({(2000, 'A'): 10, (2001, 'B'): 5}))
+        self.assertEqual(summarizer.merge_summaries([]), Counter())
+
+    def test_main_incremental(self):
+        self.assertEqual(summarizer.main(self.pattern, self.out_address, 2), 3)
+        expected = self.read_summary()
+        counts = summarizer.summarize(self.source)
+        (year, journal_name), count = counts.most_common(1)[0]
+        self.assertIn('{}\t{}\t{}\n'.format(journal_name, year, 3 * count),
+                      expected)
+        self.assertTrue(os.path.exists(self.out_address +
+                                       summarizer.PARTIALS_EXTENSION))
+        self.assertEqual(summarizer.main(self.pattern, self.out_address, 2), 0)
+        self.assertEqual(self.read_summary(), expected)
+        # Only the changed file is summarized again
+        with open(self.addresses[0], 'a', encoding='utf-8') as fout:
+            fout.write('New Journal\tTitle\tAbstract\t2001\n')
+        self.assertEqual(summarizer.main(self.pattern, self.out_address, 2), 1)
+        self.assertIn('New Journal\t2001\t1\n', self.read_summary())
+        # Removed files no longer count
+        os.remove(self.addresses[0])
+        self.assertEqual(summarizer.main(self.pattern, self.out_address, 2), 0)
+        self.assertNotIn('New Journal', self.read_summary())
+
+    def test_sidecars(self):
+        # The sidecar files of the cleaner are not summarized
+        for name in ('manifest.json', 'pubmed0.tsv.pmid',
+                     'pubmed0.tsv.counts.json', 'pubmed0.tsv.index.npz'):
+            with open(os.path.join(self.temp_dir.name, name), 'wb') as fout:
+                fout.write(b'{}')
+        pattern = os.path.join(self.temp_dir.name, '*')
+        self.assertListEqual(summarizer.find_cleaned(pattern), self.addresses)
+        self.assertEqual(summarizer.main(pattern, self.out_address), 3)
+        summarizer.main(self.pattern, self.out_address)
+        expected = self.read_summary()
+        summarizer.main(pattern, self.out_address)
+        self.assertEqual(self.read_summary(), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
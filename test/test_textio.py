@@ -0,0 +1,65 @@
+import unittest
+import gzip
+import os
+import os.path
+import tempfile
+import textio
+from textio import TextWriter, compression_of, open_text
+
+
+class TestTextIO(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.lines = ['{}\tTitle é {}\tAbstract\t{}\n'.format(i, i, 2000 + i)
+                      for i in range(1000)]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def round_trip(self, name, **kwargs):
+        address = os.path.join(self.temp_dir.name, name)
+        with TextWriter(address, **kwargs) as fout:
+            fout.writelines(self.lines)
+        self.assertListEqual(os.listdir(self.temp_dir.name), [name])
+        with open_text(address) as fin:
+            self.assertListEqual(fin.readlines(), self.lines)
+        return address
+
+    def test_compression_of(self):
+        self.assertEqual(compression_of('a.tsv.gz'), 'gzip')
+        self.assertEqual(compression_of('a.tsv.zst'), 'zstd')
+        self.assertIsNone(compression_of('a.tsv'))
+
+    def test_plain(self):
+        self.round_trip('plain.tsv', buffer_size=100)
+
+    def test_gzip(self):
+        address = self.round_trip('single.tsv.gz')
+        with gzip.open(address, 'rt', encoding='utf-8') as fin:
+            self.assertEqual(fin.read(), ''.join(self.lines))
+        os.remove(address)
+        # Small buffers compressed in several threads make many members
+        self.round_trip('threaded.tsv.gz', num_threads=4, buffer_size=100)
+
+    def test_zstd(self):
+        if textio.zstandard is None:
+            self.skipTest('zstandard is not installed')
+        self.round_trip('threaded.tsv.zst', num_threads=2, buffer_size=100)
+
+    def test_empty(self):
+        address = os.path.join(self.temp_dir.name, 'empty.tsv.gz')
+        TextWriter(address).close()
+        with open_text(address) as fin:
+            self.assertEqual(fin.read(), '')
+
+    def test_discard(self):
+        address = os.path.join(self.temp_dir.name, 'failed.tsv.gz')
+        with self.assertRaises(RuntimeError):
+            with TextWriter(address, num_threads=2, buffer_size=100) as fout:
+                fout.writelines(self.lines)
+                raise RuntimeError()
+        self.assertListEqual(os.listdir(self.temp_dir.name), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
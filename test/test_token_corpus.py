@@ -0,0 +1,85 @@
+import unittest
+import os.path
+import tempfile
+import numpy as np
+from unittest import mock
+from dataset import Dataset
+from token_corpus import TokenCorpus
+from transformer import TFIDFVectorizer
+
+
+class TestTokenCorpus(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.address = os.path.join(self.temp_dir.name, 'tokens')
+        dataset = Dataset(['data/processed/PubMedSampleFile.tsv'], [])
+        self.texts = [paper['abstract'] for paper in dataset] + \
+            ['', 'The and of', 'Species species SPECIES richness']
+        self.corpus = TokenCorpus.build(self.texts, self.address)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_build(self):
+        corpus = TokenCorpus(self.address)
+        self.assertEqual(len(corpus), len(self.texts))
+        self.assertEqual(corpus.tokens.dtype, np.int32)
+        self.assertListEqual(list(corpus.terms), sorted(corpus.terms))
+        analyze = TFIDFVectorizer().transformer.build_analyzer()
+        for i, text in enumerate(self.texts):
+            self.assertListEqual(corpus.document(i), analyze(text))
+
+    def test_fit_transform(self):
+        for kwargs in [{}, {'min_df': 2, 'max_df': 0.5},
+                       {'ngram_range': (1, 3), 'max_features': 50,
+                        'sublinear_tf': True},
+                       {'ngram_range': (2, 2), 'stop_words': 'english',
+                        'binary': True, 'smooth_idf': False},
+                       {'vocabulary': ['species', 'species richness', 'zzz'],
+                        'ngram_range': (1, 2), 'norm': None}]:
+            expected = TFIDFVectorizer(**kwargs)
+            expected.fit(self.texts)
+            observed = TFIDFVectorizer(**kwargs)
+            observed.fit_tokens(self.corpus)
+            self.assertDictEqual(observed.transformer.vocabulary_,
+                                 expected.transformer.vocabulary_)
+            np.testing.assert_allclose(observed.transformer.idf_,
+                                       expected.transformer.idf_)
+            np.testing.assert_allclose(
+                observed.transform_tokens(self.corpus).toarray(),
+                expected.transform(self.texts).toarray())
+            # A vectorizer fitted on the texts transforms the corpus as well
+            np.testing.assert_allclose(
+                expected.transform_tokens(self.corpus).toarray(),
+                expected.transform(self.texts).toarray())
+
+    def test_chunks(self):
+        # Counting by chunks of a few documents gives the same counts
+        counts, term = self.corpus.count((1, 3), stop_words={'the', 'of'})
+        terms = [term(column) for column in range(counts.shape[1])]
+        vocabulary = {gram: column for column, gram in enumerate(terms)}
+        with mock.patch('token_corpus.NGRAM_CHUNK_SIZE', 50):
+            self.assertGreater(len(list(self.corpus._chunks())), 2)
+            chunked, chunked_term = self.corpus.count(
+                (1, 3), stop_words={'the', 'of'})
+            self.assertListEqual(
+                [chunked_term(column) for column in range(chunked.shape[1])],
+                terms)
+            np.testing.assert_array_equal(chunked.toarray(),
+                                          counts.toarray())
+            np.testing.assert_array_equal(
+                self.corpus.count_vocabulary(
+                    vocabulary, (1, 3), stop_words={'the', 'of'}).toarray(),
+                counts.toarray())
+
+    def test_check(self):
+        with self.assertRaises(ValueError):
+            TFIDFVectorizer(lowercase=False).fit_tokens(self.corpus)
+        with self.assertRaises(ValueError):
+            TFIDFVectorizer(analyzer='char').fit_tokens(self.corpus)
+        with self.assertRaises(ValueError):
+            TFIDFVectorizer(min_df=1000).fit_tokens(self.corpus)
+
+
+if __name__ == '__main__':
+    unittest.main()
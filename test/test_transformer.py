@@ -1,8 +1,20 @@
 import unittest
+import os.path
+import pickle
+import tempfile
+from unittest import mock
+import numpy as np
 from numpy import linalg as LA
-from transformer import LabelEncoder, TFIDFVectorizer
+from dataset import Dataset
+from transformer import LabelEncoder, TermIndex, TFIDFVectorizer
 
 class TestLabelEncoder(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
     def test_transform(self):
         encoder = LabelEncoder()
         labels = list('ABCD')
@@ -20,11 +32,25 @@ class TestLabelEncoder(unittest.TestCase):
         encoder = LabelEncoder()
         labels = list('ABCD')
         encoder.fit(labels)
-        address = 'temp/label_encoder.cod'
+        address = os.path.join(self.temp_dir.name, 'label_encoder.cod')
         encoder.save(address)
         new_encoder = LabelEncoder.load(address)
+        self.assertIsInstance(new_encoder, LabelEncoder)
+        self.assertIsInstance(new_encoder.encoder.classes_, np.memmap)
         self.assertListEqual(list(encoder.transform(labels)),
                              list(new_encoder.transform(labels)))
+        self.assertListEqual(list(new_encoder.inverse_transform([3, 0])),
+                             ['D', 'A'])
+
+    def test_load_pickle(self):
+        encoder = LabelEncoder()
+        encoder.fit(list('ABCD'))
+        address = os.path.join(self.temp_dir.name, 'label_encoder.pkl')
+        with open(address, 'wb') as fout:
+            pickle.dump(encoder.encoder, fout)
+        new_encoder = LabelEncoder.load(address)
+        self.assertIsInstance(new_encoder, LabelEncoder)
+        self.assertListEqual(list(new_encoder.transform(['B'])), [1])
 
 class TestTFIDFVectorizer(unittest.TestCase):
     def setUp(self):
@@ -34,6 +60,10 @@ class TestTFIDFVectorizer(unittest.TestCase):
                        'And this is the third one.',
                        'Is this the first document?']
         self.vectorizer.fit(self.corpus)
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
 
     def test_fit(self):
         feature_names = ['and', 'document', 'first', 'is', 'one', 'second',
@@ -46,11 +76,109 @@ class TestTFIDFVectorizer(unittest.TestCase):
         self.assertTupleEqual((X.shape), (4, 9))
 
     def test_load_save(self):
-        address = 'temp/vectorizer.cod'
+        address = os.path.join(self.temp_dir.name, 'vectorizer.cod')
         self.vectorizer.save(address)
         new_vectorizer = TFIDFVectorizer.load(address)
+        self.assertIsInstance(new_vectorizer, TFIDFVectorizer)
+        self.assertIsInstance(new_vectorizer.transformer.vocabulary_,
+                              TermIndex)
+        self.assertIsInstance(new_vectorizer.transformer.idf_, np.memmap)
         self.assertListEqual(list(self.vectorizer.get_feature_names()),
                              list(new_vectorizer.get_feature_names()))
         X1 = self.vectorizer.transform(self.corpus)
         X2 = new_vectorizer.transform(self.corpus)
         self.assertAlmostEqual(LA.norm(X1.todense()), LA.norm(X2.todense()))
+        self.assertEqual((X1 != X2).nnz, 0)
+        with mock.patch('transformer.LOOKUP_BATCH_SIZE', 3):
+            X2 = new_vectorizer.transform(self.corpus + ['', 'unknown terms'])
+        self.assertEqual((X1 != X2[:len(self.corpus)]).nnz, 0)
+        self.assertEqual(X2[len(self.corpus):].nnz, 0)
+        X3 = new_vectorizer.transform(self.corpus, num_workers=2,
+                                      shard_size=1)
+        self.assertEqual((X1 != X3).nnz, 0)
+        # A loaded vectorizer can be saved and fitted again
+        new_vectorizer.save(address)
+        self.assertListEqual(
+            list(TFIDFVectorizer.load(address).get_feature_names()),
+            list(self.vectorizer.get_feature_names()))
+        new_vectorizer.fit(self.corpus[:1])
+        self.assertEqual(len(new_vectorizer.get_feature_names()), 5)
+
+    def test_load_weighting(self):
+        address = os.path.join(self.temp_dir.name, 'vectorizer.cod')
+        for kwargs in [{'sublinear_tf': True}, {'norm': None},
+                       {'use_idf': False, 'norm': 'l1'},
+                       {'dtype': np.float32}]:
+            vectorizer = TFIDFVectorizer(**kwargs)
+            vectorizer.fit(self.corpus)
+            vectorizer.save(address)
+            X1 = vectorizer.transform(self.corpus)
+            X2 = TFIDFVectorizer.load(address).transform(self.corpus)
+            self.assertEqual(X1.dtype, X2.dtype)
+            np.testing.assert_array_equal(X1.toarray(), X2.toarray())
+
+    def test_load_pickle(self):
+        address = os.path.join(self.temp_dir.name, 'vectorizer.pkl')
+        with open(address, 'wb') as fout:
+            pickle.dump(self.vectorizer.transformer, fout)
+        new_vectorizer = TFIDFVectorizer.load(address)
+        self.assertIsInstance(new_vectorizer, TFIDFVectorizer)
+        self.assertListEqual(list(self.vectorizer.get_feature_names()),
+                             list(new_vectorizer.get_feature_names()))
+
+    def test_term_index(self):
+        index = TermIndex.from_terms(['b', '\u00e9t\u00e9', 'a'])
+        self.assertEqual(len(index), 3)
+        self.assertListEqual(list(index), ['b', '\u00e9t\u00e9', 'a'])
+        self.assertEqual(index['\u00e9t\u00e9'], 1)
+        self.assertNotIn('c', index)
+        self.assertListEqual(list(index.lookup(['a', 'c', '\u00e9t\u00e9', 'b',
+                                                'ab', ''])),
+                             [2, -1, 1, 0, -1, -1])
+        index.save(self.temp_dir.name)
+        loaded = TermIndex.load(self.temp_dir.name)
+        self.assertIsInstance(loaded.hashes()[0], np.memmap)
+        self.assertListEqual(list(loaded.lookup(['a', 'c'])), [2, -1])
+        # The hashes of an index saved without them are computed on load
+        for name in ('term_hashes', 'term_hash_ids', 'term_hash_key'):
+            os.remove(os.path.join(self.temp_dir.name, '{}.npy'.format(name)))
+        self.assertListEqual(
+            list(TermIndex.load(self.temp_dir.name).lookup(['a', 'c'])),
+            [2, -1])
+        self.assertListEqual(list(pickle.loads(pickle.dumps(index)).items()),
+                             [('b', 0), ('\u00e9t\u00e9', 1), ('a', 2)])
+
+    def test_fit_batches(self):
+        dataset = Dataset(['data/processed/PubMedSampleFile.tsv'], [],
+                          lazy=True)
+        corpus = [paper['abstract'] for paper in dataset]
+        for kwargs in [{}, {'min_df': 2, 'max_df': 0.5},
+                       {'max_features': 20, 'sublinear_tf': True},
+                       {'ngram_range': (1, 2), 'binary': True,
+                        'smooth_idf': False},
+                       {'vocabulary': ['species', 'community', 'absent']}]:
+            expected = TFIDFVectorizer(**kwargs)
+            expected.fit(corpus)
+            observed = TFIDFVectorizer(**kwargs)
+            observed.fit_batches(dataset.iter_batches(4),
+                                 key=lambda paper: paper['abstract'])
+            self.assertDictEqual(observed.transformer.vocabulary_,
+                                 expected.transformer.vocabulary_)
+            np.testing.assert_allclose(observed.transformer.idf_,
+                                       expected.transformer.idf_)
+            np.testing.assert_allclose(observed.transform(corpus).toarray(),
+                                       expected.transform(corpus).toarray())
+        with self.assertRaises(ValueError):
+            TFIDFVectorizer(min_df=100).fit_batches([corpus])
+
+    def test_transform_num_workers(self):
+        corpus = self.corpus * 5
+        expected = self.vectorizer.transform(corpus)
+        for shard_size in [None, 3, 100]:
+            observed = self.vectorizer.transform(iter(corpus), num_workers=2,
+                                                 shard_size=shard_size)
+            self.assertEqual(observed.format, 'csr')
+            self.assertEqual(observed.indices.dtype, expected.indices.dtype)
+            self.assertEqual(observed.indptr.dtype, expected.indptr.dtype)
+            self.assertTupleEqual(observed.shape, expected.shape)
+            self.assertEqual((observed != expected).nnz, 0)
@@ -0,0 +1,123 @@
+import unittest
+import os
+import os.path
+import shutil
+import tempfile
+from dataset import Dataset, FilterSpec
+from transformer import TFIDFVectorizer
+from vector_cache import VectorCache
+
+
+def tokenize(text):
+    return text.split()
+
+
+def tokenize_lower(text):
+    return text.lower().split()
+
+
+class TestVectorCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.temp_dir.name, 'cache')
+        self.address = os.path.join(self.temp_dir.name, 'PubMedSampleFile.tsv')
+        shutil.copy('data/processed/PubMedSampleFile.tsv', self.address)
+        self.papers = list(Dataset([self.address], []))
+        self.vectorizer = TFIDFVectorizer()
+        self.vectorizer.fit([paper['abstract'] for paper in self.papers])
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _expected(self, paths, spec):
+        texts = [paper['abstract'] for paper in Dataset(paths, spec)]
+        return self.vectorizer.transform(texts)
+
+    def test_transform(self):
+        cache = VectorCache(self.cache_dir)
+        paths = [self.address, self.address]
+        spec = FilterSpec(['Ecology'])
+        observed = cache.transform(self.vectorizer, paths, spec)
+        self.assertEqual((observed != self._expected(paths, spec)).nnz, 0)
+        self.assertEqual(len(cache.entries), 1)
+
+        def fail(*args, **kwargs):
+            raise AssertionError('cached files are vectorized again')
+
+        # Cached matrices are used by later calls, even from another cache
+        vectorizer = TFIDFVectorizer.load(self._saved(self.vectorizer))
+        vectorizer.transform = fail
+        observed = VectorCache(self.cache_dir).transform(vectorizer, paths,
+                                                         spec)
+        self.assertEqual((observed != self._expected(paths, spec)).nnz, 0)
+        # Other filters and changed files are vectorized again
+        cache.transform(self.vectorizer, [self.address])
+        self.assertEqual(len(cache.entries), 2)
+        with open(self.address, 'a', encoding='utf-8') as fout:
+            fout.write('Ecology\tTitle\tSpecies abstract\t2001\n')
+        observed = cache.transform(self.vectorizer, paths, spec)
+        self.assertEqual(observed.shape[0], 2 *
+                         len(Dataset([self.address], spec)))
+        self.assertEqual(len(cache.entries), 3)
+        # So are the files when the vectorizer changes
+        other = TFIDFVectorizer(sublinear_tf=True)
+        other.fit([paper['abstract'] for paper in self.papers])
+        self.assertNotEqual(other.fingerprint(), self.vectorizer.fingerprint())
+        cache.transform(other, [self.address], spec)
+        self.assertEqual(len(cache.entries), 4)
+
+    def test_content(self):
+        cache = VectorCache(self.cache_dir)
+        cache.transform(self.vectorizer, [self.address])
+        # Copies of a file and files touched without changes are not
+        # vectorized again
+        copy_address = os.path.join(self.temp_dir.name, 'Copy.tsv')
+        shutil.copy(self.address, copy_address)
+        os.utime(self.address, (0, 0))
+        cache.transform(self.vectorizer, [self.address, copy_address])
+        self.assertEqual(len(cache.entries), 1)
+
+    def test_functions(self):
+        texts = [paper['abstract'] for paper in self.papers]
+        fingerprints = []
+        for function in (tokenize, tokenize_lower):
+            vectorizer = TFIDFVectorizer(tokenizer=function)
+            vectorizer.fit(texts)
+            fingerprints.append(vectorizer.fingerprint())
+        self.assertIsNotNone(fingerprints[0])
+        self.assertNotEqual(fingerprints[0], fingerprints[1])
+        # Lambdas and nested functions cannot be told apart by their names,
+        # so vectorizers using them are not cached
+        for function in (lambda text: text.split(),
+                         lambda text: text.lower().split()):
+            vectorizer = TFIDFVectorizer(tokenizer=function)
+            vectorizer.fit(texts)
+            self.assertIsNone(vectorizer.fingerprint())
+            cache = VectorCache(self.cache_dir)
+            observed = cache.transform(vectorizer, [self.address])
+            self.assertEqual((observed != vectorizer.transform(texts)).nnz, 0)
+            self.assertEqual(len(cache.entries), 0)
+
+    def _saved(self, vectorizer):
+        address = os.path.join(self.temp_dir.name, 'vectorizer')
+        vectorizer.save(address)
+        return address
+
+    def test_evict(self):
+        cache = VectorCache(self.cache_dir)
+        cache.transform(self.vectorizer, [self.address])
+        size = cache.size()
+        cache = VectorCache(self.cache_dir, max_size=int(size * 1.5))
+        cache.transform(self.vectorizer, [self.address],
+                        FilterSpec(year_range=(1900, 2100)))
+        self.assertEqual(len(cache.entries), 1)
+        self.assertLessEqual(cache.size(), cache.max_size)
+        self.assertEqual(len([name for name in os.listdir(self.cache_dir)
+                              if name.endswith('.npz')]), 1)
+        self.assertEqual(
+            cache.transform(self.vectorizer, []).shape,
+            (0, len(self.vectorizer.get_feature_names())))
+
+
+if __name__ == '__main__':
+    unittest.main()
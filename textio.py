@@ -0,0 +1,187 @@
+'''Read and write plain or compressed text files.
+
+The compression of a file is inferred from its extension (see
+COMPRESSIONS): '.gz' files are gzip-compressed and '.zst' files are
+Zstandard-compressed, which requires the optional zstandard package.
+Writers buffer their output into large blocks, optionally compress the
+blocks in several threads, and write into a temporary file which replaces
+the target on close, so readers never see a partial file.
+'''
+import gzip
+import io
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+ENCODING = 'utf-8'
+# Maps each supported compression to the extension of its files
+COMPRESSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+# Number of buffered characters that triggers writing them out
+BUFFER_SIZE = 1 << 22
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def compression_of(address):
+    '''Get the compression of a file from its extension.
+
+    Args:
+        address: Address of a file.
+
+    Returns:
+        A key of COMPRESSIONS, or None for uncompressed files.
+    '''
+    for compression, extension in COMPRESSIONS.items():
+        if address.endswith(extension):
+            return compression
+    return None
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise ImportError('The zstandard package is required for reading '
+                          'and writing .zst files')
+
+
+def open_binary(address):
+    '''Open a plain or compressed file for reading its decompressed bytes.
+
+    Args:
+        address: Address of a file.
+
+    Returns:
+        A readable binary file object.
+    '''
+    compression = compression_of(address)
+    if compression == 'gzip':
+        return gzip.open(address, 'rb')
+    if compression == 'zstd':
+        _require_zstandard()
+        return zstandard.ZstdDecompressor().stream_reader(open(address, 'rb'),
+                                                          closefd=True)
+    return open(address, 'rb')
+
+
+def open_text(address, encoding=ENCODING):
+    '''Open a plain or compressed text file for reading.
+
+    Args:
+        address: Address of a file.
+        encoding: The encoding of the text.
+
+    Returns:
+        A readable text file object.
+    '''
+    if compression_of(address) is None:
+        return open(address, 'r', encoding=encoding)
+    return io.TextIOWrapper(io.BufferedReader(open_binary(address)),
+                            encoding=encoding)
+
+
+class TextWriter(object):
+    '''Write text into a plain or compressed file through large buffers.
+
+    The text is written into a temporary file which replaces address on
+        close. gzip files are written as a sequence of independently
+        compressed members (one per buffer), which lets several threads
+        compress consecutive buffers at the same time; the result is a
+        valid gzip file. zstd files are compressed with the multi-threaded
+        compressor of the zstandard package.
+
+    Args:
+        address: Address of the file to be created. Its extension selects
+            the compression (see compression_of).
+        num_threads: Number of threads compressing the output.
+        buffer_size: Number of characters buffered before they are written.
+        encoding: The encoding of the text.
+    '''
+    def __init__(self, address, num_threads=1, buffer_size=BUFFER_SIZE,
+                 encoding=ENCODING):
+        self.address = address
+        self.compression = compression_of(address)
+        self.buffer_size = buffer_size
+        self.encoding = encoding
+        self._num_threads = num_threads
+        self._temp_address = '{}.part'.format(address)
+        self._buffer = []
+        self._buffered = 0
+        self._pending = deque()
+        self._executor = None
+        self._fout = open(self._temp_address, 'wb')
+        self._stream = self._fout
+        if self.compression == 'zstd':
+            _require_zstandard()
+            compressor = zstandard.ZstdCompressor(
+                level=ZSTD_LEVEL, threads=num_threads if num_threads > 1 else 0)
+            self._stream = compressor.stream_writer(self._fout)
+        elif self.compression == 'gzip' and num_threads > 1:
+            self._executor = ThreadPoolExecutor(max_workers=num_threads)
+
+    def write(self, text):
+        '''Append text to the file.'''
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def writelines(self, lines):
+        '''Append a sequence of strings to the file.'''
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        '''Encode, compress, and write the buffered text.'''
+        if not self._buffer:
+            return
+        data = ''.join(self._buffer).encode(self.encoding)
+        self._buffer = []
+        self._buffered = 0
+        if self.compression != 'gzip':
+            self._stream.write(data)
+        elif self._executor is None:
+            self._fout.write(gzip.compress(data, GZIP_LEVEL))
+        else:
+            # zlib releases the GIL, so buffers are compressed in parallel
+            self._pending.append(self._executor.submit(gzip.compress, data,
+                                                       GZIP_LEVEL))
+            while len(self._pending) > self._num_threads:
+                self._fout.write(self._pending.popleft().result())
+
+    def _release(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+        if self._stream is not self._fout:
+            self._stream.close()
+        if not self._fout.closed:
+            self._fout.close()
+
+    def close(self):
+        '''Write the remaining text and move the file into place.'''
+        self.flush()
+        while self._pending:
+            self._fout.write(self._pending.popleft().result())
+        if self.compression == 'gzip' and self._fout.tell() == 0:
+            # An empty gzip file still needs a member to be valid
+            self._fout.write(gzip.compress(b'', GZIP_LEVEL))
+        self._release()
+        os.replace(self._temp_address, self.address)
+
+    def discard(self):
+        '''Close the file without moving it into place.'''
+        self._pending.clear()
+        self._release()
+        os.remove(self._temp_address)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
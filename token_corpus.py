@@ -0,0 +1,366 @@
+'''Tokenize documents once for fitting many TF-IDF vectorizers.
+
+A token corpus holds the tokens of a list of documents as integer ids into
+a dictionary of terms, so that vectorizers with different n-gram ranges,
+stop words, document frequency limits, or weightings can be fitted and
+applied with NumPy operations on the ids instead of tokenizing the texts
+again (see TFIDFVectorizer.fit_tokens and TFIDFVectorizer.transform_tokens).
+The tokens are those of sklearn's word analyzer before stop words are
+removed, and a token corpus is a directory that is memory-mapped:
+
+    meta.json           Format version and the tokenization parameters
+                        (lowercase, strip_accents, and token_pattern).
+    tokens.npy          int32 term ids of the tokens of all documents.
+    offsets.npy         int64 offsets of the documents in tokens.
+    terms.npy           uint8 UTF-8 encoded terms, sorted and concatenated
+                        (see transformer.TermIndex).
+    term_offsets.npy    int64 offsets of the terms.
+    term_hash*.npy      The hash index of the terms.
+
+For information about using this module run the following command.
+
+python token_corpus.py -h
+'''
+import argparse
+import json
+import os
+import os.path
+import shutil
+from array import array
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer
+from dataset import Dataset
+from transformer import TermIndex, load_array
+
+
+FORMAT_VERSION = 1
+META_NAME = 'meta.json'
+ENCODING = 'utf-8'
+TOKEN_PATTERN = r'(?u)\b\w\w+\b'
+# Number of buffered token ids that triggers writing them to disk
+BUFFER_SIZE = 1 << 20
+# Number of tokens of the chunks of documents whose n-grams are counted
+NGRAM_CHUNK_SIZE = 1 << 22
+
+
+class TokenCorpus(object):
+    '''Read-only, memory-mapped access to a token corpus.
+
+    Args:
+        address: Address of a token corpus created by TokenCorpus.build.
+    '''
+    def __init__(self, address):
+        self.address = address
+        with open(os.path.join(address, META_NAME), encoding=ENCODING) as fin:
+            meta = json.load(fin)
+        if meta['format_version'] != FORMAT_VERSION:
+            raise ValueError(('{} has an unsupported token corpus format ' +
+                              'version').format(address))
+        self.lowercase = meta['lowercase']
+        self.strip_accents = meta['strip_accents']
+        self.token_pattern = meta['token_pattern']
+        self.tokens = load_array(address, 'tokens')
+        self.offsets = load_array(address, 'offsets')
+        self.terms = TermIndex.load(address)
+
+    @classmethod
+    def build(cls, documents, address, lowercase=True, strip_accents=None,
+              token_pattern=TOKEN_PATTERN):
+        '''Tokenize documents into a token corpus.
+
+        The token ids are streamed to disk, so memory usage is bounded by
+            the number of distinct terms and of documents. The token corpus
+            is created in a temporary directory which replaces address once
+            it is complete.
+
+        Args:
+            documents: An iterable of texts, e.g. the abstracts of the papers
+                of a Dataset object.
+            address: Address of the token corpus (a directory) to be created.
+            lowercase: Whether the texts are converted to lower case.
+            strip_accents: None, 'ascii', or 'unicode' (see sklearn's
+                CountVectorizer).
+            token_pattern: The regular expression of the tokens.
+
+        Returns:
+            A TokenCorpus object.
+        '''
+        analyzer = CountVectorizer(lowercase=lowercase,
+                                   strip_accents=strip_accents,
+                                   token_pattern=token_pattern)
+        preprocess = analyzer.build_preprocessor()
+        tokenize = analyzer.build_tokenizer()
+        temp_address = '{}.part'.format(address)
+        if os.path.exists(temp_address):
+            shutil.rmtree(temp_address)
+        os.makedirs(temp_address)
+        # Terms get ids by first appearance, which are sorted afterwards
+        ids = {}
+        buffer = array('i')
+        offsets = array('q', [0])
+        raw_address = os.path.join(temp_address, 'tokens.bin')
+        with open(raw_address, 'wb') as fout:
+            for document in documents:
+                size = len(buffer)
+                for token in tokenize(preprocess(document)):
+                    buffer.append(ids.setdefault(token, len(ids)))
+                offsets.append(offsets[-1] + len(buffer) - size)
+                if len(buffer) >= BUFFER_SIZE:
+                    buffer.tofile(fout)
+                    buffer = array('i')
+            buffer.tofile(fout)
+        terms = sorted(ids)
+        ranks = np.empty(len(terms), dtype=np.int32)
+        for rank, term in enumerate(terms):
+            ranks[ids[term]] = rank
+        num_tokens = offsets[-1]
+        tokens = np.lib.format.open_memmap(
+            os.path.join(temp_address, 'tokens.npy'), mode='w+',
+            dtype=np.int32, shape=(num_tokens,))
+        if num_tokens > 0:
+            raw = np.memmap(raw_address, dtype=np.int32, mode='r')
+            for start in range(0, num_tokens, BUFFER_SIZE):
+                end = min(start + BUFFER_SIZE, num_tokens)
+                tokens[start:end] = ranks[raw[start:end]]
+            del raw
+        tokens.flush()
+        del tokens
+        os.remove(raw_address)
+        np.save(os.path.join(temp_address, 'offsets.npy'),
+                np.frombuffer(offsets, dtype=np.int64))
+        TermIndex.from_terms(terms).save(temp_address)
+        meta = {'format_version': FORMAT_VERSION, 'lowercase': lowercase,
+                'strip_accents': strip_accents,
+                'token_pattern': token_pattern}
+        with open(os.path.join(temp_address, META_NAME), 'w',
+                  encoding=ENCODING) as fout:
+            json.dump(meta, fout)
+        if os.path.exists(address):
+            shutil.rmtree(address)
+        os.replace(temp_address, address)
+        return cls(address)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def document(self, i):
+        '''Get the tokens of the i-th document.'''
+        tokens = self.tokens[self.offsets[i]:self.offsets[i + 1]]
+        return [self.terms.term(token) for token in tokens]
+
+    def check(self, vectorizer):
+        '''Check that a vectorizer splits texts into the corpus tokens.
+
+        Args:
+            vectorizer: An sklearn TfidfVectorizer or CountVectorizer.
+
+        Raises:
+            ValueError: If the vectorizer does not use the word analyzer of
+                sklearn with the tokenization parameters of the corpus.
+        '''
+        if vectorizer.analyzer != 'word' or vectorizer.input != 'content' or \
+                vectorizer.preprocessor is not None or \
+                vectorizer.tokenizer is not None:
+            raise ValueError('Only the default word analyzer can use a token '
+                             'corpus')
+        for name in ('lowercase', 'strip_accents', 'token_pattern'):
+            if getattr(vectorizer, name) != getattr(self, name):
+                raise ValueError('{} was tokenized with another {}'.format(
+                    self.address, name))
+
+    def _chunks(self):
+        '''Yield the bounds of chunks of whole documents.
+
+        Each chunk holds about NGRAM_CHUNK_SIZE tokens, or a single larger
+            document.
+
+        Yields:
+            Tuples of the first and the past-the-end document of a chunk.
+        '''
+        start = 0
+        while start < len(self):
+            end = int(np.searchsorted(self.offsets,
+                                      self.offsets[start] + NGRAM_CHUNK_SIZE,
+                                      side='right')) - 1
+            end = min(max(end, start + 1), len(self))
+            yield start, end
+            start = end
+
+    def _ngrams(self, ngram_range, stop_words):
+        '''Yield the n-grams of the documents by chunks of documents.
+
+        Stop words are removed before the n-grams are formed, as sklearn
+            does. The n-grams of a given n are encoded as integers in base
+            len(self.terms), with the first token as the most significant
+            digit. The codes are int32 when they fit, and int64 otherwise,
+            so the memory used is bounded by the size of a chunk (see
+            NGRAM_CHUNK_SIZE) rather than by that of the corpus.
+
+        Yields:
+            Tuples of n, an array of the documents of the n-grams, and an
+                array of their codes, for each chunk and each n.
+        '''
+        stop_ids = None
+        if stop_words:
+            stop_ids = self.terms.lookup(list(stop_words))
+            stop_ids = stop_ids[stop_ids >= 0]
+        base = max(len(self.terms), 1)
+        if base ** ngram_range[1] > np.iinfo(np.int64).max:
+            raise ValueError('The {}-grams of {} terms cannot be encoded as '
+                             '64-bit integers'.format(ngram_range[1], base))
+        for start, end in self._chunks():
+            offsets = self.offsets[start:end + 1]
+            tokens = np.asarray(self.tokens[offsets[0]:offsets[-1]])
+            docs = np.repeat(np.arange(start, end, dtype=np.int32),
+                             np.diff(offsets))
+            if stop_ids is not None:
+                keep = ~np.isin(tokens, stop_ids)
+                tokens, docs = tokens[keep], docs[keep]
+            for n in range(ngram_range[0], ngram_range[1] + 1):
+                dtype = np.int32 if base ** n <= np.iinfo(np.int32).max \
+                    else np.int64
+                size = max(len(tokens) - n + 1, 0)
+                # Documents are contiguous, so an n-gram stays within a
+                # document if its first and last tokens do
+                valid = docs[:size] == docs[n - 1:n - 1 + size]
+                codes = tokens[:size][valid].astype(dtype)
+                for k in range(1, n):
+                    codes = codes * base + tokens[k:k + size][valid]
+                yield n, docs[:size][valid], codes
+
+    def _decode(self, n, code):
+        base = max(len(self.terms), 1)
+        ids = []
+        for _ in range(n):
+            code, token = divmod(int(code), base)
+            ids.append(token)
+        return ' '.join(self.terms.term(token) for token in reversed(ids))
+
+    def count(self, ngram_range=(1, 1), stop_words=None):
+        '''Count the n-grams of the documents.
+
+        Args:
+            ngram_range: A tuple (min_n, max_n) of the n-gram sizes.
+            stop_words: A collection of terms removed before forming the
+                n-grams, or None.
+
+        Returns:
+            A tuple of a sparse CSR matrix of the counts of the documents by
+                the distinct n-grams, and a function getting the n-gram of a
+                column of the matrix as a string.
+        '''
+        # The distinct (document, n-gram) pairs of each chunk are merged,
+        # and the columns are assigned once all chunks are counted
+        pieces = {n: [] for n in range(ngram_range[0], ngram_range[1] + 1)}
+        for n, gram_docs, codes in self._ngrams(ngram_range, stop_words):
+            pieces[n].append(_distinct_pairs(gram_docs, codes))
+        docs, columns, values, grams = [], [], [], []
+        num_columns = 0
+        for n, chunks in pieces.items():
+            if not chunks:
+                continue
+            unique, inverse = np.unique(
+                np.concatenate([codes for _, codes, _ in chunks]),
+                return_inverse=True)
+            docs.extend(gram_docs for gram_docs, _, _ in chunks)
+            columns.append(inverse + num_columns)
+            values.extend(chunk_counts for _, _, chunk_counts in chunks)
+            grams.append((num_columns, n, unique))
+            num_columns += len(unique)
+        counts = _count_matrix(docs, columns, (len(self), num_columns),
+                               values)
+
+        def term(column):
+            for start, n, unique in reversed(grams):
+                if column >= start:
+                    return self._decode(n, unique[column - start])
+
+        return counts, term
+
+    def count_vocabulary(self, vocabulary, ngram_range=(1, 1),
+                         stop_words=None):
+        '''Count the n-grams of a vocabulary in the documents.
+
+        Args:
+            vocabulary: A mapping from n-grams, i.e. terms separated by
+                single spaces, to column indices.
+            ngram_range: A tuple (min_n, max_n) of the n-gram sizes.
+            stop_words: A collection of terms removed before forming the
+                n-grams, or None.
+
+        Returns:
+            A sparse CSR matrix of the counts of the documents by the
+                n-grams of the vocabulary.
+        '''
+        base = max(len(self.terms), 1)
+        grams = [(gram.split(' '), column)
+                 for gram, column in vocabulary.items()]
+        ids = self.terms.lookup([word for words, _ in grams
+                                 for word in words]).tolist()
+        known = {}
+        start = 0
+        for words, column in grams:
+            word_ids = ids[start:start + len(words)]
+            start += len(words)
+            if min(word_ids) < 0:
+                continue
+            code = 0
+            for word_id in word_ids:
+                code = code * base + word_id
+            known.setdefault(len(words), []).append((code, column))
+        docs, columns = [], []
+        for n, gram_docs, codes in self._ngrams(ngram_range, stop_words):
+            if n not in known:
+                continue
+            pairs = np.array(sorted(known[n]), dtype=np.int64)
+            positions = np.searchsorted(pairs[:, 0], codes)
+            positions[positions == len(pairs)] = 0
+            found = pairs[positions, 0] == codes
+            docs.append(gram_docs[found])
+            columns.append(pairs[positions[found], 1])
+        return _count_matrix(docs, columns, (len(self), len(vocabulary)))
+
+
+def _distinct_pairs(docs, codes):
+    '''Count the distinct (document, code) pairs of a chunk.'''
+    order = np.lexsort((codes, docs))
+    docs, codes = docs[order], codes[order]
+    first = np.ones(len(docs), dtype=bool)
+    first[1:] = (docs[1:] != docs[:-1]) | (codes[1:] != codes[:-1])
+    starts = np.flatnonzero(first)
+    return docs[starts], codes[starts], np.diff(np.append(starts, len(docs)))
+
+
+def _count_matrix(rows, columns, shape, values=None):
+    '''Build a CSR matrix counting the (row, column) pairs.
+
+    Each pair counts once, or by the corresponding entry of values.
+    '''
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+    columns = np.concatenate(columns) if columns else \
+        np.zeros(0, dtype=np.int64)
+    values = np.concatenate(values).astype(np.float64) if values else \
+        np.ones(len(rows), dtype=np.float64)
+    counts = sp.csr_matrix((values, (rows, columns)), shape=shape)
+    counts.sum_duplicates()
+    return counts
+
+
+if __name__ == '__main__':
+    parse = argparse.ArgumentParser('python token_corpus.py')
+    message = 'Addresses of the cleaned files to tokenize'
+    parse.add_argument('-p', '--paths', type=str, nargs='+', required=True,
+                       help=message)
+    message = 'The address of the token corpus to be created'
+    parse.add_argument('-o', '--output', type=str, required=True,
+                       help=message)
+    message = 'The field of the papers to tokenize'
+    parse.add_argument('-f', '--field', type=str, default='abstract',
+                       choices=['title', 'abstract'], help=message)
+    arguments = parse.parse_args()
+    dataset = Dataset(arguments.paths, [], lazy=True)
+    corpus = TokenCorpus.build((paper[arguments.field] for paper in dataset),
+                               arguments.output)
+    print('{} documents, {} tokens, {} terms'.format(
+        len(corpus), len(corpus.tokens), len(corpus.terms)))
@@ -1,9 +1,314 @@
 '''This module include the required transformations.
+
+A fitted transformer is saved as a directory holding its NumPy arrays as
+.npy files, which load memory-maps, so that loading takes about the same
+time whatever the size of the model and processes forked after loading
+share the pages of the arrays:
+
+    meta.json           Format version, the transformer class, and whether
+                        it has been fitted.
+    params.pkl          The constructor arguments (pickled, since they may
+                        include functions such as a custom tokenizer).
+    terms.npy           TFIDFVectorizer: uint8 UTF-8 encoded terms,
+                        concatenated in the order of their feature indices.
+    term_offsets.npy    TFIDFVectorizer: int64 offsets of the terms.
+    term_hashes.npy     TFIDFVectorizer: sorted uint64 hashes of the terms.
+    term_hash_ids.npy   TFIDFVectorizer: int64 feature indices of the
+                        terms in the order of their hashes.
+    term_hash_key.npy   TFIDFVectorizer: the uint64 key of the hashes.
+    idf.npy             TFIDFVectorizer: float64 idf of the features.
+    classes.npy         LabelEncoder: the sorted class labels.
+
+Files written by earlier versions, which pickled the sklearn objects, are
+still loaded.
 '''
+import hashlib
+import json
+import multiprocessing as mp
+import numbers
+import os
+import os.path
 import pickle
+import shutil
+import types
+from collections.abc import Mapping
 from abc import ABC, abstractmethod
+from collections import Counter
+import numpy as np
+import scipy.sparse as sp
 from sklearn import preprocessing
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import TfidfTransformer, TfidfVectorizer
+
+
+MODEL_FORMAT_VERSION = 1
+META_NAME = 'meta.json'
+PARAMS_NAME = 'params.pkl'
+ENCODING = 'utf-8'
+# Odd multipliers of the polynomial term hash, tried in turn until the terms
+# of an index have distinct hashes
+HASH_KEYS = (0x100000001b3, 0x9e3779b97f4a7c15, 0xc2b2ae3d27d4eb4f)
+# Number of terms hashed at once when an index is built
+HASH_BATCH_SIZE = 1 << 16
+# Number of tokens looked up at once by transform
+LOOKUP_BATCH_SIZE = 1 << 15
+
+
+def hash_terms(data, lengths, key):
+    '''Hash encoded terms with NumPy operations.
+
+    Args:
+        data: A uint8 array of the concatenated encoded terms.
+        lengths: An int64 array of the lengths of the terms in bytes.
+        key: One of HASH_KEYS.
+
+    Returns:
+        A uint64 array of the hashes of the terms.
+    '''
+    lengths = np.asarray(lengths, dtype=np.int64)
+    if len(lengths) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    ends = np.cumsum(lengths)
+    max_length = int(lengths.max())
+    powers = np.full(max(max_length, 1), key, dtype=np.uint64)
+    powers[0] = 1
+    powers = np.cumprod(powers, dtype=np.uint64)
+    # Each byte is weighted by the key to the power of its distance from the
+    # end of its term, and the weighted bytes of a term are summed
+    exponents = np.repeat(ends, lengths) - 1 - np.arange(ends[-1])
+    values = (np.asarray(data, dtype=np.uint64) + np.uint64(1)) * \
+        powers[exponents]
+    hashes = np.zeros(len(lengths), dtype=np.uint64)
+    nonempty = lengths > 0
+    if ends[-1] > 0:
+        hashes[nonempty] = np.add.reduceat(values, (ends - lengths)[nonempty])
+    hashes ^= lengths.astype(np.uint64) * np.uint64(0x9e3779b97f4a7c15)
+    # The finalizer of splitmix64 spreads the bits of the hashes
+    hashes ^= hashes >> np.uint64(30)
+    hashes *= np.uint64(0xbf58476d1ce4e5b9)
+    hashes ^= hashes >> np.uint64(27)
+    hashes *= np.uint64(0x94d049bb133111eb)
+    hashes ^= hashes >> np.uint64(31)
+    return hashes
+
+
+class TermIndex(Mapping):
+    '''A read-only mapping from terms to feature indices.
+
+    The terms are held as UTF-8 encoded bytes and offsets in NumPy arrays,
+        which may be memory-mapped, along with the sorted hashes of the
+        terms. Terms are looked up in batches by binary search of their
+        hashes (see lookup), so no dictionary of the terms is built. An
+        index loaded from a directory is pickled as the address of the
+        directory, so other processes memory-map the same files.
+
+    Args:
+        data: A uint8 array of the concatenated encoded terms.
+        offsets: An int64 array of the offsets of the terms in data, where
+            the term with index i is data[offsets[i]:offsets[i + 1]].
+        address: Address of the directory the arrays are loaded from, if any.
+        hashes: A tuple of the sorted hashes, the indices of the terms in
+            the order of their hashes, and the key of the hashes, or None to
+            compute them on the first lookup.
+    '''
+    def __init__(self, data, offsets, address=None, hashes=None):
+        self.data = data
+        self.offsets = offsets
+        self.address = address
+        self._hashes = hashes
+
+    @classmethod
+    def from_terms(cls, terms):
+        '''Build an index where each term maps to its position in terms.'''
+        encoded = [term.encode(ENCODING) for term in terms]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(term) for term in encoded], out=offsets[1:])
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(data, offsets)
+
+    @classmethod
+    def load(cls, address):
+        '''Memory-map an index saved into a directory by save.'''
+        hashes = None
+        if os.path.exists(os.path.join(address, 'term_hash_key.npy')):
+            hashes = (load_array(address, 'term_hashes'),
+                      load_array(address, 'term_hash_ids'),
+                      int(load_array(address, 'term_hash_key')[0]))
+        return cls(load_array(address, 'terms'),
+                   load_array(address, 'term_offsets'), address, hashes)
+
+    def save(self, address):
+        '''Save the index into an existing directory.'''
+        hashes, ids, key = self.hashes()
+        np.save(os.path.join(address, 'terms.npy'), self.data)
+        np.save(os.path.join(address, 'term_offsets.npy'), self.offsets)
+        np.save(os.path.join(address, 'term_hashes.npy'), hashes)
+        np.save(os.path.join(address, 'term_hash_ids.npy'), ids)
+        np.save(os.path.join(address, 'term_hash_key.npy'),
+                np.array([key], dtype=np.uint64))
+
+    def hashes(self):
+        '''Get the hashes of the terms, computing them if needed.
+
+        Returns:
+            A tuple of a sorted uint64 array of the hashes of the terms, an
+                int64 array of the indices of the terms in the same order,
+                and the key of the hashes (see hash_terms).
+        '''
+        if self._hashes is not None:
+            return self._hashes
+        lengths = np.diff(self.offsets)
+        for key in HASH_KEYS:
+            hashes = np.empty(len(lengths), dtype=np.uint64)
+            for start in range(0, len(lengths), HASH_BATCH_SIZE):
+                end = min(start + HASH_BATCH_SIZE, len(lengths))
+                data = self.data[self.offsets[start]:self.offsets[end]]
+                hashes[start:end] = hash_terms(data, lengths[start:end], key)
+            ids = np.argsort(hashes, kind='stable')
+            hashes = hashes[ids]
+            if not np.any(hashes[1:] == hashes[:-1]):
+                self._hashes = (hashes, ids.astype(np.int64), key)
+                return self._hashes
+        raise ValueError('The terms could not be hashed without collisions')
+
+    def lookup(self, terms):
+        '''Find the indices of a batch of terms.
+
+        The hashes of the terms are searched for with NumPy operations, and
+            the bytes of each term found are compared with those of the term
+            in the index, so the result is exact.
+
+        Args:
+            terms: A list of strings.
+
+        Returns:
+            An int64 array of the index of each term, which is -1 for terms
+                not in the index.
+        '''
+        hashes, hash_ids, key = self.hashes()
+        ids = np.full(len(terms), -1, dtype=np.int64)
+        if len(hashes) == 0 or len(terms) == 0:
+            return ids
+        text = ''.join(terms)
+        if text.isascii():
+            # The lengths in bytes are the lengths of the strings
+            data = text.encode(ENCODING)
+        else:
+            terms = [term.encode(ENCODING) for term in terms]
+            data = b''.join(terms)
+        lengths = np.fromiter(map(len, terms), dtype=np.int64,
+                              count=len(terms))
+        data = np.frombuffer(data, dtype=np.uint8)
+        term_hashes = hash_terms(data, lengths, key)
+        # Searching for sorted hashes visits the index in order
+        order = np.argsort(term_hashes)
+        positions = np.empty(len(terms), dtype=np.int64)
+        positions[order] = np.searchsorted(hashes, term_hashes[order])
+        positions[positions == len(hashes)] = 0
+        candidates = np.flatnonzero(hashes[positions] == term_hashes)
+        found = hash_ids[positions[candidates]]
+        starts = self.offsets[found]
+        same_length = self.offsets[found + 1] - starts == lengths[candidates]
+        candidates, found = candidates[same_length], found[same_length]
+        starts = starts[same_length]
+        # Compare the bytes of the candidates with the bytes of the index
+        candidate_lengths = lengths[candidates]
+        term_starts = (np.cumsum(lengths) - lengths)[candidates]
+        owners = np.repeat(np.arange(len(candidates)), candidate_lengths)
+        # The position of each byte of the candidates in data
+        positions = np.arange(len(owners)) + (
+            term_starts - np.cumsum(candidate_lengths) +
+            candidate_lengths)[owners]
+        mismatches = np.asarray(
+            self.data[positions + (starts - term_starts)[owners]]) != \
+            data[positions]
+        matched = np.bincount(owners[mismatches],
+                              minlength=len(candidates)) == 0
+        ids[candidates[matched]] = found[matched]
+        return ids
+
+    def __reduce__(self):
+        if self.address is None:
+            return (TermIndex, (np.asarray(self.data),
+                                np.asarray(self.offsets)))
+        return (TermIndex.load, (self.address,))
+
+    def term(self, i):
+        '''Get the term with index i.'''
+        data = self.data[self.offsets[i]:self.offsets[i + 1]]
+        return data.tobytes().decode(ENCODING)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        data = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            yield data[start:end].decode(ENCODING)
+
+    def __getitem__(self, term):
+        i = int(self.lookup([term])[0])
+        if i < 0:
+            raise KeyError(term)
+        return i
+
+    def items(self):
+        '''Iterate over (term, index) tuples by increasing index.'''
+        return zip(self, range(len(self)))
+
+
+def load_array(address, name):
+    '''Load an array saved as name.npy into a directory.
+
+    The array is memory-mapped, unless it holds Python objects.
+    '''
+    path = os.path.join(address, '{}.npy'.format(name))
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        # Arrays of Python objects cannot be memory-mapped
+        return np.load(path, allow_pickle=True)
+
+
+def _save_model(address, transformer, params, arrays, term_index=None):
+    '''Write a model directory, replacing address once it is complete.'''
+    temp_address = '{}.part'.format(address)
+    if os.path.exists(temp_address):
+        shutil.rmtree(temp_address)
+    os.makedirs(temp_address)
+    for name, value in arrays.items():
+        np.save(os.path.join(temp_address, '{}.npy'.format(name)), value,
+                allow_pickle=value.dtype.hasobject)
+    if term_index is not None:
+        term_index.save(temp_address)
+    with open(os.path.join(temp_address, PARAMS_NAME), 'wb') as fout:
+        pickle.dump(params, fout)
+    meta = {'format_version': MODEL_FORMAT_VERSION,
+            'transformer': type(transformer).__name__,
+            'fitted': bool(arrays) or term_index is not None}
+    with open(os.path.join(temp_address, META_NAME), 'w',
+              encoding=ENCODING) as fout:
+        json.dump(meta, fout)
+    if os.path.isdir(address):
+        shutil.rmtree(address)
+    elif os.path.exists(address):
+        os.remove(address)
+    os.replace(temp_address, address)
+
+
+def _read_model(address, cls):
+    '''Read the metadata and parameters of a model directory.'''
+    with open(os.path.join(address, META_NAME), encoding=ENCODING) as fin:
+        meta = json.load(fin)
+    if meta['format_version'] != MODEL_FORMAT_VERSION:
+        raise ValueError('{} has an unsupported model format version'.format(
+            address))
+    if meta['transformer'] != cls.__name__:
+        raise ValueError('{} holds a {} rather than a {}'.format(
+            address, meta['transformer'], cls.__name__))
+    with open(os.path.join(address, PARAMS_NAME), 'rb') as fin:
+        params = pickle.load(fin)
+    return meta, params
 
 
 class Transformer(ABC):
@@ -70,20 +375,148 @@ class LabelEncoder(Transformer):
         '''Write a LabelEncoder to file.
 
         Args:
-            address: Address of the file that the LabelEncoder will be written into.
+            address: Address of the model directory that the LabelEncoder
+                will be written into (see the module documentation).
         '''
-        with open(address, 'wb') as fout:
-            pickle.dump(self.encoder, fout)
+        arrays = {}
+        if hasattr(self.encoder, 'classes_'):
+            arrays['classes'] = self.encoder.classes_
+        _save_model(address, self, {}, arrays)
 
     @classmethod
     def load(cls, address):
         '''Load a LabelEncoder from file.
 
         Args:
-            address: Address of the file that the LabelEncoder will be read from.
+            address: Address of the model directory that the LabelEncoder
+                will be read from, or of a file holding a pickled sklearn
+                LabelEncoder.
+
+        Returns:
+            A LabelEncoder object, whose classes are memory-mapped.
         '''
-        with open(address, 'rb') as fin:
-            return pickle.load(fin)
+        encoder = cls()
+        if os.path.isfile(address):
+            with open(address, 'rb') as fin:
+                encoder.encoder = pickle.load(fin)
+            return encoder
+        meta, _ = _read_model(address, cls)
+        if meta['fitted']:
+            encoder.encoder.classes_ = load_array(address, 'classes')
+        return encoder
+
+
+def _code_digest(code, digest):
+    '''Add the bytecode, constants, and names of a code object to a digest.'''
+    digest.update(code.co_code)
+    for constant in code.co_consts:
+        if isinstance(constant, types.CodeType):
+            _code_digest(constant, digest)
+        elif isinstance(constant, frozenset):
+            digest.update(repr(sorted(constant, key=repr)).encode(ENCODING))
+        else:
+            digest.update(repr(constant).encode(ENCODING))
+    digest.update(repr(code.co_names).encode(ENCODING))
+
+
+def describe_function(function):
+    '''Describe a function by its qualified name and its code.
+
+    Args:
+        function: A callable.
+
+    Returns:
+        A string identifying the function across processes, which changes
+            when its code changes, or None if the function has no stable
+            name, e.g. a lambda, a nested function, or a bound method or a
+            callable object whose state may affect its results.
+    '''
+    qualname = getattr(function, '__qualname__', None)
+    module = getattr(function, '__module__', None)
+    if qualname is None or module is None or '<' in qualname:
+        return None
+    owner = getattr(function, '__self__', None)
+    if owner is not None and not isinstance(owner, (type, types.ModuleType)):
+        return None
+    code = getattr(function, '__code__', None)
+    if code is None:
+        return '{}.{}'.format(module, qualname)
+    digest = hashlib.sha1()
+    _code_digest(code, digest)
+    return '{}.{}:{}'.format(module, qualname, digest.hexdigest())
+
+
+# The fitted TFIDFVectorizer of a worker process of TFIDFVectorizer.transform
+_worker_vectorizer = None
+
+
+def _init_worker(vectorizer):
+    global _worker_vectorizer
+    _worker_vectorizer = vectorizer
+
+
+def _transform_shard(documents):
+    return _worker_vectorizer.transform(documents)
+
+
+def _stack_rows(pieces, num_columns):
+    '''Stack CSR matrices vertically, copying their arrays only once.
+
+    The index arrays keep the index dtype of the pieces, unless the stacked
+        matrix has too many nonzeros for it, so scipy does not copy them
+        again to convert them.
+    '''
+    offsets = np.cumsum([0] + [piece.nnz for piece in pieces])
+    num_rows = sum(piece.shape[0] for piece in pieces)
+    index_dtype = np.result_type(*[piece.indices.dtype for piece in pieces])
+    if max(offsets[-1], num_columns) > np.iinfo(index_dtype).max:
+        index_dtype = np.int64
+    indptr = np.empty(num_rows + 1, dtype=index_dtype)
+    indptr[0] = 0
+    indices = np.empty(offsets[-1], dtype=index_dtype)
+    data = np.empty(offsets[-1],
+                    dtype=np.result_type(*[piece.data.dtype for piece in pieces]))
+    row = 0
+    for piece, start, end in zip(pieces, offsets[:-1], offsets[1:]):
+        np.add(piece.indptr[1:], start, out=indptr[row + 1:row + 1 +
+                                                   piece.shape[0]],
+               casting='unsafe')
+        indices[start:end] = piece.indices
+        data[start:end] = piece.data
+        row += piece.shape[0]
+    return sp.csr_matrix((data, indices, indptr),
+                         shape=(num_rows, num_columns), copy=False)
+
+
+class _MappedTfidfTransformer(TfidfTransformer):
+    '''A TfidfTransformer applying an idf array without copying it.
+
+    sklearn keeps the idf as a sparse diagonal matrix, which its idf_
+        setter builds from a copy of the array, so a loaded idf would
+        neither stay memory-mapped nor be shared by forked workers. This
+        transformer keeps the array as it is and weights the counts with
+        the same operations as TfidfTransformer.transform.
+    '''
+    @property
+    def idf_(self):
+        return self._idf
+
+    @idf_.setter
+    def idf_(self, value):
+        self._idf = value
+
+    def transform(self, X, copy=True):
+        X = sp.csr_matrix(X, copy=copy)
+        if X.dtype not in (np.float64, np.float32, np.float16):
+            X = X.astype(np.float64)
+        if self.sublinear_tf:
+            np.log(X.data, X.data)
+            X.data += 1
+        if self.use_idf:
+            X.data = X.data * self._idf[X.indices]
+        if self.norm:
+            X = preprocessing.normalize(X, norm=self.norm, copy=False)
+        return X
 
 
 class TFIDFVectorizer(Transformer):
@@ -105,15 +538,241 @@ class TFIDFVectorizer(Transformer):
         '''
         self.transformer.fit(corpus)
 
-    def transform(self, text):
+    def fit_batches(self, batches, key=None):
+        '''Learn vocabulary and idf from batches of documents.
+
+        Unlike fit, only one batch of documents is held in memory at a time,
+            along with the document and term frequencies of the distinct
+            terms, so memory is bounded by the size of the vocabulary rather
+            than of the corpus. The vocabulary and idf are the same as those
+            learned by fit from all the documents, including the pruning by
+            min_df, max_df, and max_features.
+
+        Args:
+            batches: An iterable of lists of documents, e.g.
+                dataset.iter_batches(1000) for a Dataset object.
+            key: A function getting the text of a document from each item of
+                a batch, e.g. lambda paper: paper['abstract'], or None if the
+                items are texts.
+        '''
+        vectorizer = self.transformer
+        vectorizer._validate_params()
+        vectorizer._validate_vocabulary()
+        fixed = vectorizer.fixed_vocabulary_
+        analyze = vectorizer.build_analyzer()
+        doc_counts = Counter()
+        term_counts = Counter()
+        num_docs = 0
+        for batch in batches:
+            for document in batch:
+                if key is not None:
+                    document = key(document)
+                features = Counter(analyze(document))
+                if fixed:
+                    features = {term: count for term, count in features.items()
+                                if term in vectorizer.vocabulary_}
+                doc_counts.update(features.keys())
+                term_counts.update(features)
+                num_docs += 1
+        if fixed:
+            terms = sorted(vectorizer.vocabulary_,
+                           key=vectorizer.vocabulary_.get)
+        else:
+            if not doc_counts:
+                raise ValueError('empty vocabulary; perhaps the documents only '
+                                 'contain stop words')
+            terms = sorted(doc_counts)
+        dfs = np.array([doc_counts[term] for term in terms], dtype=np.int64)
+        if not fixed:
+            counts = doc_counts if vectorizer.binary else term_counts
+            tfs = np.array([counts[term] for term in terms], dtype=np.float64)
+            mask = self._df_mask(dfs, num_docs)
+            terms, dfs, removed = self._prune(terms, dfs, tfs, mask)
+            vectorizer.vocabulary_ = {term: i for i, term in enumerate(terms)}
+            vectorizer.stop_words_ = removed
+        self._fit_idf(dfs, num_docs)
+
+    def fit_tokens(self, corpus):
+        '''Learn vocabulary and idf from a token corpus.
+
+        The n-grams are counted from the token ids of the corpus with NumPy
+            operations, so that many configurations can be fitted after
+            tokenizing the documents once (see the token_corpus module).
+            The vocabulary and idf are the same as those learned by fit from
+            the documents of the corpus, although stop_words_ is not set.
+
+        Args:
+            corpus: A TokenCorpus object tokenized with the lowercase,
+                strip_accents, and token_pattern of the vectorizer.
+        '''
+        vectorizer = self.transformer
+        vectorizer._validate_params()
+        vectorizer._validate_vocabulary()
+        corpus.check(vectorizer)
+        ngram_range = vectorizer.ngram_range
+        stop_words = vectorizer.get_stop_words()
+        num_docs = len(corpus)
+        if vectorizer.fixed_vocabulary_:
+            counts = corpus.count_vocabulary(vectorizer.vocabulary_,
+                                             ngram_range, stop_words)
+            self._fit_idf(counts.getnnz(axis=0), num_docs)
+            return
+        counts, term = corpus.count(ngram_range, stop_words)
+        if counts.shape[1] == 0:
+            raise ValueError('empty vocabulary; perhaps the documents only '
+                             'contain stop words')
+        dfs = counts.getnnz(axis=0)
+        if vectorizer.binary:
+            counts.data.fill(1)
+        tfs = np.asarray(counts.sum(axis=0), dtype=np.float64).ravel()
+        # Only the n-grams within the document frequency limits are decoded,
+        # and sorted as the features of sklearn
+        candidates = np.where(self._df_mask(dfs, num_docs))[0]
+        terms = [term(column) for column in candidates]
+        order = np.array(sorted(range(len(terms)), key=terms.__getitem__),
+                         dtype=np.int64)
+        candidates = candidates[order]
+        terms = [terms[i] for i in order]
+        terms, dfs, _ = self._prune(terms, dfs[candidates], tfs[candidates],
+                                    np.ones(len(terms), dtype=bool))
+        vectorizer.vocabulary_ = {term: i for i, term in enumerate(terms)}
+        vectorizer.__dict__.pop('stop_words_', None)
+        self._fit_idf(dfs, num_docs)
+
+    def transform_tokens(self, corpus):
+        '''Transform the documents of a token corpus to a TF-IDF matrix.
+
+        Args:
+            corpus: A TokenCorpus object tokenized with the lowercase,
+                strip_accents, and token_pattern of the vectorizer.
+
+        Returns:
+            A sparse CSR matrix with a row for each document, equal to the
+                result of transform on the documents of the corpus.
+        '''
+        vectorizer = self.transformer
+        vectorizer._check_vocabulary()
+        corpus.check(vectorizer)
+        counts = corpus.count_vocabulary(vectorizer.vocabulary_,
+                                         vectorizer.ngram_range,
+                                         vectorizer.get_stop_words())
+        if vectorizer.binary:
+            counts.data.fill(1)
+        return vectorizer._tfidf.transform(counts, copy=False)
+
+    def _fit_idf(self, dfs, num_docs):
+        vectorizer = self.transformer
+        vectorizer._tfidf = TfidfTransformer(
+            norm=vectorizer.norm, use_idf=vectorizer.use_idf,
+            smooth_idf=vectorizer.smooth_idf,
+            sublinear_tf=vectorizer.sublinear_tf)
+        if vectorizer.use_idf:
+            smooth = int(vectorizer.smooth_idf)
+            vectorizer._tfidf.idf_ = np.log(
+                (num_docs + smooth) / (np.asarray(dfs, dtype=np.float64) +
+                                       smooth)) + 1
+
+    def _df_mask(self, dfs, num_docs):
+        # The document frequency limits of sklearn's CountVectorizer
+        vectorizer = self.transformer
+        max_df, min_df = vectorizer.max_df, vectorizer.min_df
+        max_doc_count = max_df if isinstance(max_df, numbers.Integral) \
+            else max_df * num_docs
+        min_doc_count = min_df if isinstance(min_df, numbers.Integral) \
+            else min_df * num_docs
+        if max_doc_count < min_doc_count:
+            raise ValueError('max_df corresponds to < documents than min_df')
+        return (dfs <= max_doc_count) & (dfs >= min_doc_count)
+
+    def _prune(self, terms, dfs, tfs, mask):
+        # The same pruning as sklearn's CountVectorizer, over sorted terms
+        limit = self.transformer.max_features
+        if limit is not None and mask.sum() > limit:
+            kept = np.where(mask)[0][(-tfs[mask]).argsort()[:limit]]
+            mask = np.zeros(len(dfs), dtype=bool)
+            mask[kept] = True
+        if not mask.any():
+            raise ValueError('After pruning, no terms remain. Try a lower '
+                             'min_df or a higher max_df.')
+        removed = {term for term, keep in zip(terms, mask) if not keep}
+        return [term for term, keep in zip(terms, mask) if keep], dfs[mask], \
+            removed
+
+    def transform(self, text, num_workers=1, shard_size=None):
         '''Transform documents to document-term matrix.
 
         A wrapper for transform method of TfidfVectorizer from
             sklearn.feature_extraction.text. See transform method from
             sklearn.feature_extraction.text import TfidfVectorizer.
 
+        With more than one worker, the documents are split into consecutive
+            shards that are transformed by a pool of processes, each holding
+            its own copy of the fitted vectorizer, and the rows of the shards
+            are stacked in order. The tokens of a vectorizer whose vocabulary
+            is a TermIndex (see load) are looked up in batches.
+
+        Args:
+            text: An iterable of documents.
+            num_workers: Number of processes transforming the documents.
+            shard_size: Number of documents in each shard, or None for about
+                four shards per worker.
+
+        Returns:
+            A sparse CSR matrix with a row for each document.
         '''
-        return self.transformer.transform(text)
+        if num_workers <= 1:
+            return self._transform(text)
+        documents = list(text)
+        if shard_size is None:
+            shard_size = -(-len(documents) // (4 * num_workers))
+        shards = [documents[i:i + shard_size]
+                  for i in range(0, len(documents), max(shard_size, 1))]
+        if len(shards) <= 1:
+            return self._transform(documents)
+        with mp.Pool(min(num_workers, len(shards)), _init_worker,
+                     (self,)) as pool:
+            pieces = pool.map(_transform_shard, shards)
+        return _stack_rows(pieces, len(self.transformer.vocabulary_))
+
+    def _transform(self, text):
+        vectorizer = self.transformer
+        vocabulary = getattr(vectorizer, 'vocabulary_', None)
+        if not isinstance(vocabulary, TermIndex):
+            return vectorizer.transform(text)
+        if isinstance(text, str):
+            raise ValueError('Iterable over raw text documents expected, '
+                             'string object received.')
+        analyze = vectorizer.build_analyzer()
+        pieces = []
+        tokens = []
+        sizes = []
+        for document in text:
+            document_tokens = analyze(document)
+            tokens.extend(document_tokens)
+            sizes.append(len(document_tokens))
+            if len(tokens) >= LOOKUP_BATCH_SIZE:
+                pieces.append(self._count_batch(tokens, sizes))
+                tokens = []
+                sizes = []
+        if sizes or not pieces:
+            pieces.append(self._count_batch(tokens, sizes))
+        counts = _stack_rows(pieces, len(vocabulary))
+        if vectorizer.binary:
+            counts.data.fill(1)
+        return vectorizer._tfidf.transform(counts, copy=False)
+
+    def _count_batch(self, tokens, sizes):
+        # The same counts as sklearn's CountVectorizer, with the tokens of a
+        # batch of documents looked up at once
+        vectorizer = self.transformer
+        ids = vectorizer.vocabulary_.lookup(tokens)
+        rows = np.repeat(np.arange(len(sizes)), sizes)
+        found = ids >= 0
+        counts = sp.coo_matrix(
+            (np.ones(found.sum(), dtype=vectorizer.dtype),
+             (rows[found], ids[found])),
+            shape=(len(sizes), len(vectorizer.vocabulary_)))
+        return counts.tocsr()
 
     def inverse_transform(self, encoded_text):
         '''Return terms per document with nonzero entries in X.
@@ -133,21 +792,92 @@ class TFIDFVectorizer(Transformer):
         '''
         return self.transformer.get_feature_names()
 
+    def fingerprint(self):
+        '''Get a hash of the parameters, vocabulary, and idf.
+
+        Two vectorizers with the same fingerprint transform documents into
+            the same matrices, even across processes, so the fingerprint can
+            key cached results (see the vector_cache module). Functions
+            among the parameters are described by their names and code (see
+            describe_function).
+
+        Returns:
+            A hexadecimal SHA-1 digest, or None if a function among the
+                parameters cannot be described.
+        '''
+        vectorizer = self.transformer
+        digest = hashlib.sha1()
+        params = vectorizer.get_params()
+        for name in sorted(params):
+            value = params[name]
+            if callable(value):
+                # The representation of a function includes its address
+                value = describe_function(value)
+                if value is None:
+                    return None
+            elif isinstance(value, (set, frozenset)):
+                value = sorted(value)
+            digest.update('{}={!r};'.format(name, value).encode(ENCODING))
+        if hasattr(vectorizer, 'vocabulary_'):
+            term_index = vectorizer.vocabulary_
+            if not isinstance(term_index, TermIndex):
+                term_index = TermIndex.from_terms(
+                    sorted(term_index, key=term_index.get))
+            digest.update(np.asarray(term_index.offsets).tobytes())
+            digest.update(np.asarray(term_index.data).tobytes())
+            if vectorizer.use_idf:
+                digest.update(np.ascontiguousarray(vectorizer.idf_,
+                                                   dtype=np.float64).tobytes())
+        return digest.hexdigest()
+
     def save(self, address):
         '''Write a TfidfVectorizer object to file.
 
         Args:
-            address: Address of the file that TFIDFVectorizer will be written into.
+            address: Address of the model directory that TFIDFVectorizer will
+                be written into (see the module documentation).
         '''
-        with open(address, 'wb') as fout:
-            pickle.dump(self.transformer, fout)
+        vectorizer = self.transformer
+        arrays = {}
+        term_index = None
+        if hasattr(vectorizer, 'vocabulary_'):
+            term_index = vectorizer.vocabulary_
+            if not isinstance(term_index, TermIndex):
+                term_index = TermIndex.from_terms(
+                    sorted(term_index, key=term_index.get))
+            if vectorizer.use_idf:
+                arrays['idf'] = vectorizer.idf_
+        _save_model(address, self, vectorizer.get_params(), arrays,
+                    term_index)
 
     @classmethod
     def load(cls, address):
         '''Load a TfidfVectorizer object from file.
 
         Args:
-            address: Address of the file that TFIDFVectorizer will be read from.
+            address: Address of the model directory that TFIDFVectorizer will
+                be read from, or of a file holding a pickled sklearn
+                TfidfVectorizer.
+
+        Returns:
+            A TFIDFVectorizer object, whose vocabulary is a TermIndex and
+                whose arrays are memory-mapped.
         '''
-        with open(address, 'rb') as fin:
-            return pickle.load(fin)
+        if os.path.isfile(address):
+            vectorizer = cls()
+            with open(address, 'rb') as fin:
+                vectorizer.transformer = pickle.load(fin)
+            return vectorizer
+        meta, params = _read_model(address, cls)
+        vectorizer = cls(**params)
+        if meta['fitted']:
+            transformer = vectorizer.transformer
+            transformer.vocabulary_ = TermIndex.load(address)
+            transformer.fixed_vocabulary_ = params['vocabulary'] is not None
+            transformer._tfidf = _MappedTfidfTransformer(
+                norm=transformer.norm, use_idf=transformer.use_idf,
+                smooth_idf=transformer.smooth_idf,
+                sublinear_tf=transformer.sublinear_tf)
+            if transformer.use_idf:
+                transformer._tfidf.idf_ = load_array(address, 'idf')
+        return vectorizer
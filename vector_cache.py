@@ -0,0 +1,192 @@
+'''Cache the TF-IDF matrices of cleaned files on disk.
+
+The matrix of the texts of the papers of a cleaned file is saved as an
+uncompressed .npz file (see scipy.sparse.save_npz) in a cache directory,
+along with an index file (cache.json) describing each entry. An entry is
+keyed by the content of the entry, namely the fingerprint of the
+vectorizer (see TFIDFVectorizer.fingerprint), the digest of the content of
+the file (see cleaner.content_fingerprint), the filter and the field of the
+papers, so that it is never used once either the vectorizer or the file has
+changed, and it is used for any copy of the file. The matrix of a list of
+files is assembled from the entries of the files, and only the files
+without an entry are vectorized. The least recently used entries are
+evicted when the cache outgrows its size limit. Vectorizers without a
+fingerprint, e.g. those using a lambda as tokenizer, are never cached.
+
+The cache is meant to be used by a single process at a time.
+'''
+import hashlib
+import json
+import os
+import os.path
+import scipy.sparse as sp
+from cleaner import content_fingerprint, read_json, write_json
+from dataset import Dataset, FilterSpec
+
+
+INDEX_NAME = 'cache.json'
+# Default size limit of a cache directory in bytes
+MAX_SIZE = 1 << 30
+
+
+def describe_filter(spec):
+    '''Describe a filter as a dictionary that can be written into JSON.
+
+    Args:
+        spec: A FilterSpec object, or None for all papers.
+
+    Returns:
+        A dictionary of the sorted journals, the year range, and the
+            keywords of the filter, or None.
+    '''
+    if spec is None:
+        return None
+    if not isinstance(spec, FilterSpec):
+        raise ValueError('Only FilterSpec objects can describe cached papers')
+    return {'journals': None if spec.journals is None
+            else sorted(spec.journals),
+            'year_range': None if spec.year_range is None
+            else [int(year) for year in spec.year_range],
+            'keywords': None if spec.keywords is None
+            else list(spec.keywords)}
+
+
+class VectorCache(object):
+    '''A size-bounded cache of the TF-IDF matrices of cleaned files.
+
+    Args:
+        directory: Address of the cache directory.
+        max_size: Maximum total size of the cached entries in bytes.
+    '''
+    def __init__(self, directory, max_size=MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self._index_address = os.path.join(directory, INDEX_NAME)
+        self.entries = read_json(self._index_address)
+
+    @staticmethod
+    def describe(fingerprint, path, spec=None, field='abstract'):
+        '''Describe the matrix of a cleaned file.
+
+        Args:
+            fingerprint: The fingerprint of a fitted TFIDFVectorizer.
+            path: Address of a cleaned file.
+            spec: A FilterSpec object selecting the papers, or None for all
+                papers.
+            field: The field of the papers that is vectorized.
+
+        Returns:
+            A tuple of the cache key of the matrix and a dictionary of its
+                description.
+        '''
+        description = {'vectorizer': fingerprint,
+                       'input': content_fingerprint(path),
+                       'filter': describe_filter(spec),
+                       'field': field}
+        content = json.dumps(description, sort_keys=True).encode('utf-8')
+        return hashlib.sha1(content).hexdigest(), description
+
+    def _touch(self, key):
+        self.entries[key]['last_used'] = 1 + max(
+            entry['last_used'] for entry in self.entries.values())
+        write_json(self._index_address, self.entries)
+
+    def lookup(self, key):
+        '''Get the address of a cached matrix, or None if it is not cached.'''
+        if key not in self.entries:
+            return None
+        self._touch(key)
+        return os.path.join(self.directory, self.entries[key]['path'])
+
+    def store(self, key, description, matrix):
+        '''Cache a matrix.
+
+        Args:
+            key: The cache key of the matrix (see describe).
+            description: The description of the matrix (see describe).
+            matrix: A sparse matrix.
+
+        Returns:
+            The address of the .npz file holding the matrix, or None if it
+                has been evicted right away for exceeding the size limit.
+        '''
+        name = '{}.npz'.format(key)
+        address = os.path.join(self.directory, name)
+        temp_address = '{}.part'.format(address)
+        with open(temp_address, 'wb') as fout:
+            sp.save_npz(fout, sp.csr_matrix(matrix), compressed=False)
+        os.replace(temp_address, address)
+        entry = dict(description)
+        entry['path'] = name
+        entry['size'] = os.path.getsize(address)
+        entry['last_used'] = 0
+        self.entries[key] = entry
+        self._touch(key)
+        self.evict()
+        if key not in self.entries:
+            return None
+        return address
+
+    def evict(self):
+        '''Remove the least recently used entries exceeding the size limit.'''
+        total = sum(entry['size'] for entry in self.entries.values())
+        for key in sorted(self.entries,
+                          key=lambda key: self.entries[key]['last_used']):
+            if total <= self.max_size:
+                break
+            entry = self.entries.pop(key)
+            address = os.path.join(self.directory, entry['path'])
+            if os.path.exists(address):
+                os.remove(address)
+            total -= entry['size']
+        write_json(self._index_address, self.entries)
+
+    def size(self):
+        '''Get the total size of the cached entries in bytes.'''
+        return sum(entry['size'] for entry in self.entries.values())
+
+    def transform(self, vectorizer, paths, spec=None, field='abstract',
+                  sep='\t', num_workers=1):
+        '''Get the TF-IDF matrix of the papers of cleaned files.
+
+        The matrix of each file is read from the cache, or vectorized and
+            cached if it is not there. Nothing is cached for a vectorizer
+            without a fingerprint (see TFIDFVectorizer.fingerprint).
+
+        Args:
+            vectorizer: A fitted TFIDFVectorizer object.
+            paths: A list of addresses of cleaned files.
+            spec: A FilterSpec object selecting the papers, or None for all
+                papers.
+            field: The field of the papers that is vectorized.
+            sep: The field separator of the tab-separated files.
+            num_workers: Number of processes vectorizing each file (see
+                TFIDFVectorizer.transform).
+
+        Returns:
+            A sparse CSR matrix with a row for each paper, in the order of
+                Dataset(paths, spec).
+        '''
+        fingerprint = vectorizer.fingerprint()
+        conditions = [] if spec is None else spec
+        pieces = []
+        for path in paths:
+            if fingerprint is not None:
+                key, description = self.describe(fingerprint, path, spec,
+                                                 field)
+                address = self.lookup(key)
+                if address is not None:
+                    pieces.append(sp.load_npz(address))
+                    continue
+            texts = [paper[field] for paper in
+                     Dataset.iter_load(path, conditions, sep=sep)]
+            matrix = vectorizer.transform(texts, num_workers=num_workers)
+            if fingerprint is not None:
+                self.store(key, description, matrix)
+            pieces.append(matrix)
+        if not pieces:
+            return sp.csr_matrix(
+                (0, len(vectorizer.transformer.vocabulary_)))
+        return sp.vstack(pieces, format='csr')